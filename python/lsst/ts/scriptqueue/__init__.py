@@ -19,9 +19,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from .indexed_queue import *
+from .launcher import *
+from .metrics import *
 from .queue_model import *
+from .resource_monitor import *
+from .schema_cache import *
+from .script_history import *
+from .script_index import *
 from .script_info import *
+from .script_path_cache import *
+from .script_publisher import *
 from .script_queue import *
+from .tai import *
+from .tracing import *
+from .transport import *
 from .utils import *
 from . import ui
 
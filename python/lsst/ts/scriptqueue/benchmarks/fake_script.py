@@ -0,0 +1,317 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = [
+    "FAKE_SCRIPT_SCHEMA",
+    "FakeScriptProcess",
+    "FakeScripts",
+    "FakeScriptLauncher",
+]
+
+import asyncio
+import itertools
+import signal
+
+from lsst.ts.idl.enums.Script import ScriptState
+from ..transport import LocalScriptTransport
+
+# Fake process IDs; negative so they never match a real process.
+_pid_generator = itertools.count(-1000, -1)
+
+FAKE_SCRIPT_SCHEMA = """$schema: http://json-schema.org/draft-07/schema#
+$id: https://github.com/lsst-ts/ts_scriptqueue/benchmarks/fake_script.yaml
+title: FakeScript v1
+description: Configuration for fake scripts.
+type: object
+properties:
+  wait_time:
+    description: Ignored.
+    type: number
+    default: 0
+additionalProperties: false
+"""
+"""Configuration schema output by fake scripts run with ``--schema``.
+"""
+
+
+class FakeScriptProcess:
+    """A stand-in for the `asyncio.subprocess.Process` of a script,
+    as made by `FakeScriptLauncher`.
+
+    Parameters
+    ----------
+    index : `int`
+        SAL index of the script.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.pid = next(_pid_generator)
+        self.returncode = None
+        self._done = asyncio.Future()
+
+    async def wait(self):
+        """Wait for the process to exit and return the return code."""
+        return await asyncio.shield(self._done)
+
+    def exit(self, returncode):
+        """Make the process exit, if it has not already exited.
+
+        Parameters
+        ----------
+        returncode : `int`
+            Return code; negative for a signal.
+        """
+        if self.returncode is not None:
+            return
+        self.returncode = returncode
+        self._done.set_result(returncode)
+
+    def terminate(self):
+        """Exit soon, as if terminated by SIGTERM."""
+        asyncio.get_running_loop().call_soon(self.exit, -signal.SIGTERM)
+
+    def kill(self):
+        """Exit soon, as if killed by SIGKILL."""
+        asyncio.get_running_loop().call_soon(self.exit, -signal.SIGKILL)
+
+
+class _FakeSchemaProcess(FakeScriptProcess):
+    """A stand-in for the process of a script run with ``--schema``,
+    which outputs ``schema`` and exits.
+    """
+
+    def __init__(self, schema):
+        super().__init__(index=0)
+        self.schema = schema
+
+    async def communicate(self, input=None):
+        self.exit(0)
+        return self.schema.encode(), b""
+
+
+class FakeScripts:
+    """Emulate Script SAL components in-process,
+    communicating with them using a `LocalScriptTransport`.
+
+    Works with `FakeScriptLauncher`, which makes the script processes.
+    Each script reports state ``UNCONFIGURED`` ``load_time`` seconds after
+    its process starts, ``CONFIGURED`` ``configure_time`` seconds after
+    the ``configure`` command, and ``RUNNING``, ``ENDING`` and ``DONE``
+    (then exits) ``run_time`` seconds after the ``run`` command.
+    The ``stop`` command makes a script report ``STOPPING``
+    and ``STOPPED`` and exit.
+
+    Parameters
+    ----------
+    transport : `LocalScriptTransport` or `None` (optional)
+        Transport used to communicate with the scripts.
+        If None then make one.
+    load_time : `float` (optional)
+        Time for a script to load (seconds).
+    configure_time : `float` (optional)
+        Time for a script to configure (seconds).
+    run_time : `float` (optional)
+        Time for a script to run (seconds).
+
+    Attributes
+    ----------
+    processes : `dict` [`int`, `FakeScriptProcess`]
+        Processes that have not exited, by SAL index.
+    """
+
+    def __init__(self, transport=None, load_time=0, configure_time=0, run_time=0):
+        if transport is None:
+            transport = LocalScriptTransport()
+        self.transport = transport
+        self.load_time = load_time
+        self.configure_time = configure_time
+        self.run_time = run_time
+        self.processes = dict()
+        for name, handler in (
+            ("configure", self._do_configure),
+            ("run", self._do_run),
+            ("stop", self._do_stop),
+            ("setGroupId", self._do_ignored),
+            ("setLogLevel", self._do_ignored),
+            ("setCheckpoints", self._do_ignored),
+        ):
+            transport.set_command_handler(name, handler)
+        # Tasks emulating scripts; kept so they are not garbage collected.
+        self._tasks = set()
+
+    def put_state(self, index, state):
+        """Output a Script ``state`` event.
+
+        Parameters
+        ----------
+        index : `int`
+            SAL index of the script.
+        state : `lsst.ts.idl.enums.Script.ScriptState`
+            Script state.
+        """
+        self.transport.put_event("state", index, state=state)
+
+    def add_process(self, index):
+        """Make the process for a script and start loading it.
+
+        Called by `FakeScriptLauncher.start_script`.
+
+        Parameters
+        ----------
+        index : `int`
+            SAL index of the script.
+
+        Returns
+        -------
+        process : `FakeScriptProcess`
+            The process.
+        """
+        process = FakeScriptProcess(index)
+        self.processes[index] = process
+        process._done.add_done_callback(lambda _: self._remove_process(process))
+        self._start_task(self._load(process))
+        return process
+
+    def close(self):
+        """Cancel tasks emulating scripts and make all processes exit."""
+        for task in self._tasks:
+            task.cancel()
+        for process in list(self.processes.values()):
+            process.exit(-signal.SIGKILL)
+
+    def _get_process(self, index):
+        """Get the process for a script, or raise RuntimeError."""
+        process = self.processes.get(index)
+        if process is None:
+            raise RuntimeError(f"No process for script {index}")
+        return process
+
+    def _remove_process(self, process):
+        if self.processes.get(process.index) is process:
+            del self.processes[process.index]
+
+    def _start_task(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, process):
+        if self.load_time > 0:
+            await asyncio.sleep(self.load_time)
+        else:
+            # Let start_loading finish first, as for a real process.
+            await asyncio.sleep(0)
+        if process.returncode is None:
+            self.put_state(process.index, ScriptState.UNCONFIGURED)
+
+    async def _do_configure(self, sal_index, **kwargs):
+        process = self._get_process(sal_index)
+        if self.configure_time > 0:
+            await asyncio.sleep(self.configure_time)
+        if process.returncode is None:
+            self.put_state(sal_index, ScriptState.CONFIGURED)
+
+    async def _do_run(self, sal_index, **kwargs):
+        process = self._get_process(sal_index)
+        self.put_state(sal_index, ScriptState.RUNNING)
+        self._start_task(self._run(process))
+
+    async def _run(self, process):
+        if self.run_time > 0:
+            await asyncio.sleep(self.run_time)
+        if process.returncode is None:
+            self.put_state(process.index, ScriptState.ENDING)
+            self.put_state(process.index, ScriptState.DONE)
+            process.exit(0)
+
+    async def _do_stop(self, sal_index, **kwargs):
+        process = self._get_process(sal_index)
+        self.put_state(sal_index, ScriptState.STOPPING)
+        self.put_state(sal_index, ScriptState.STOPPED)
+        process.exit(0)
+
+    async def _do_ignored(self, sal_index, **kwargs):
+        pass
+
+
+class FakeScriptLauncher:
+    """A stand-in for `ScriptLauncher` that makes `FakeScriptProcess`
+    instead of running scripts.
+
+    Parameters
+    ----------
+    fake_scripts : `FakeScripts`
+        Emulator of the scripts.
+    schema : `str` (optional)
+        Configuration schema output by every script;
+        see `create_process`.
+    """
+
+    def __init__(self, fake_scripts, schema=FAKE_SCRIPT_SCHEMA):
+        self.fake_scripts = fake_scripts
+        self.schema = schema
+        self.launcher_pool = None
+
+    async def start_script(self, fullpath, index):
+        """Start a fake script process.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script; ignored.
+        index : `int`
+            SAL index of the script.
+
+        Returns
+        -------
+        process : `FakeScriptProcess`
+            The script process.
+        """
+        return self.fake_scripts.add_process(index)
+
+    async def create_process(self, fullpath, *args, **kwargs):
+        """Run a fake script with ``--schema``, as `SchemaCache` does.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script; ignored.
+        *args : `str`
+            Command-line arguments for the script;
+            must include ``--schema``.
+        **kwargs
+            Ignored.
+
+        Returns
+        -------
+        process : `FakeScriptProcess`
+            A process whose ``communicate`` method returns ``schema``
+            as stdout.
+
+        Raises
+        ------
+        NotImplementedError
+            If ``--schema`` is not one of ``args``.
+        """
+        if "--schema" not in args:
+            raise NotImplementedError("FakeScriptLauncher can only get schemas")
+        return _FakeSchemaProcess(self.schema)
@@ -0,0 +1,432 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["SCENARIO_NAMES", "run_queue_benchmark"]
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import time
+
+from lsst.ts.idl.enums.Script import ScriptState
+from lsst.ts.idl.enums.ScriptQueue import Location
+from ..metrics import LatencyHistogram
+from ..queue_model import QueueModel
+from ..script_info import ScriptInfo
+from .fake_script import FakeScriptLauncher, FakeScripts
+
+# Names of the benchmark scenarios, in the order they are run.
+SCENARIO_NAMES = (
+    "add",
+    "add_many",
+    "move",
+    "reorder",
+    "event_storm",
+    "stop",
+    "history",
+)
+
+# Name of the (only) script in the script directories.
+_SCRIPT_NAME = "script"
+# Maximum time to wait for the queue to reach a state (seconds).
+_WAIT_TIMEOUT = 600
+# Number of scripts stopped by each call to `QueueModel.stop_scripts`.
+_STOP_BATCH_SIZE = 10
+
+
+class _Benchmark:
+    """Run queue benchmark scenarios with fake scripts.
+
+    Parameters
+    ----------
+    root : `str`
+        Directory containing "standard" and "external" script directories.
+    num_scripts : `int`
+        Number of scripts to queue.
+    num_ops : `int`
+        Number of operations for the "move" and "event_storm" scenarios;
+        the "reorder" scenario does 1/100 as many.
+    log : `logging.Logger`
+        Logger.
+    """
+
+    def __init__(self, root, num_scripts, num_ops, log):
+        self.root = root
+        self.num_scripts = num_scripts
+        self.num_ops = num_ops
+        self.log = log
+        self.model = None
+        self.fake_scripts = None
+
+    def make_model(self):
+        """Make a `QueueModel` that uses `FakeScripts`."""
+        self.fake_scripts = FakeScripts()
+        self.num_queue_callbacks = 0
+        self.num_script_callbacks = 0
+        self.model = QueueModel(
+            domain=None,
+            log=self.log,
+            standardpath=os.path.join(self.root, "standard"),
+            externalpath=os.path.join(self.root, "external"),
+            queue_callback=self.queue_callback,
+            script_callback=self.script_callback,
+            use_inotify=False,
+            transport=self.fake_scripts.transport,
+            launcher=FakeScriptLauncher(self.fake_scripts),
+        )
+        self.model.enabled = True
+
+    async def close_model(self):
+        await self.model.close()
+        self.fake_scripts.close()
+        self.model = None
+        self.fake_scripts = None
+
+    def queue_callback(self):
+        self.num_queue_callbacks += 1
+
+    def script_callback(self, script_info):
+        self.num_script_callbacks += 1
+
+    def make_script_infos(self, num_scripts):
+        script_infos = []
+        for i in range(num_scripts):
+            index = self.model.next_sal_index
+            script_infos.append(
+                ScriptInfo(
+                    log=self.log,
+                    transport=self.model.transport,
+                    index=index,
+                    seq_num=index,
+                    is_standard=True,
+                    path=_SCRIPT_NAME,
+                    config="",
+                    descr="benchmark",
+                )
+            )
+        return script_infos
+
+    async def wait_for(self, predicate, description):
+        """Wait for ``predicate()`` to be true."""
+        t0 = time.monotonic()
+        while not predicate():
+            if time.monotonic() - t0 > _WAIT_TIMEOUT:
+                raise asyncio.TimeoutError(f"Timed out waiting for {description}")
+            await asyncio.sleep(0.001)
+
+    async def fill_queue(self):
+        """Pause the queue, add scripts and wait for them to be configured.
+
+        Returns
+        -------
+        script_infos : `list` [`ScriptInfo`]
+            The scripts.
+        """
+        self.model.running = False
+        script_infos = self.make_script_infos(self.num_scripts)
+        await self.model.add_many(
+            script_infos=script_infos, location=Location.LAST, location_sal_index=0
+        )
+        await self.wait_configured(script_infos)
+        return script_infos
+
+    async def wait_configured(self, script_infos):
+        await self.wait_for(
+            lambda: all(script_info.configured for script_info in script_infos),
+            "scripts to be configured",
+        )
+
+    @staticmethod
+    def make_result(latencies, duration, num_ops=None):
+        """Make the result for one scenario.
+
+        Parameters
+        ----------
+        latencies : `list` [`float`]
+            Duration of each operation (seconds).
+        duration : `float`
+            Duration of the scenario (seconds).
+        num_ops : `int` or `None` (optional)
+            Number of operations; if None then ``len(latencies)``.
+        """
+        histogram = LatencyHistogram()
+        for latency in latencies:
+            histogram.add(latency)
+        if num_ops is None:
+            num_ops = len(latencies)
+        return dict(
+            num_ops=num_ops,
+            duration=duration,
+            ops_per_sec=num_ops / duration if duration > 0 else None,
+            latency_mean=_nan_to_none(histogram.mean),
+            latency_p50=_nan_to_none(histogram.percentile(50)),
+            latency_p99=_nan_to_none(histogram.percentile(99)),
+            latency_max=_nan_to_none(histogram.max),
+        )
+
+    async def run_add(self):
+        """Add scripts one at a time."""
+        self.model.running = False
+        script_infos = self.make_script_infos(self.num_scripts)
+        latencies = []
+        t_start = time.perf_counter()
+        for script_info in script_infos:
+            t0 = time.perf_counter()
+            await self.model.add(
+                script_info=script_info, location=Location.LAST, location_sal_index=0
+            )
+            latencies.append(time.perf_counter() - t0)
+        await self.wait_configured(script_infos)
+        return self.make_result(latencies, time.perf_counter() - t_start)
+
+    async def run_add_many(self):
+        """Add all scripts with one call to `QueueModel.add_many`;
+        an operation is one script.
+        """
+        t0 = time.perf_counter()
+        await self.fill_queue()
+        duration = time.perf_counter() - t0
+        return self.make_result([duration], duration, num_ops=self.num_scripts)
+
+    async def run_move(self):
+        """Move random scripts to random locations."""
+        await self.fill_queue()
+        rng = random.Random(1)
+        locations = (Location.FIRST, Location.LAST, Location.BEFORE, Location.AFTER)
+        # Moving scripts does not change the set of queued scripts.
+        sal_indices = self.model.queue_indices
+        latencies = []
+        t_start = time.perf_counter()
+        for i in range(self.num_ops):
+            sal_index, location_sal_index = rng.sample(sal_indices, 2)
+            location = rng.choice(locations)
+            t0 = time.perf_counter()
+            self.model.move(
+                sal_index=sal_index,
+                location=location,
+                location_sal_index=location_sal_index,
+            )
+            latencies.append(time.perf_counter() - t0)
+        return self.make_result(latencies, time.perf_counter() - t_start)
+
+    async def run_reorder(self):
+        """Reorder the whole queue randomly.
+
+        Each reorder changes the position of every script,
+        so only do ``num_ops // 100`` (but at least one).
+        """
+        await self.fill_queue()
+        rng = random.Random(1)
+        sal_indices = self.model.queue_indices
+        latencies = []
+        t_start = time.perf_counter()
+        for i in range(max(self.num_ops // 100, 1)):
+            rng.shuffle(sal_indices)
+            t0 = time.perf_counter()
+            self.model.reorder(sal_indices)
+            latencies.append(time.perf_counter() - t0)
+        return self.make_result(latencies, time.perf_counter() - t_start)
+
+    async def run_event_storm(self):
+        """Output Script state events for queued scripts,
+        as fast as possible.
+        """
+        script_infos = await self.fill_queue()
+        latencies = []
+        t_start = time.perf_counter()
+        for i in range(self.num_ops):
+            script_info = script_infos[i % len(script_infos)]
+            t0 = time.perf_counter()
+            self.fake_scripts.put_state(script_info.index, ScriptState.CONFIGURED)
+            latencies.append(time.perf_counter() - t0)
+        result = self.make_result(latencies, time.perf_counter() - t_start)
+        result["num_script_callbacks"] = self.num_script_callbacks
+        return result
+
+    async def run_stop(self):
+        """Stop queued scripts, a batch at a time;
+        an operation is one script.
+        """
+        script_infos = await self.fill_queue()
+        sal_indices = [script_info.index for script_info in script_infos]
+        latencies = []
+        t_start = time.perf_counter()
+        for i in range(0, len(sal_indices), _STOP_BATCH_SIZE):
+            t0 = time.perf_counter()
+            await self.model.stop_scripts(
+                sal_indices=sal_indices[i : i + _STOP_BATCH_SIZE], terminate=False
+            )
+            latencies.append(time.perf_counter() - t0)
+        return self.make_result(
+            latencies, time.perf_counter() - t_start, num_ops=len(sal_indices)
+        )
+
+    async def run_history(self):
+        """Run all queued scripts, growing the history;
+        an operation is one script and the latency
+        is the time between the ends of successive scripts.
+        """
+        script_infos = await self.fill_queue()
+        t_start = time.perf_counter()
+        self.model.running = True
+        await self.wait_for(
+            lambda: all(script_info.process_done for script_info in script_infos)
+            and self.model.current_script is None,
+            "scripts to run",
+        )
+        duration = time.perf_counter() - t_start
+        end_times = [script_info.timestamp_process_end for script_info in script_infos]
+        latencies = [t1 - t0 for t0, t1 in zip(end_times[:-1], end_times[1:])]
+        result = self.make_result(latencies, duration, num_ops=len(script_infos))
+        result["history_length"] = len(self.model.history)
+        gap_histogram = self.model.metrics.histograms["gap"]
+        result["gap_p50"] = _nan_to_none(gap_histogram.percentile(50))
+        result["gap_p99"] = _nan_to_none(gap_histogram.percentile(99))
+        return result
+
+
+def _nan_to_none(value):
+    """Return None if ``value`` is nan, else ``value``,
+    so results are valid JSON.
+    """
+    return None if math.isnan(value) else value
+
+
+def _make_script_dirs(root):
+    """Make "standard" and "external" script directories in ``root``,
+    each with one executable script.
+    """
+    for category in ("standard", "external"):
+        dirpath = os.path.join(root, category)
+        os.mkdir(dirpath)
+        path = os.path.join(dirpath, _SCRIPT_NAME)
+        with open(path, "w") as f:
+            f.write("#!/bin/sh\n")
+        os.chmod(path, 0o755)
+
+
+async def run_queue_benchmark(num_scripts=1000, num_ops=10000, scenarios=None):
+    """Benchmark `QueueModel` operations using fake scripts.
+
+    The scripts are emulated in-process by `FakeScripts`
+    and `FakeScriptLauncher`, using a `LocalScriptTransport`,
+    so no DDS or subprocesses are needed,
+    and the results measure the overhead of the queue itself.
+
+    Parameters
+    ----------
+    num_scripts : `int` (optional)
+        Number of scripts to queue in each scenario.
+    num_ops : `int` (optional)
+        Number of operations in the "move" and "event_storm" scenarios;
+        the "reorder" scenario does 1/100 as many.
+    scenarios : `list` [`str`] or `None` (optional)
+        Names of the scenarios to run; if None then run all of them.
+        See `SCENARIO_NAMES`.
+
+    Returns
+    -------
+    results : `dict`
+        Results for each scenario, by name, plus the parameters.
+        The result for each scenario includes ``num_ops``,
+        ``duration`` (seconds), ``ops_per_sec``, and ``latency_mean``,
+        ``latency_p50``, ``latency_p99`` and ``latency_max`` (seconds).
+
+    Raises
+    ------
+    ValueError
+        If ``num_scripts`` < 2, ``num_ops`` < 1
+        or a scenario name is not recognized.
+    """
+    if num_scripts < 2:
+        raise ValueError(f"num_scripts={num_scripts} must be at least 2")
+    if num_ops < 1:
+        raise ValueError(f"num_ops={num_ops} must be positive")
+    if scenarios is None:
+        scenarios = SCENARIO_NAMES
+    bad_names = set(scenarios) - set(SCENARIO_NAMES)
+    if bad_names:
+        raise ValueError(f"Unknown scenarios {sorted(bad_names)}")
+
+    log = logging.getLogger("queue_benchmark")
+    results = dict(num_scripts=num_scripts, num_ops=num_ops)
+    with tempfile.TemporaryDirectory() as root:
+        _make_script_dirs(root)
+        benchmark = _Benchmark(
+            root=root, num_scripts=num_scripts, num_ops=num_ops, log=log
+        )
+        for name in SCENARIO_NAMES:
+            if name not in scenarios:
+                continue
+            benchmark.make_model()
+            try:
+                results[name] = await getattr(benchmark, f"run_{name}")()
+            finally:
+                await benchmark.close_model()
+    return results
+
+
+def main():
+    """Run the queue benchmark and print the results as JSON.
+
+    Run this using ``bin/benchmark_queue.py``.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark QueueModel operations using fake scripts"
+    )
+    parser.add_argument(
+        "--num-scripts",
+        type=int,
+        default=1000,
+        help="Number of scripts to queue in each scenario",
+    )
+    parser.add_argument(
+        "--num-ops",
+        type=int,
+        default=10000,
+        help="Number of operations for the move and event_storm scenarios; "
+        "reorder does 1/100 as many",
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIO_NAMES,
+        help="Scenarios to run; if omitted then run all of them",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(
+        run_queue_benchmark(
+            num_scripts=args.num_scripts,
+            num_ops=args.num_ops,
+            scenarios=args.scenarios,
+        )
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
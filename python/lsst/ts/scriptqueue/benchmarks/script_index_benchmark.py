@@ -0,0 +1,191 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["make_synthetic_script_tree", "run_script_index_benchmark"]
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from .. import utils
+from ..script_index import ScriptIndex
+
+
+def make_synthetic_script_tree(root, num_files, files_per_dir=50, dirs_per_dir=10):
+    """Make a directory tree of scripts for benchmarking.
+
+    Parameters
+    ----------
+    root : `str` or `os.PathLike`
+        Root directory; must exist.
+    num_files : `int`
+        Number of files to make. One file in ten is private
+        (its name starts with "_") and one in ten is not executable.
+    files_per_dir : `int` (optional)
+        Number of files in each directory.
+    dirs_per_dir : `int` (optional)
+        Number of subdirectories of each directory.
+
+    Returns
+    -------
+    num_public : `int`
+        Number of public scripts made.
+    """
+    num_public = 0
+    # Directories (relative to root) to fill, in breadth-first order.
+    pending_dirs = [""]
+    next_dir_index = 0
+    file_index = 0
+    while file_index < num_files:
+        reldir = pending_dirs.pop(0)
+        dirpath = os.path.join(root, reldir)
+        os.makedirs(dirpath, exist_ok=True)
+        for i in range(min(files_per_dir, num_files - file_index)):
+            kind = file_index % 10
+            name = f"_script{file_index}" if kind == 0 else f"script{file_index}"
+            path = os.path.join(dirpath, name)
+            with open(path, "w") as f:
+                f.write("#!/bin/sh\n")
+            os.chmod(path, 0o644 if kind == 1 else 0o755)
+            if kind not in (0, 1):
+                num_public += 1
+            file_index += 1
+        for i in range(dirs_per_dir):
+            pending_dirs.append(os.path.join(reldir, f"dir{next_dir_index}"))
+            next_dir_index += 1
+    return num_public
+
+
+def _time_call(func, num_iter):
+    """Return the mean time for a call to ``func`` (seconds)."""
+    t0 = time.perf_counter()
+    for i in range(num_iter):
+        func()
+    return (time.perf_counter() - t0) / num_iter
+
+
+def run_script_index_benchmark(root=None, num_files=50000, num_iter=5):
+    """Compare `ScriptIndex` to `find_public_scripts`.
+
+    Parameters
+    ----------
+    root : `str`, `os.PathLike` or `None` (optional)
+        Directory tree of scripts to search. If None then make
+        a synthetic tree in a temporary directory.
+    num_files : `int` (optional)
+        Number of files in the synthetic tree; ignored if ``root``
+        is specified.
+    num_iter : `int` (optional)
+        Number of times to time each operation.
+
+    Returns
+    -------
+    results : `dict`
+        Timings, in seconds, and information about the tree.
+    """
+    if root is None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            make_synthetic_script_tree(root=tempdir, num_files=num_files)
+            return run_script_index_benchmark(root=tempdir, num_iter=num_iter)
+
+    log = logging.getLogger("script_index_benchmark")
+    results = dict(root=os.fspath(root))
+
+    def find_public_scripts():
+        ":".join(utils.find_public_scripts(root))
+
+    results["find_public_scripts"] = _time_call(find_public_scripts, num_iter)
+
+    def scan_public_scripts_threaded():
+        utils.scan_public_scripts(root, max_workers=8)
+
+    results["scan_public_scripts_8_threads"] = _time_call(
+        scan_public_scripts_threaded, num_iter
+    )
+
+    for use_inotify in (False, True):
+        prefix = "inotify" if use_inotify else "mtime"
+        t0 = time.perf_counter()
+        # With inotify use the default mtime check interval,
+        # which is much longer than this benchmark.
+        kwargs = dict() if use_inotify else dict(mtime_check_interval=0)
+        index = ScriptIndex(root=root, log=log, use_inotify=use_inotify, **kwargs)
+        try:
+            results[f"{prefix}_build"] = time.perf_counter() - t0
+            results[f"{prefix}_used_inotify"] = index.uses_inotify
+            results["num_scripts"] = len(index)
+
+            def refresh():
+                index.refresh()
+                index.joined
+
+            results[f"{prefix}_refresh_unchanged"] = _time_call(refresh, num_iter)
+
+            # Time refresh after adding a script to one directory.
+            def add_and_refresh():
+                path = os.path.join(root, f"added{time.monotonic_ns()}")
+                with open(path, "w") as f:
+                    f.write("#!/bin/sh\n")
+                os.chmod(path, 0o755)
+                index.refresh()
+                index.joined
+
+            results[f"{prefix}_refresh_one_added"] = _time_call(
+                add_and_refresh, num_iter
+            )
+        finally:
+            index.close()
+    return results
+
+
+def main():
+    """Run the script index benchmark and print the results as JSON.
+
+    Run this using ``bin/benchmark_script_index.py``.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare ScriptIndex to find_public_scripts"
+    )
+    parser.add_argument(
+        "--root",
+        help="Directory tree of scripts; if omitted then make a synthetic tree",
+    )
+    parser.add_argument(
+        "--num-files",
+        type=int,
+        default=50000,
+        help="Number of files in the synthetic tree",
+    )
+    parser.add_argument(
+        "--num-iter", type=int, default=5, help="Number of times to time each call"
+    )
+    args = parser.parse_args()
+    results = run_script_index_benchmark(
+        root=args.root, num_files=args.num_files, num_iter=args.num_iter
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
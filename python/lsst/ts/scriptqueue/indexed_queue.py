@@ -0,0 +1,400 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["IndexedQueue"]
+
+import contextlib
+import random
+
+
+class _Node:
+    """A node in the treap used by `IndexedQueue`."""
+
+    __slots__ = ("item", "priority", "size", "left", "right", "parent")
+
+    def __init__(self, item):
+        self.item = item
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+        self.parent = None
+
+
+def _size(node):
+    return 0 if node is None else node.size
+
+
+def _update(node):
+    """Update the size of a node and the parent of its children."""
+    node.size = 1
+    if node.left is not None:
+        node.size += node.left.size
+        node.left.parent = node
+    if node.right is not None:
+        node.size += node.right.size
+        node.right.parent = node
+
+
+def _split(node, nleft):
+    """Split a tree into two trees, the first with ``nleft`` items.
+
+    The parent of the returned trees is not reset;
+    that is up to the caller.
+    """
+    if node is None:
+        return None, None
+    if _size(node.left) >= nleft:
+        left, right = _split(node.left, nleft)
+        node.left = right
+        _update(node)
+        return left, node
+    left, right = _split(node.right, nleft - _size(node.left) - 1)
+    node.right = left
+    _update(node)
+    return node, right
+
+
+def _merge(left, right):
+    """Merge two trees, with all items of ``left`` before ``right``."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class IndexedQueue:
+    """A sequence of scripts that supports fast positional operations.
+
+    Items must have an ``index`` attribute (the SAL index of the script)
+    that is unique within the queue. Items are kept in a treap
+    (a randomized balanced binary tree) ordered by position,
+    plus a dict of SAL index: node. This provides the following
+    operations in O(log n) time: insert at a position, remove an item,
+    get the item at a position, and get the position of an item.
+    Membership tests are O(1).
+
+    The API is a subset of that of `collections.deque`,
+    plus `transaction`, which allows rolling back a set of changes.
+
+    ``version`` is incremented every time the queue is modified,
+    so a change can be detected by comparing two values of ``version``.
+
+    Parameters
+    ----------
+    items : ``iterable`` (optional)
+        Initial items.
+    """
+
+    def __init__(self, items=()):
+        self.version = 0
+        self._root = None
+        self._nodes = dict()
+        # List of undo operations, if a transaction is in progress,
+        # else None. Each undo operation is either
+        # ("remove", position) or ("insert", position, item).
+        self._journal = None
+        self._build(items)
+
+    def append(self, item):
+        """Add an item to the end of the queue."""
+        self.insert(len(self), item)
+
+    def appendleft(self, item):
+        """Add an item to the beginning of the queue."""
+        self.insert(0, item)
+
+    def clear(self):
+        """Remove all items."""
+        self._root = None
+        self._nodes = dict()
+        self.version += 1
+
+    def get(self, sal_index, default=None):
+        """Get the item with the specified SAL index.
+
+        Return ``default`` if not found.
+        """
+        node = self._nodes.get(sal_index)
+        return default if node is None else node.item
+
+    def index(self, key):
+        """Get the position of an item.
+
+        Parameters
+        ----------
+        key : ``any``
+            An item or other object with an ``index`` attribute
+            that specifies the SAL index of the item, e.g. `ScriptKey`.
+
+        Raises
+        ------
+        ValueError
+            If the item is not in the queue.
+        """
+        return self.position(key.index)
+
+    def insert(self, position, item):
+        """Insert an item before the specified position.
+
+        Parameters
+        ----------
+        position : `int`
+            Position at which to insert the item.
+            Values beyond the end of the queue append the item.
+        item : ``any``
+            The item to insert.
+
+        Raises
+        ------
+        ValueError
+            If the SAL index of the item is already in the queue.
+        """
+        if item.index in self._nodes:
+            raise ValueError(f"Script {item.index} is already in the queue")
+        position = min(max(position, 0), len(self))
+        node = _Node(item)
+        left, right = _split(self._root, position)
+        self._set_root(_merge(_merge(left, node), right))
+        self._nodes[item.index] = node
+        self.version += 1
+        if self._journal is not None:
+            self._journal.append(("remove", position))
+
+    def pop(self):
+        """Remove and return the last item.
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty.
+        """
+        if not self._nodes:
+            raise IndexError("pop from an empty queue")
+        return self._remove_at(len(self) - 1)
+
+    def popleft(self):
+        """Remove and return the first item.
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty.
+        """
+        if not self._nodes:
+            raise IndexError("pop from an empty queue")
+        return self._remove_at(0)
+
+    def position(self, sal_index):
+        """Get the position of the item with the specified SAL index.
+
+        Raises
+        ------
+        ValueError
+            If the item is not in the queue.
+        """
+        node = self._nodes.get(sal_index)
+        if node is None:
+            raise ValueError(f"Script {sal_index} is not in the queue")
+        position = _size(node.left)
+        while node.parent is not None:
+            if node is node.parent.right:
+                position += _size(node.parent.left) + 1
+            node = node.parent
+        return position
+
+    def reset(self, items):
+        """Replace the contents of the queue, in O(n) time.
+
+        Parameters
+        ----------
+        items : ``iterable``
+            The new items.
+
+        Raises
+        ------
+        RuntimeError
+            If a transaction is in progress.
+        ValueError
+            If two items have the same SAL index.
+            The queue is not changed.
+        """
+        if self._journal is not None:
+            raise RuntimeError("Cannot reset the queue during a transaction")
+        self._build(items)
+
+    def remove(self, key):
+        """Remove an item and return it.
+
+        Parameters
+        ----------
+        key : ``any``
+            An item or other object with an ``index`` attribute
+            that specifies the SAL index of the item, e.g. `ScriptKey`.
+
+        Raises
+        ------
+        ValueError
+            If the item is not in the queue.
+        """
+        return self._remove_at(self.index(key))
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Context manager that undoes all changes made to the queue
+        within the context, if the context raises an exception.
+
+        Transactions may not be nested.
+
+        Raises
+        ------
+        RuntimeError
+            If a transaction is already in progress.
+        """
+        if self._journal is not None:
+            raise RuntimeError("A transaction is already in progress")
+        self._journal = []
+        try:
+            yield self
+        except BaseException:
+            journal = self._journal
+            self._journal = None
+            for undo in reversed(journal):
+                if undo[0] == "remove":
+                    self._remove_at(undo[1])
+                else:
+                    self.insert(undo[1], undo[2])
+            raise
+        finally:
+            self._journal = None
+
+    def __contains__(self, key):
+        return key.index in self._nodes
+
+    def __copy__(self):
+        return type(self)(self)
+
+    def __delitem__(self, position):
+        self._remove_at(self._check_position(position))
+
+    def __getitem__(self, position):
+        position = self._check_position(position)
+        node = self._root
+        while True:
+            nleft = _size(node.left)
+            if position < nleft:
+                node = node.left
+            elif position == nleft:
+                return node.item
+            else:
+                position -= nleft + 1
+                node = node.right
+
+    def __iter__(self):
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.item
+            node = node.right
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __repr__(self):
+        return f"IndexedQueue({[item.index for item in self]})"
+
+    def _build(self, items):
+        """Replace the contents with the specified items in O(n) time.
+
+        Uses the standard stack-based construction of a Cartesian tree.
+        """
+        nodes = dict()
+        stack = []
+        for item in items:
+            if item.index in nodes:
+                raise ValueError(f"Script {item.index} appears more than once")
+            node = _Node(item)
+            nodes[item.index] = node
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        root = stack[0] if stack else None
+
+        # Compute sizes and parents in post-order.
+        postorder = []
+        pending = [root] if root is not None else []
+        while pending:
+            node = pending.pop()
+            postorder.append(node)
+            for child in (node.left, node.right):
+                if child is not None:
+                    pending.append(child)
+        for node in reversed(postorder):
+            _update(node)
+        self._set_root(root)
+        self._nodes = nodes
+        self.version += 1
+
+    def _check_position(self, position):
+        """Convert a possibly negative position to a non-negative one.
+
+        Raises
+        ------
+        IndexError
+            If the position is out of range.
+        """
+        nitems = len(self)
+        if position < 0:
+            position += nitems
+        if not 0 <= position < nitems:
+            raise IndexError("queue index out of range")
+        return position
+
+    def _remove_at(self, position):
+        """Remove and return the item at the specified position."""
+        left, rest = _split(self._root, position)
+        node, right = _split(rest, 1)
+        self._set_root(_merge(left, right))
+        del self._nodes[node.item.index]
+        self.version += 1
+        if self._journal is not None:
+            self._journal.append(("insert", position, node.item))
+        return node.item
+
+    def _set_root(self, root):
+        self._root = root
+        if root is not None:
+            root.parent = None
@@ -0,0 +1,361 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = [
+    "DEFAULT_PRELOAD_MODULES",
+    "LauncherPool",
+    "ScriptLauncher",
+    "is_python_script",
+]
+
+import asyncio
+import importlib
+import json
+import os
+import runpy
+import sys
+
+DEFAULT_PRELOAD_MODULES = ("lsst.ts.salobj", "astropy.time")
+"""Modules imported by each launcher process before it is needed.
+"""
+
+# Code run by each launcher process. It imports the preload modules
+# (given as command-line arguments), then waits for a request.
+_LAUNCHER_CODE = (
+    "import sys; from lsst.ts.scriptqueue.launcher import run_launcher; "
+    "run_launcher(sys.argv[1:])"
+)
+
+
+def is_python_script(fullpath):
+    """Return True if a script is a Python script that a launcher
+    process can run.
+
+    The script must start with a ``#!`` line that mentions python.
+
+    Parameters
+    ----------
+    fullpath : `str`, `bytes` or `os.PathLike`
+        Full path to the script.
+    """
+    try:
+        with open(fullpath, "rb") as f:
+            first_line = f.readline(256)
+    except OSError:
+        return False
+    return first_line.startswith(b"#!") and b"python" in first_line
+
+
+def run_launcher(preload_modules):
+    """Run a launcher process.
+
+    Import the preload modules, read one request from stdin,
+    then run the requested script, as ``__main__``.
+    The request is one line of JSON: a dict with keys
+    ``fullpath`` (full path to the script) and ``index``
+    (SAL index of the script).
+
+    Exit without running a script if stdin is closed with no request.
+
+    Parameters
+    ----------
+    preload_modules : ``iterable`` of `str`
+        Names of modules to import before reading the request.
+        Modules that cannot be imported are ignored.
+    """
+    for module_name in preload_modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"Launcher could not import {module_name}: {e!r}", file=sys.stderr)
+
+    request_str = sys.stdin.readline()
+    if not request_str:
+        return
+    request = json.loads(request_str)
+    fullpath = request["fullpath"]
+    scriptdir = os.path.dirname(fullpath)
+
+    # Make the environment match that of a script started by exec.
+    os.environ["PATH"] = scriptdir + ":" + os.environ["PATH"]
+    sys.argv = [fullpath, str(request["index"])]
+    sys.path[0] = scriptdir
+    runpy.run_path(fullpath, run_name="__main__")
+
+
+class LauncherPool:
+    """A pool of pre-started script launcher processes.
+
+    Starting a script process normally costs interpreter startup plus
+    importing ``lsst.ts.salobj``, DDS and astropy. A launcher process
+    does all of that in advance, then waits until it is asked to run
+    a script, at which point it runs the script file in-process
+    (in the manner of `runpy.run_path`) and becomes the script process.
+
+    The pool is refilled in the background after each launcher is used.
+    Scripts that are not Python scripts (see `is_python_script`)
+    and scripts requested when no launcher is available
+    are started in the usual way, by executing the script.
+
+    Parameters
+    ----------
+    size : `int`
+        Number of launcher processes to keep ready.
+    log : `logging.Logger`
+        Logger.
+    preload_modules : ``iterable`` of `str` (optional)
+        Modules each launcher imports in advance.
+
+    Raises
+    ------
+    ValueError
+        If ``size`` < 1.
+
+    Notes
+    -----
+    A launcher runs the script with the interpreter that runs
+    the script queue, not the one named in the script's ``#!`` line.
+    """
+
+    def __init__(self, size, log, preload_modules=DEFAULT_PRELOAD_MODULES):
+        if size < 1:
+            raise ValueError(f"size={size} must be positive")
+        self.size = int(size)
+        self.log = log.getChild("LauncherPool")
+        self.preload_modules = tuple(preload_modules)
+        # Launcher processes that are ready for use.
+        self._idle = []
+        # dict of full path: (stat key, is Python script),
+        # so `launch` only reads a script when it changes.
+        self._python_script_cache = dict()
+        self._fill_task = None
+        # Tasks waiting for killed launchers to exit.
+        self._reap_tasks = set()
+        self._closed = False
+        # Number of scripts started by a launcher and by exec.
+        self.num_warm_starts = 0
+        self.num_cold_starts = 0
+
+    def start(self):
+        """Start filling the pool in the background.
+
+        Must be called from a running event loop.
+        """
+        self._start_fill()
+
+    async def launch(self, fullpath, index):
+        """Start a script process using a launcher.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script.
+        index : `int`
+            SAL index of the script.
+
+        Returns
+        -------
+        process : `asyncio.subprocess.Process` or `None`
+            The script process, or None if a launcher cannot be used,
+            in which case the caller must start the script itself.
+        """
+        if self._closed or not self._is_python_script(fullpath):
+            self.num_cold_starts += 1
+            return None
+        process = None
+        while self._idle:
+            candidate = self._idle.pop(0)
+            if candidate.returncode is None:
+                process = candidate
+                break
+        self._start_fill()
+        if process is None:
+            self.num_cold_starts += 1
+            return None
+
+        request = dict(fullpath=os.fsdecode(fullpath), index=index)
+        try:
+            process.stdin.write(json.dumps(request).encode() + b"\n")
+            await process.stdin.drain()
+            process.stdin.close()
+        except BaseException as e:
+            process.kill()
+            if isinstance(e, Exception):
+                await process.wait()
+                self.log.warning(f"Launcher failed for script {index}: {e!r}")
+                self.num_cold_starts += 1
+                return None
+            # Cancelled; reap the killed launcher in the background.
+            task = asyncio.create_task(process.wait())
+            self._reap_tasks.add(task)
+            task.add_done_callback(self._reap_tasks.discard)
+            raise
+        self.num_warm_starts += 1
+        return process
+
+    async def close(self):
+        """Stop filling the pool and kill all idle launchers."""
+        self._closed = True
+        if self._fill_task is not None:
+            self._fill_task.cancel()
+        idle = self._idle
+        self._idle = []
+        for process in idle:
+            if process.returncode is None:
+                process.kill()
+        for process in idle:
+            await process.wait()
+        if self._reap_tasks:
+            await asyncio.wait(self._reap_tasks)
+
+    @property
+    def num_idle(self):
+        """Number of launchers ready for use."""
+        return len(self._idle)
+
+    def _is_python_script(self, fullpath):
+        """Cached version of `is_python_script`.
+
+        The script is only read if its modification time, size
+        or inode has changed since it was last read.
+        """
+        try:
+            st = os.stat(fullpath)
+        except OSError:
+            return False
+        stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cached = self._python_script_cache.get(fullpath)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+        result = is_python_script(fullpath)
+        self._python_script_cache[fullpath] = (stat_key, result)
+        return result
+
+    def _start_fill(self):
+        """Start refilling the pool, if not already doing so."""
+        if self._closed:
+            return
+        if self._fill_task is None or self._fill_task.done():
+            self._fill_task = asyncio.create_task(self._fill())
+
+    async def _fill(self):
+        """Start launchers until the pool is full."""
+        while not self._closed and len(self._idle) < self.size:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable,
+                    "-c",
+                    _LAUNCHER_CODE,
+                    *self.preload_modules,
+                    stdin=asyncio.subprocess.PIPE,
+                )
+            except Exception as e:
+                self.log.warning(f"Could not start a launcher: {e!r}")
+                return
+            if self._closed:
+                process.kill()
+                await process.wait()
+                return
+            self._idle.append(process)
+
+
+class ScriptLauncher:
+    """Start script processes.
+
+    Each process is started by executing the script's absolute path,
+    with an environment made for that call, in which ``PATH`` starts with
+    the directory containing the script. `os.environ` is never modified,
+    so any number of processes may be started concurrently.
+
+    Parameters
+    ----------
+    launcher_pool : `LauncherPool` or `None` (optional)
+        Pool of pre-started launchers to try first when starting a script
+        with `start_script`. If None then always execute the script.
+    """
+
+    def __init__(self, launcher_pool=None):
+        self.launcher_pool = launcher_pool
+
+    @staticmethod
+    def make_env(fullpath):
+        """Make the environment for a script process.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script.
+
+        Returns
+        -------
+        env : `dict` [`str`, `str`]
+            A copy of `os.environ` with the directory containing the script
+            prepended to ``PATH``.
+        """
+        scriptdir = os.path.dirname(os.fsdecode(fullpath))
+        env = dict(os.environ)
+        env["PATH"] = scriptdir + ":" + env.get("PATH", "")
+        return env
+
+    async def create_process(self, fullpath, *args, **kwargs):
+        """Execute a script in a new process.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script.
+        *args : `str`
+            Command-line arguments for the script.
+        **kwargs
+            Additional keyword arguments for
+            `asyncio.create_subprocess_exec`, e.g. ``stdout``.
+            ``env`` is not allowed.
+
+        Returns
+        -------
+        process : `asyncio.subprocess.Process`
+            The script process.
+        """
+        fullpath = os.path.abspath(os.fsdecode(fullpath))
+        return await asyncio.create_subprocess_exec(
+            fullpath, *args, env=self.make_env(fullpath), **kwargs
+        )
+
+    async def start_script(self, fullpath, index):
+        """Start a script process, using a launcher if possible.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script.
+        index : `int`
+            SAL index of the script.
+
+        Returns
+        -------
+        process : `asyncio.subprocess.Process`
+            The script process.
+        """
+        if self.launcher_pool is not None:
+            process = await self.launcher_pool.launch(fullpath=fullpath, index=index)
+            if process is not None:
+                return process
+        return await self.create_process(fullpath, str(index))
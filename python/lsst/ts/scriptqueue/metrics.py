@@ -0,0 +1,389 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["METRIC_NAMES", "LatencyHistogram", "QueueMetrics"]
+
+import math
+
+# Names of the durations measured by `QueueMetrics`:
+#
+# * load: from starting the script process to the script
+#   reporting that it is ready to be configured.
+# * configure: configuring the script.
+# * run: from commanding the script to run to the script
+#   reporting that it is ending, stopping or failing
+#   (or to the end of the process, if it did not report that).
+# * teardown: from the script reporting that it is ending,
+#   stopping or failing to the end of the process.
+# * gap: from the end of the process of one script
+#   to running the next script, while the queue is running
+#   and the next script is waiting.
+METRIC_NAMES = ("load", "configure", "run", "teardown", "gap")
+
+# Percentiles reported by `LatencyHistogram.summary`.
+_SUMMARY_PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """A histogram of durations with fixed memory and bounded
+    relative error, in the style of HdrHistogram.
+
+    Values are counted in integer units of ``resolution``.
+    Values below ``2**precision_bits`` units each have their own bucket.
+    Above that, each power of two is split into ``2**(precision_bits-1)``
+    equal buckets, so the relative error of a reported value
+    is at most ``2**-precision_bits``.
+
+    Parameters
+    ----------
+    resolution : `float` (optional)
+        Smallest distinguishable value (seconds).
+    max_value : `float` (optional)
+        Largest value that is binned; larger values are counted
+        in the last bucket (seconds). ``max`` is always exact.
+    precision_bits : `int` (optional)
+        Number of bits of precision of each bucket.
+
+    Raises
+    ------
+    ValueError
+        If ``resolution`` or ``max_value`` is not positive,
+        ``max_value`` < ``resolution`` or ``precision_bits`` < 1.
+
+    Attributes
+    ----------
+    count : `int`
+        Number of values added.
+    total : `float`
+        Sum of the values added (seconds).
+    min : `float`
+        Smallest value added, or nan if none.
+    max : `float`
+        Largest value added, or nan if none.
+    """
+
+    def __init__(self, resolution=1e-6, max_value=86400, precision_bits=5):
+        if resolution <= 0:
+            raise ValueError(f"resolution={resolution} must be positive")
+        if max_value < resolution:
+            raise ValueError(f"max_value={max_value} must be >= resolution")
+        if precision_bits < 1:
+            raise ValueError(f"precision_bits={precision_bits} must be positive")
+        self.resolution = resolution
+        self.max_value = max_value
+        self.precision_bits = int(precision_bits)
+        self._max_units = int(max_value / resolution)
+        self.counts = [0] * (self._bucket_index(self._max_units) + 1)
+        self.clear()
+
+    def add(self, value):
+        """Add a value.
+
+        Parameters
+        ----------
+        value : `float`
+            Duration (seconds). Negative values are counted as 0.
+        """
+        value = max(value, 0)
+        units = min(int(value / self.resolution), self._max_units)
+        self.counts[self._bucket_index(units)] += 1
+        self.count += 1
+        self.total += value
+        if self.count == 1:
+            self.min = value
+            self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def clear(self):
+        """Remove all values."""
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = math.nan
+        self.max = math.nan
+
+    def merge(self, other):
+        """Add the values of another histogram to this one.
+
+        Parameters
+        ----------
+        other : `LatencyHistogram`
+            Histogram with the same ``resolution``, ``max_value``
+            and ``precision_bits``.
+
+        Raises
+        ------
+        ValueError
+            If ``other`` has different bins.
+        """
+        if (other.resolution, other.max_value, other.precision_bits) != (
+            self.resolution,
+            self.max_value,
+            self.precision_bits,
+        ):
+            raise ValueError("Cannot merge histograms with different bins")
+        if other.count == 0:
+            return
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        if self.count == 0:
+            self.min = other.min
+            self.max = other.max
+        else:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self):
+        """The mean value (seconds), or nan if there are no values."""
+        return self.total / self.count if self.count > 0 else math.nan
+
+    def percentile(self, percent):
+        """Get the approximate value at the specified percentile.
+
+        Parameters
+        ----------
+        percent : `float`
+            Percentile, in the range [0, 100].
+
+        Returns
+        -------
+        value : `float`
+            The middle of the bucket that holds the value,
+            clipped to [``min``, ``max``] (seconds);
+            exactly ``min`` for the smallest value and ``max`` for the largest.
+            nan if there are no values.
+
+        Raises
+        ------
+        ValueError
+            If ``percent`` is not in the range [0, 100].
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError(f"percent={percent} must be in the range [0, 100]")
+        if self.count == 0:
+            return math.nan
+        rank = max(math.ceil(self.count * percent / 100), 1)
+        if rank == 1:
+            return self.min
+        if rank == self.count:
+            return self.max
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                break
+        lower, upper = self._bucket_bounds(i)
+        value = (lower + upper) / 2 * self.resolution
+        return min(max(value, self.min), self.max)
+
+    def summary(self):
+        """Summarize the values.
+
+        Returns
+        -------
+        summary : `dict`
+            A dict with keys ``count``, ``mean``, ``min``,
+            ``p50``, ``p90``, ``p99`` and ``max``.
+            Durations are in seconds, and are nan if there are no values.
+        """
+        summary = dict(count=self.count, mean=self.mean, min=self.min)
+        for percent in _SUMMARY_PERCENTILES:
+            summary[f"p{percent}"] = self.percentile(percent)
+        summary["max"] = self.max
+        return summary
+
+    def _bucket_index(self, units):
+        """Get the index of the bucket for a value in integer units."""
+        num_bits = units.bit_length()
+        if num_bits <= self.precision_bits:
+            return units
+        shift = num_bits - self.precision_bits
+        half = 1 << (self.precision_bits - 1)
+        return (1 << self.precision_bits) + (shift - 1) * half + (units >> shift) - half
+
+    def _bucket_bounds(self, index):
+        """Get the range of values in a bucket, in integer units:
+        [lower, upper).
+        """
+        exact_size = 1 << self.precision_bits
+        if index < exact_size:
+            return index, index + 1
+        half = exact_size // 2
+        shift, offset = divmod(index - exact_size, half)
+        shift += 1
+        top = half + offset
+        return top << shift, (top + 1) << shift
+
+    def __repr__(self):
+        return (
+            f"LatencyHistogram(count={self.count}, mean={self.mean}, "
+            f"min={self.min}, max={self.max})"
+        )
+
+
+class QueueMetrics:
+    """Histograms of the lifecycle durations of scripts
+    run by a `QueueModel`.
+
+    For each name in `METRIC_NAMES` there are two histograms:
+    one of all values (since construction or `clear`)
+    and one of recent values (since the last call to `rollover`).
+
+    Parameters
+    ----------
+    **kwargs
+        Keyword arguments for `LatencyHistogram`.
+
+    Attributes
+    ----------
+    histograms : `dict` [`str`, `LatencyHistogram`]
+        Histograms of all values, by name.
+    recent_histograms : `dict` [`str`, `LatencyHistogram`]
+        Histograms of recent values, by name.
+    """
+
+    def __init__(self, **kwargs):
+        self.histograms = {name: LatencyHistogram(**kwargs) for name in METRIC_NAMES}
+        self.recent_histograms = {
+            name: LatencyHistogram(**kwargs) for name in METRIC_NAMES
+        }
+
+    def add(self, name, value):
+        """Add a value to the histograms for one metric.
+
+        Parameters
+        ----------
+        name : `str`
+            Metric name; one of `METRIC_NAMES`.
+        value : `float`
+            Duration (seconds).
+
+        Raises
+        ------
+        KeyError
+            If ``name`` is not one of `METRIC_NAMES`.
+        """
+        self.histograms[name].add(value)
+        self.recent_histograms[name].add(value)
+
+    def add_script(self, script_info):
+        """Add the lifecycle durations of a script that has left the queue.
+
+        Durations whose start or end time was not recorded
+        (e.g. because the script was terminated) are skipped.
+
+        Parameters
+        ----------
+        script_info : `ScriptInfo`
+            Script info.
+        """
+
+        def add_if_known(name, start, end):
+            if start > 0 and end > 0:
+                self.add(name, end - start)
+
+        add_if_known(
+            "load",
+            script_info.timestamp_process_start,
+            script_info.timestamp_configure_start,
+        )
+        add_if_known(
+            "configure",
+            script_info.timestamp_configure_start,
+            script_info.timestamp_configure_end,
+        )
+        if script_info.timestamp_run_end > 0:
+            add_if_known(
+                "run", script_info.timestamp_run_start, script_info.timestamp_run_end
+            )
+            add_if_known(
+                "teardown",
+                script_info.timestamp_run_end,
+                script_info.timestamp_process_end,
+            )
+        else:
+            add_if_known(
+                "run",
+                script_info.timestamp_run_start,
+                script_info.timestamp_process_end,
+            )
+
+    def clear(self):
+        """Clear all histograms."""
+        for histogram in self.histograms.values():
+            histogram.clear()
+        for histogram in self.recent_histograms.values():
+            histogram.clear()
+
+    def summary(self):
+        """Summarize all values.
+
+        Returns
+        -------
+        summary : `dict` [`str`, `dict`]
+            `LatencyHistogram.summary` for each metric, by name.
+        """
+        return {name: hist.summary() for name, hist in self.histograms.items()}
+
+    def rollover(self):
+        """Summarize recent values and start a new set of recent values.
+
+        Returns
+        -------
+        summary : `dict` [`str`, `dict`]
+            `LatencyHistogram.summary` of recent values for each metric,
+            by name.
+        """
+        summary = {
+            name: hist.summary() for name, hist in self.recent_histograms.items()
+        }
+        for histogram in self.recent_histograms.values():
+            histogram.clear()
+        return summary
+
+    @staticmethod
+    def format_summary(summary):
+        """Format a summary as a string, one line per metric
+        that has values.
+
+        Durations are shown in milliseconds.
+
+        Parameters
+        ----------
+        summary : `dict` [`str`, `dict`]
+            Summary, as returned by `summary` or `rollover`.
+        """
+        lines = []
+        for name, data in summary.items():
+            if data["count"] == 0:
+                continue
+            durations = "; ".join(
+                f"{key}={data[key]*1000:0.1f}"
+                for key in ("mean", "min", "p50", "p90", "p99", "max")
+            )
+            lines.append(f"{name}: count={data['count']}; {durations} msec")
+        return "\n".join(lines)
@@ -19,42 +19,103 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-__all__ = ["QueueModel"]
+__all__ = ["QueueModel", "StopOutcome"]
 
 import asyncio
 import collections
-import copy
+import enum
+import itertools
 import os
-import pathlib
-
-import astropy.time
 
 from lsst.ts import salobj
 from lsst.ts.idl.enums.Script import ScriptState
 from lsst.ts.idl.enums.ScriptQueue import Location
-from . import utils
+from .indexed_queue import IndexedQueue
+from .launcher import LauncherPool, ScriptLauncher
+from .metrics import QueueMetrics
+from .resource_monitor import read_process_resources
+from .schema_cache import DEFAULT_PREFETCH_NICENESS, SchemaCache
+from .script_index import ScriptIndex
+from .script_path_cache import DEFAULT_PATH_CACHE_TTL, ScriptPathCache
+from .script_publisher import CoalescingScriptPublisher
+from .script_history import ScriptHistory, ScriptHistoryStore
 from .script_info import ScriptInfo
+from .tai import current_tai_isot
+from .tracing import CallTracer
+from .transport import SalScriptTransport
 
 _LOAD_TIMEOUT = 60  # seconds
+# Default maximum number of scripts that `QueueModel.add_many`
+# loads at the same time.
+DEFAULT_MAX_CONCURRENT_LOADS = 8
+# Default maximum number of scripts that `QueueModel.stop_scripts`
+# stops at the same time.
+DEFAULT_MAX_CONCURRENT_STOPS = 8
+# Maximum number of handoff times saved in `QueueModel.handoff_times`.
+_MAX_HANDOFF_TIMES = 100
+# Interval between measurements of event loop lag, when tracing (seconds).
+_LOOP_LAG_INTERVAL = 0.1
+# Functions traced by `QueueModel`, if tracing is enabled.
+_TRACED_FUNCTION_NAMES = (
+    "_script_state_callback",
+    "_script_info_callback",
+    "_update_queue",
+    "queue_callback",
+    "script_callback",
+)
+# Timeout for the ``stop`` command sent to a running script (seconds).
+_STOP_COMMAND_TIMEOUT = 2
+# Time a script is given to exit after the ``stop`` command
+# succeeds, before it is terminated (seconds).
+_STOP_EXIT_TIMEOUT = 5
 
 MIN_SAL_INDEX = 1000
 MAX_HISTORY = 400
 
+# Where a script is, as recorded in ``QueueModel._script_index``.
+_CURRENT = "current"
+_QUEUED = "queued"
+
+
+class StopOutcome(enum.Enum):
+    """What `QueueModel.stop_scripts` did with a script."""
+
+    NOT_FOUND = "not found"
+    """The script is not current or queued."""
+    ALREADY_DONE = "already done"
+    """The script process had already finished."""
+    STOPPED = "stopped"
+    """The script was stopped with the ``stop`` command."""
+    TERMINATED = "terminated"
+    """The script was terminated (sent SIGTERM, or never started)."""
+    FAILED = "failed"
+    """Stopping the script failed; the error is logged."""
+
 
 class Scripts:
     """Struct to hold relative paths to scripts.
 
     Parameters
     ----------
-    standard : ``iterable`` of `str`
+    standard : ``sequence`` of `str`
         Relative paths to standard SAL scripts
-    external : ``iterable`` of `str`
+    external : ``sequence`` of `str`
         Relative paths to external SAL scripts
+    joined_standard : `str` or `None` (optional)
+        ``standard`` joined with ":". Computed if None.
+    joined_external : `str` or `None` (optional)
+        ``external`` joined with ":". Computed if None.
     """
 
-    def __init__(self, standard, external):
+    def __init__(self, standard, external, joined_standard=None, joined_external=None):
         self.standard = standard
         self.external = external
+        self.joined_standard = (
+            ":".join(standard) if joined_standard is None else joined_standard
+        )
+        self.joined_external = (
+            ":".join(external) if joined_external is None else joined_external
+        )
 
 
 class ScriptKey:
@@ -112,17 +173,100 @@ class QueueModel:
         It receives one argument: a `ScriptInfo`.
         This is not called if the only change is to the group ID; see
         ``next_visit_callback`` and ``next_visit_canceled_callback`` for that.
+        Calls may be coalesced; see ``script_callback_interval``.
     min_sal_index : `int` (optional)
         Minimum SAL index for Script SAL components
     max_sal_index : `int` (optional)
         Maximum SAL index for Script SAL components
     verbose : `bool` (optional)
         If True then print log messages from scripts to stdout.
+    history_path : `str`, `os.PathLike` or `None` (optional)
+        Path to a SQLite database in which to save scripts that
+        are dropped from the in-memory history (which holds the most recent
+        ``MAX_HISTORY`` scripts). If None then such scripts are forgotten.
+    history_max_records : `int` (optional)
+        Maximum number of scripts to retain in the ``history_path``
+        database; older scripts are deleted.
+    max_concurrent_loads : `int` (optional)
+        Maximum number of script processes that `add_many`
+        starts at the same time.
+    max_concurrent_stops : `int` (optional)
+        Maximum number of scripts that `stop_scripts`
+        stops at the same time.
+    launcher_pool_size : `int` (optional)
+        Number of pre-started launcher processes to keep ready
+        to run Python scripts; see `LauncherPool`.
+        If 0 then start each script by executing it.
+    schema_cache_path : `str`, `os.PathLike` or `None` (optional)
+        Path of a JSON file in which to save script configuration schemas,
+        so they are remembered across restarts; see `SchemaCache`.
+        If None then schemas are only cached in memory.
+    prefetch_schemas : `bool` (optional)
+        If True then, whenever the queue is enabled, get the configuration
+        schema of every available script in the background, to fill
+        ``schema_cache``; see `start_schema_prefetch`.
+    use_inotify : `bool` (optional)
+        Use inotify, if available, to detect changes to the available
+        scripts? Changes are also detected by checking the modification
+        times of the script directories; see `ScriptIndex`.
+    path_cache_ttl : `float` (optional)
+        Time for which `make_full_path` trusts a validated script path
+        without checking the script again (seconds);
+        see `ScriptPathCache`.
+    validate_configs : `bool` (optional)
+        If True then `add` and `add_many` check the configuration
+        of each script against the script's cached schema, and reject
+        an invalid configuration without starting the script;
+        see `check_config`.
+    lookahead : `int` or `None` (optional)
+        If None then load every script as soon as it is added.
+        Otherwise only load the first ``lookahead`` scripts on the queue
+        (not counting the current script). Other scripts are pending
+        (see `ScriptInfo.pending`) until they move into that window;
+        scripts that move out of it are unloaded (see `ScriptInfo.unload`).
+    resource_sample_interval : `float` or `None` (optional)
+        Interval between samples of the resource use of script processes
+        (seconds); see `sample_resources`. If None then do not sample.
+    memory_budget : `int` or `None` (optional)
+        Maximum total resident memory of script processes (bytes).
+        If exceeded, queued scripts are unloaded, starting at the back
+        of the queue, and loaded again when there is room;
+        see `sample_resources`. If None then there is no limit.
+        Requires ``resource_sample_interval``.
+    metrics_interval : `float` or `None` (optional)
+        Interval between logged summaries of ``metrics``
+        (seconds); see `log_metrics`. If None then do not log summaries.
+    trace_buffer_size : `int` or `None` (optional)
+        If not None then trace calls to the callbacks that handle
+        script events and update the queue (including ``queue_callback``
+        and ``script_callback``) and measure event loop lag,
+        keeping the most recent ``trace_buffer_size`` events in
+        ``tracer``; see `CallTracer`. If None then do not trace.
+    script_callback_interval : `float` (optional)
+        Minimum interval between calls to ``script_callback``
+        for one script (seconds). Changes to a script within this interval
+        are coalesced, so only the latest is reported, except that
+        final states are reported at once; see `CoalescingScriptPublisher`.
+        If 0 then report every change at once.
+    transport : `BaseScriptTransport` or `None` (optional)
+        Transport for communicating with scripts.
+        If None then make a `SalScriptTransport` with a remote
+        for all Script SAL components (index 0) using ``domain``.
+        Specify a `LocalScriptTransport` to run without DDS,
+        e.g. for tests and benchmarks.
+    launcher : `ScriptLauncher` or `None` (optional)
+        Launcher for script processes. If None then make a `ScriptLauncher`
+        that uses the launcher pool, if any.
+        Intended for tests and benchmarks, e.g. with a fake launcher.
 
     Raises
     ------
     ValueError
         If ``standardpath`` or ``externalpath`` does not exist.
+    ValueError
+        If ``launcher`` is specified and ``launcher_pool_size`` > 0.
+    ValueError
+        If ``script_callback_interval`` < 0.
     """
 
     def __init__(
@@ -138,6 +282,24 @@ class QueueModel:
         min_sal_index=MIN_SAL_INDEX,
         max_sal_index=salobj.MAX_SAL_INDEX,
         verbose=False,
+        history_path=None,
+        history_max_records=100000,
+        max_concurrent_loads=DEFAULT_MAX_CONCURRENT_LOADS,
+        max_concurrent_stops=DEFAULT_MAX_CONCURRENT_STOPS,
+        launcher_pool_size=0,
+        schema_cache_path=None,
+        prefetch_schemas=False,
+        use_inotify=True,
+        path_cache_ttl=DEFAULT_PATH_CACHE_TTL,
+        validate_configs=False,
+        lookahead=None,
+        resource_sample_interval=None,
+        memory_budget=None,
+        metrics_interval=None,
+        trace_buffer_size=None,
+        script_callback_interval=0,
+        transport=None,
+        launcher=None,
     ):
         if not os.path.isdir(standardpath):
             raise ValueError(f"No such dir standardpath={standardpath}")
@@ -155,6 +317,43 @@ class QueueModel:
             raise TypeError(f"queue_callback={queue_callback} is not callable")
         if script_callback and not callable(script_callback):
             raise TypeError(f"script_callback={script_callback} is not callable")
+        if max_concurrent_loads < 1:
+            raise ValueError(
+                f"max_concurrent_loads={max_concurrent_loads} must be positive"
+            )
+        if max_concurrent_stops < 1:
+            raise ValueError(
+                f"max_concurrent_stops={max_concurrent_stops} must be positive"
+            )
+        if launcher_pool_size < 0:
+            raise ValueError(
+                f"launcher_pool_size={launcher_pool_size} must not be negative"
+            )
+        if launcher is not None and launcher_pool_size > 0:
+            raise ValueError("Cannot specify launcher with launcher_pool_size > 0")
+        if lookahead is not None and lookahead < 1:
+            raise ValueError(f"lookahead={lookahead} must be None or positive")
+        if resource_sample_interval is not None and resource_sample_interval <= 0:
+            raise ValueError(
+                f"resource_sample_interval={resource_sample_interval} "
+                "must be None or positive"
+            )
+        if memory_budget is not None:
+            if memory_budget <= 0:
+                raise ValueError(
+                    f"memory_budget={memory_budget} must be None or positive"
+                )
+            if resource_sample_interval is None:
+                raise ValueError("memory_budget requires resource_sample_interval")
+        if metrics_interval is not None and metrics_interval <= 0:
+            raise ValueError(
+                f"metrics_interval={metrics_interval} must be None or positive"
+            )
+        if script_callback_interval < 0:
+            raise ValueError(
+                f"script_callback_interval={script_callback_interval} "
+                "must not be negative"
+            )
 
         self.domain = domain
         self.log = log.getChild("QueueModel")
@@ -164,35 +363,134 @@ class QueueModel:
         self.next_visit_canceled_callback = next_visit_canceled_callback
         self.queue_callback = queue_callback
         self.script_callback = script_callback
+        # Publisher that calls script_callback, coalescing changes.
+        self.script_publisher = CoalescingScriptPublisher(
+            callback=self._publish_script, min_interval=script_callback_interval
+        )
         self.min_sal_index = min_sal_index
         self.max_sal_index = max_sal_index
         self.verbose = verbose
+        self.max_concurrent_loads = int(max_concurrent_loads)
+        self.max_concurrent_stops = int(max_concurrent_stops)
+        self.lookahead = None if lookahead is None else int(lookahead)
+        # SAL indices of queued scripts that have been loaded
+        # (or are being loaded) by `_update_lookahead`.
+        self._loaded_indices = set()
+        # dict of SAL index: task loading the script,
+        # for scripts being loaded by `_update_lookahead`.
+        self._load_tasks = dict()
+        self.resource_sample_interval = resource_sample_interval
+        self.memory_budget = memory_budget
+        # Total resident memory of script processes at the last sample.
+        self.total_rss = 0
+        # Recent handoff times: the time from when the process of
+        # the current script finished to when the next script was
+        # commanded to run (seconds), if the next script was ready.
+        self.handoff_times = collections.deque(maxlen=_MAX_HANDOFF_TIMES)
+        # Histograms of script lifecycle durations.
+        self.metrics = QueueMetrics()
+        self.metrics_interval = metrics_interval
+        # Time at which the process of the current script finished,
+        # if the next script was not ready to run; used to measure
+        # the "gap" metric. None if not measuring the gap.
+        self._gap_start_time = None
+        # Number of queued scripts that fit in the memory budget,
+        # or None if the budget has not been exceeded
+        # (or all scripts fit again).
+        self._memory_window = None
         # queue of ScriptInfo instances
-        self.queue = collections.deque()
-        self.history = collections.deque(maxlen=MAX_HISTORY)
+        self.queue = IndexedQueue()
+        history_store = (
+            None
+            if history_path is None
+            else ScriptHistoryStore(path=history_path, max_records=history_max_records)
+        )
+        self.history = ScriptHistory(maxlen=MAX_HISTORY, store=history_store)
+        # Pool of pre-started launcher processes, or None if not used.
+        self.launcher_pool = None
+        if launcher_pool_size > 0:
+            self.launcher_pool = LauncherPool(size=launcher_pool_size, log=self.log)
+            self.launcher_pool.start()
+        # Launcher for script processes.
+        if launcher is None:
+            launcher = ScriptLauncher(launcher_pool=self.launcher_pool)
+        self.launcher = launcher
+        # Cache of script configuration schemas.
+        self.schema_cache = SchemaCache(
+            log=self.log, launcher=self.launcher, path=schema_cache_path
+        )
+        self.prefetch_schemas = prefetch_schemas
+        self.validate_configs = validate_configs
+        # Tasks started by `check_config` to get schemas
+        # that were not cached.
+        self._schema_fetch_tasks = set()
+        # Indices of available standard and external scripts.
+        self.standard_index = ScriptIndex(
+            root=self.standardpath, log=self.log, use_inotify=use_inotify
+        )
+        self.external_index = ScriptIndex(
+            root=self.externalpath, log=self.log, use_inotify=use_inotify
+        )
+        # Caches of validated script paths, used by `make_full_path`.
+        self.standard_path_cache = ScriptPathCache(
+            root=self.standardpath, ttl=path_cache_ttl, index=self.standard_index
+        )
+        self.external_path_cache = ScriptPathCache(
+            root=self.externalpath, ttl=path_cache_ttl, index=self.external_index
+        )
+        self.schema_prefetch_task = salobj.make_done_future()
         self.current_script = None
+        # dict of SAL index: (ScriptInfo, where), where is one of
+        # _CURRENT or _QUEUED. This allows finding the current script
+        # or a queued script without searching the queue.
+        self._script_index = dict()
         self._running = True
         self._enabled = False
         self._index_generator = salobj.index_generator(
             imin=min_sal_index, imax=max_sal_index
         )
+        # SAL indices of scripts being stopped by `stop_scripts`.
+        # Calls to `stop_scripts` may overlap, so each call adds
+        # and later discards only its own scripts.
         self._scripts_being_stopped = set()
-        # use index=0 so we get messages for all scripts
-        self.remote = salobj.Remote(
-            domain=domain, name="Script", index=0, evt_max_history=0
-        )
-        self.remote.evt_metadata.callback = self._script_metadata_callback
-        self.remote.evt_state.callback = self._script_state_callback
+        # Tracer of callbacks, or None if not tracing.
+        self.tracer = None
+        if trace_buffer_size is not None:
+            self.tracer = CallTracer(maxlen=trace_buffer_size)
+            for name in _TRACED_FUNCTION_NAMES:
+                func = getattr(self, name)
+                if func is not None:
+                    setattr(self, name, self.tracer.wrap(name, func))
+            self.tracer.start_loop_lag_monitor(_LOOP_LAG_INTERVAL)
+        if transport is None:
+            # use index=0 so we get messages for all scripts
+            remote = salobj.Remote(
+                domain=domain, name="Script", index=0, evt_max_history=0
+            )
+            transport = SalScriptTransport(remote)
+        self.transport = transport
+        self.transport.set_event_callback("metadata", self._script_metadata_callback)
+        self.transport.set_event_callback("state", self._script_state_callback)
         if self.verbose:
-            self.remote.evt_logMessage.callback = self._log_message_callback
-        self.start_task = self.remote.start_task
+            self.transport.set_event_callback("logMessage", self._log_message_callback)
+        self.start_task = self.transport.start_task
+        self.resource_sample_task = salobj.make_done_future()
+        if self.resource_sample_interval is not None:
+            self.resource_sample_task = asyncio.create_task(
+                self._sample_resources_loop()
+            )
+        self.metrics_task = salobj.make_done_future()
+        if self.metrics_interval is not None:
+            self.metrics_task = asyncio.create_task(self._log_metrics_loop())
 
     async def add(self, script_info, location, location_sal_index):
         """Add a script to the queue.
 
         Launch the script in a new subprocess and wait for the subprocess
         to start. Start a background task to configure the script
-        when it is ready.
+        when it is ready. If the number of loaded scripts is limited
+        (see ``lookahead`` and ``memory_budget``) and the script
+        is not in the window of scripts to load then leave it pending.
 
         Parameters
         ----------
@@ -207,6 +505,9 @@ class QueueModel:
         ------
         ValueError
             If the script does not exist or is not executable.
+        ValueError
+            If ``self.validate_configs`` is true and the configuration
+            does not match the script's cached schema.
         ValueError
             If ``location`` is not one of the supported enum values.
         ValueError
@@ -215,6 +516,8 @@ class QueueModel:
         """
         # do this first to make sure the path exists
         fullpath = self.make_full_path(script_info.is_standard, script_info.path)
+        if self.validate_configs:
+            self.check_config(script_info=script_info, fullpath=fullpath)
 
         self._insert_script(
             script_info=script_info,
@@ -222,8 +525,141 @@ class QueueModel:
             location_sal_index=location_sal_index,
         )
 
-        coro = script_info.start_loading(fullpath=fullpath)
-        await asyncio.wait_for(coro, _LOAD_TIMEOUT)
+        if self._window_size is None:
+            coro = script_info.start_loading(fullpath=fullpath, launcher=self.launcher)
+            await asyncio.wait_for(coro, _LOAD_TIMEOUT)
+        else:
+            # _insert_script started loading the script
+            # if it is in the window of scripts to load.
+            load_task = self._load_tasks.get(script_info.index)
+            if load_task is not None:
+                await load_task
+
+    async def add_many(
+        self, script_infos, location, location_sal_index, max_concurrent=None
+    ):
+        """Add several scripts to the queue, as a block.
+
+        Check all scripts, insert them all in the queue (in the order given)
+        and report the queue once. Then launch the scripts in new
+        subprocesses, several at a time, and wait for the subprocesses
+        to start. Start background tasks to configure the scripts
+        when they are ready. If the number of loaded scripts is limited
+        (see ``lookahead`` and ``memory_budget``) then only load
+        the scripts that are in the window of scripts to load,
+        and ignore ``max_concurrent``.
+
+        Parameters
+        ----------
+        script_infos : ``iterable`` of `ScriptInfo`
+            Script info for each script to add.
+        location : `Location`
+            Location of the first script; the other scripts follow it.
+        location_sal_index : `int`
+            SAL index of script that ``location`` is relative to.
+        max_concurrent : `int` or `None` (optional)
+            Maximum number of scripts to launch at the same time.
+            If None then use ``self.max_concurrent_loads``.
+
+        Returns
+        -------
+        errors : `list` [`Exception` or `None`]
+            For each script, in the order given: None if the process
+            was started, else the exception that prevented it from starting.
+            Scripts that could not be started are terminated
+            (and so are moved from the queue to the history).
+
+        Raises
+        ------
+        ValueError
+            If ``script_infos`` is empty or contains duplicate SAL indices.
+        ValueError
+            If any script does not exist or is not executable.
+        ValueError
+            If ``self.validate_configs`` is true and the configuration
+            of any script does not match its cached schema.
+        ValueError
+            If ``location`` is not one of the supported enum values.
+        ValueError
+            If location is relative and a script at ``location_sal_index``
+            is not queued.
+
+        Notes
+        -----
+        If an exception is raised then no scripts are added.
+        """
+        script_infos = list(script_infos)
+        if not script_infos:
+            raise ValueError("No scripts specified")
+        sal_indices = [script_info.index for script_info in script_infos]
+        if len(set(sal_indices)) != len(sal_indices):
+            raise ValueError(f"Duplicate SAL indices in {sal_indices}")
+        if max_concurrent is None:
+            max_concurrent = self.max_concurrent_loads
+        if max_concurrent < 1:
+            raise ValueError(f"max_concurrent={max_concurrent} must be positive")
+
+        # do this first to make sure the paths exist
+        fullpaths = [
+            self.make_full_path(script_info.is_standard, script_info.path)
+            for script_info in script_infos
+        ]
+        if self.validate_configs:
+            for script_info, fullpath in zip(script_infos, fullpaths):
+                self.check_config(script_info=script_info, fullpath=fullpath)
+
+        with self.queue.transaction():
+            self._place_script(
+                script_info=script_infos[0],
+                location=location,
+                location_sal_index=location_sal_index,
+            )
+            position = self.queue.position(script_infos[0].index)
+            for script_info in script_infos[1:]:
+                position += 1
+                self.queue.insert(position, script_info)
+        for script_info in script_infos:
+            self._script_index[script_info.index] = (script_info, _QUEUED)
+            script_info.callback = self._script_info_callback
+        self._update_queue()
+
+        if self._window_size is None:
+            semaphore = asyncio.Semaphore(max_concurrent)
+
+            async def load_one(script_info, fullpath):
+                async with semaphore:
+                    coro = script_info.start_loading(
+                        fullpath=fullpath, launcher=self.launcher
+                    )
+                    await asyncio.wait_for(coro, _LOAD_TIMEOUT)
+
+            coros = [
+                load_one(script_info=script_info, fullpath=fullpath)
+                for script_info, fullpath in zip(script_infos, fullpaths)
+            ]
+        else:
+            # _update_queue started loading the scripts
+            # that are in the window of scripts to load.
+            async def wait_loaded(load_task):
+                if load_task is not None:
+                    await load_task
+
+            coros = [
+                wait_loaded(self._load_tasks.get(script_info.index))
+                for script_info in script_infos
+            ]
+        results = await asyncio.gather(*coros, return_exceptions=True)
+        errors = []
+        for script_info, result in zip(script_infos, results):
+            if isinstance(result, BaseException):
+                self.log.warning(
+                    f"Could not load script {script_info.index}: {result!r}"
+                )
+                script_info.terminate()
+                errors.append(result)
+            else:
+                errors.append(None)
+        return errors
 
     @property
     def current_index(self):
@@ -242,19 +678,110 @@ class QueueModel:
 
     async def close(self):
         """Shut down the queue, terminate all scripts and free resources."""
+        self.schema_prefetch_task.cancel()
+        self.resource_sample_task.cancel()
+        self.metrics_task.cancel()
+        if self.tracer is not None:
+            self.tracer.stop_loop_lag_monitor()
+        for task in self._schema_fetch_tasks:
+            task.cancel()
         await self.wait_terminate_all()
+        self.script_publisher.flush()
+        for task in self._load_tasks.values():
+            task.cancel()
+        if self.launcher_pool is not None:
+            await self.launcher_pool.close()
+        await self.schema_cache.close()
+        if self.history.store is not None:
+            self.history.store.close()
+        self.standard_index.close()
+        self.external_index.close()
+
+    async def _fetch_schema(self, fullpath):
+        """Get the schema for one script, to fill the schema cache,
+        logging (but otherwise ignoring) failure.
+        """
+        try:
+            await self.schema_cache.get(fullpath, niceness=DEFAULT_PREFETCH_NICENESS)
+        except Exception as e:
+            self.log.warning(f"Could not get schema for {fullpath}: {e!r}")
 
     def find_available_scripts(self):
         """Find available scripts.
 
+        Only directories that have changed since the last call
+        are searched; see `ScriptIndex`.
+
         Returns
         -------
         scripts : `Scripts`
             Paths to standard and external scripts.
         """
+        self.standard_index.refresh()
+        self.external_index.refresh()
         return Scripts(
-            standard=utils.find_public_scripts(self.standardpath),
-            external=utils.find_public_scripts(self.externalpath),
+            standard=self.standard_index.scripts,
+            external=self.external_index.scripts,
+            joined_standard=self.standard_index.joined,
+            joined_external=self.external_index.joined,
+        )
+
+    def check_config(self, script_info, fullpath):
+        """Check a script's configuration against the script's
+        cached schema, without starting the script.
+
+        If the schema is not cached then the configuration is not checked,
+        but a background task is started to get the schema,
+        so that it can be checked next time.
+
+        Parameters
+        ----------
+        script_info : `ScriptInfo`
+            Script info.
+        fullpath : `str` or `os.PathLike`
+            Full path to the script, e.g. as returned by `make_full_path`.
+
+        Returns
+        -------
+        checked : `bool`
+            True if the configuration was checked and is valid,
+            False if it could not be checked.
+
+        Raises
+        ------
+        ValueError
+            If the configuration cannot be parsed
+            or does not match the schema.
+        """
+        try:
+            checked = self.schema_cache.check_config(
+                fullpath=fullpath, config=script_info.config
+            )
+        except ValueError as e:
+            raise ValueError(f"Invalid config for script {script_info.index}: {e}")
+        if not checked:
+            task = asyncio.create_task(self._fetch_schema(fullpath))
+            self._schema_fetch_tasks.add(task)
+            task.add_done_callback(self._schema_fetch_tasks.discard)
+        return checked
+
+    def start_schema_prefetch(self):
+        """Start getting the configuration schema of every available script
+        in the background, to fill ``schema_cache``.
+
+        Scripts are run at low priority, a few at a time;
+        see `SchemaCache.prefetch`. Progress is available as
+        ``schema_cache.prefetch_progress``.
+        Do nothing if prefetching is already in progress.
+        """
+        if not self.schema_prefetch_task.done():
+            return
+        scripts = self.find_available_scripts()
+        fullpaths = [
+            os.path.join(self.standardpath, path) for path in scripts.standard
+        ] + [os.path.join(self.externalpath, path) for path in scripts.external]
+        self.schema_prefetch_task = asyncio.create_task(
+            self.schema_cache.prefetch(fullpaths)
         )
 
     def get_queue_index(self, sal_index):
@@ -270,8 +797,10 @@ class QueueModel:
         ValueError
             If the script cannot be found on the queue.
         """
-        key = ScriptKey(sal_index)
-        return self.queue.index(key)
+        entry = self._script_index.get(sal_index)
+        if entry is None or entry[1] != _QUEUED:
+            raise ValueError(f"Script {sal_index} is not on the queue")
+        return self.queue.position(sal_index)
 
     def get_script_info(self, sal_index, search_history):
         """Get information about a script.
@@ -282,28 +811,37 @@ class QueueModel:
         ----------
         sal_index : `int`
             SAL index of script.
+        search_history : `bool`
+            If True then also search the history, including
+            the history database, if there is one.
+
+        Returns
+        -------
+        script_info : `ScriptInfo` or `ScriptHistoryRecord`
+            Information about the script. This is a `ScriptHistoryRecord`
+            if the script is in the history and its process is done.
 
         Raises
         ------
         ValueError
             If the script cannot be found.
         """
-        if self.current_script and self.current_script.index == sal_index:
-            return self.current_script
-        key = ScriptKey(sal_index)
-        try:
-            return self.queue[self.queue.index(key)]
-        except ValueError:
-            if search_history:
-                pass
-            else:
-                raise
-        return self.history[self.history.index(key)]
+        entry = self._script_index.get(sal_index)
+        if entry is not None:
+            return entry[0]
+        if search_history:
+            script_info = self.history.get(sal_index)
+            if script_info is not None:
+                return script_info
+        raise ValueError(f"Cannot find script {sal_index}")
 
     def make_full_path(self, is_standard, path):
         """Make a full path from path and is_standard and check that
         it points to a runnable script.
 
+        Validated paths are cached for a short time;
+        see ``path_cache_ttl`` and `ScriptPathCache`.
+
         Parameters
         ----------
         is_standard : `bool`
@@ -328,17 +866,10 @@ class QueueModel:
             or private (name starts with "_"),
             or is not executable.
         """
-        root = pathlib.Path(self.standardpath if is_standard else self.externalpath)
-        fullpath = root.joinpath(path)
-        if root not in fullpath.parents:
-            raise ValueError(f"path {path} is not relative to {root}")
-        if not fullpath.is_file():
-            raise ValueError(f"Cannot find script {fullpath}.")
-        if fullpath.name[0] in (".", "_"):
-            raise ValueError(f"script {path} is invisible or private")
-        if not os.access(fullpath, os.X_OK):
-            raise ValueError(f"Script {fullpath} is not executable.")
-        return fullpath
+        path_cache = (
+            self.standard_path_cache if is_standard else self.external_path_cache
+        )
+        return path_cache.get(path)
 
     def move(self, sal_index, location, location_sal_index):
         """Move a script within the queue.
@@ -372,17 +903,15 @@ class QueueModel:
             self._update_queue()
             return
 
-        old_queue = copy.copy(self.queue)
-        script_info = self.pop_script_info(sal_index)
-        try:
-            self._insert_script(
+        self.get_queue_index(sal_index)
+        with self.queue.transaction():
+            script_info = self.queue.remove(ScriptKey(sal_index))
+            self._place_script(
                 script_info=script_info,
                 location=location,
                 location_sal_index=location_sal_index,
             )
-        except Exception:
-            self.queue = old_queue
-            raise
+        self._update_queue()
 
     @property
     def next_sal_index(self):
@@ -403,11 +932,63 @@ class QueueModel:
         ValueError
             If the script cannot be found on the queue.
         """
-        queue_index = self.get_queue_index(sal_index)
-        script_info = self.queue[queue_index]
-        del self.queue[queue_index]
+        self.get_queue_index(sal_index)
+        script_info = self.queue.remove(ScriptKey(sal_index))
+        del self._script_index[sal_index]
         return script_info
 
+    def reorder(self, sal_indices):
+        """Reorder the queue.
+
+        Parameters
+        ----------
+        sal_indices : ``sequence`` of `int`
+            SAL indices of queued scripts, in the desired order.
+            If this is a subset of the queued scripts then these scripts
+            are moved to the front of the queue, in the order given,
+            and the other scripts follow in their existing order.
+
+        Raises
+        ------
+        ValueError
+            If ``sal_indices`` is empty, contains duplicates,
+            or contains a script that is not queued.
+            The queue is not changed.
+
+        Notes
+        -----
+        Takes O(n) time, where n is the length of the queue,
+        and reports the queue only once.
+        """
+        sal_indices = list(sal_indices)
+        if not sal_indices:
+            raise ValueError("No scripts specified")
+        sal_index_set = set(sal_indices)
+        if len(sal_index_set) != len(sal_indices):
+            raise ValueError(f"Duplicate SAL indices in {sal_indices}")
+        missing_indices = [
+            sal_index for sal_index in sal_indices if not self._is_queued(sal_index)
+        ]
+        if missing_indices:
+            raise ValueError(f"Scripts {missing_indices} are not on the queue")
+
+        old_top_script = self.queue[0]
+        new_items = [self.queue.get(sal_index) for sal_index in sal_indices]
+        if len(sal_indices) < len(self.queue):
+            new_items += [
+                script_info
+                for script_info in self.queue
+                if script_info.index not in sal_index_set
+            ]
+        self.queue.reset(new_items)
+
+        # Only the top script can have a group ID.
+        if old_top_script is not self.queue[0] and (
+            old_top_script.group_id or old_top_script.setting_group_id
+        ):
+            self.clear_group_id(old_top_script, command_script=True)
+        self._update_queue()
+
     async def requeue(self, sal_index, seq_num, location, location_sal_index):
         """Requeue a script.
 
@@ -450,7 +1031,7 @@ class QueueModel:
 
         script_info = ScriptInfo(
             log=self.log,
-            remote=self.remote,
+            transport=self.transport,
             index=self.next_sal_index,
             seq_num=seq_num,
             is_standard=old_script_info.is_standard,
@@ -466,7 +1047,7 @@ class QueueModel:
         )
         return script_info
 
-    async def stop_scripts(self, sal_indices, terminate):
+    async def stop_scripts(self, sal_indices, terminate, max_concurrent=None):
         """Stop one or more queued scripts and/or the current script.
 
         Silently ignores scripts that cannot be found or are already stopped.
@@ -479,29 +1060,93 @@ class QueueModel:
         terminate : `bool`
             Terminate a running script instead of giving it time
             to stop gently?
+        max_concurrent : `int` or `None` (optional)
+            Maximum number of scripts to send the ``stop`` command to
+            at the same time. If None use ``self.max_concurrent_stops``.
+
+        Returns
+        -------
+        outcomes : `dict` [`int`, `StopOutcome`]
+            What was done with each script, by SAL index.
+
+        Raises
+        ------
+        ValueError
+            If ``max_concurrent`` < 1.
+
+        Notes
+        -----
+        Scripts that are to be terminated (all of them, if ``terminate``
+        is true, else those that are not running) are all sent SIGTERM
+        before waiting for any of them to exit. Running scripts that are
+        to be stopped gently are sent the ``stop`` command concurrently,
+        at most ``max_concurrent`` at a time; see `stop_one_script`.
         """
-        self._scripts_being_stopped = set()
+        if max_concurrent is None:
+            max_concurrent = self.max_concurrent_stops
+        if max_concurrent < 1:
+            raise ValueError(f"max_concurrent={max_concurrent} must be positive")
+
+        outcomes = dict()
         script_info_list = []
         for index in sal_indices:
+            if index in outcomes:
+                continue
             try:
                 script_info = self.get_script_info(index, search_history=False)
             except ValueError:
+                outcomes[index] = StopOutcome.NOT_FOUND
                 continue
             if script_info.process_done:
+                outcomes[index] = StopOutcome.ALREADY_DONE
                 continue
-            self._scripts_being_stopped.add(index)
+            outcomes[index] = None
             script_info_list.append(script_info)
+        own_indices = {script_info.index for script_info in script_info_list}
+        self._scripts_being_stopped |= own_indices
+
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def stop_gently(script_info):
+            async with semaphore:
+                if await self.stop_one_script(script_info):
+                    return StopOutcome.STOPPED
+                return StopOutcome.TERMINATED
+
+        async def wait_terminated(script_info, did_terminate):
+            await self._wait_terminated(script_info)
+            if did_terminate:
+                return StopOutcome.TERMINATED
+            # The script finished before it could be terminated.
+            return StopOutcome.ALREADY_DONE
 
         try:
+            coros = []
             for script_info in script_info_list:
-                if script_info.process_done:
-                    continue
                 if script_info.running and not terminate:
-                    await self.stop_one_script(script_info)
+                    coros.append(stop_gently(script_info))
                 else:
-                    await self.terminate_one_script(script_info)
+                    # Send SIGTERM now; wait for the process below.
+                    did_terminate = self._start_terminate(script_info)
+                    coros.append(wait_terminated(script_info, did_terminate))
+            results = await asyncio.gather(*coros, return_exceptions=True)
+            for script_info, result in zip(script_info_list, results):
+                if isinstance(result, Exception):
+                    self.log.warning(
+                        f"Failed to stop script {script_info.index}: {result!r}"
+                    )
+                    result = StopOutcome.FAILED
+                elif isinstance(result, BaseException):
+                    raise result
+                outcomes[script_info.index] = result
         finally:
-            self._scripts_being_stopped = set()
+            # Scripts that were removed have already been discarded
+            # by _remove_script; discard any that remain.
+            remaining_indices = own_indices & self._scripts_being_stopped
+            self._scripts_being_stopped -= remaining_indices
+            if remaining_indices and not self._scripts_being_stopped:
+                self._update_queue()
+        return outcomes
 
     async def stop_one_script(self, script_info):
         """Stop a queued or running script, giving it time to clean up.
@@ -518,24 +1163,33 @@ class QueueModel:
         ----------
         script_info : `ScriptInfo`
             Script info for script stop.
+
+        Returns
+        -------
+        stopped : `bool`
+            True if the script exited in response to the ``stop`` command,
+            False if it had to be terminated (or was already done).
         """
         if script_info.process_done:
-            return
+            return False
         if script_info.script_state == ScriptState.RUNNING:
             # process is running, so send the "stop" command
             try:
-                await script_info.remote.cmd_stop.set_start(
-                    ScriptID=script_info.index, timeout=2
+                await script_info.transport.send_command(
+                    "stop", script_info.index, timeout=_STOP_COMMAND_TIMEOUT
                 )
                 # give the process time to terminate
-                await asyncio.wait_for(script_info.process.wait(), timeout=5)
+                await asyncio.wait_for(
+                    script_info.process.wait(), timeout=_STOP_EXIT_TIMEOUT
+                )
                 # let the script be removed or moved
                 await asyncio.sleep(0)
-                return
+                return True
             except Exception:
                 # oh well, terminate it instead
                 pass
         await self.terminate_one_script(script_info)
+        return False
 
     async def terminate_one_script(self, script_info):
         """Terminate a queued or running script.
@@ -550,31 +1204,9 @@ class QueueModel:
         ----------
         script_info : `ScriptInfo`
             Script info for script terminate.
-
-        Raises
-        ------
-        ValueError
-            If a script is not queued or running.
         """
-        if script_info.process_done:
-            return
-        # Clear the group ID, if appropriate. Do not command the script,
-        # since we are about to kill it anyway.
-        if (
-            self.queue
-            and self.queue[0].index == script_info.index
-            and script_info.group_id
-            or script_info.setting_group_id
-        ):
-            self.clear_group_id(script_info=script_info, command_script=False)
-
-        # Kill the script
-        did_terminate = script_info.terminate()
-        if did_terminate:
-            if script_info.process is not None:
-                await script_info.process.wait()
-            # let the script be removed or moved
-            await asyncio.sleep(0)
+        if self._start_terminate(script_info):
+            await self._wait_terminated(script_info)
 
     @property
     def enabled(self):
@@ -589,7 +1221,13 @@ class QueueModel:
         was_enabled = self._enabled
         self._enabled = bool(enabled)
         if self.enabled != was_enabled:
+            self._gap_start_time = None
             self._update_queue()
+            if self.prefetch_schemas:
+                if self.enabled:
+                    self.start_schema_prefetch()
+                else:
+                    self.schema_prefetch_task.cancel()
 
     @property
     def running(self):
@@ -604,6 +1242,8 @@ class QueueModel:
         was_running = self._running
         self._running = bool(run)
         if self._running != was_running:
+            # Time paused is not a gap between scripts.
+            self._gap_start_time = None
             self._update_queue(pause_on_failure=False)
 
     @staticmethod
@@ -615,7 +1255,7 @@ class QueueModel:
         Here is an example:
         "2020-01-17T22:59:05.721"
         """
-        return astropy.time.Time.now().tai.isot
+        return current_tai_isot()
 
     def terminate_all(self):
         """Terminate all scripts and return info for the ones terminated.
@@ -655,15 +1295,78 @@ class QueueModel:
         info_list = self.terminate_all()
         await asyncio.wait_for(
             asyncio.gather(
-                *[info.process_task for info in info_list if not info.process_done]
+                *[
+                    info.process_task
+                    for info in info_list
+                    if info.process_task is not None and not info.process_done
+                ]
             ),
             timeout,
         )
         return info_list
 
+    def _start_terminate(self, script_info):
+        """Send SIGTERM to a script, without waiting for it to exit.
+
+        Returns
+        -------
+        did_terminate : `bool`
+            True if the script was terminated, False if it was already done.
+        """
+        if script_info.process_done:
+            return False
+        # Clear the group ID, if appropriate. Do not command the script,
+        # since we are about to kill it anyway.
+        if (
+            self.queue
+            and self.queue[0].index == script_info.index
+            and script_info.group_id
+            or script_info.setting_group_id
+        ):
+            self.clear_group_id(script_info=script_info, command_script=False)
+        return script_info.terminate()
+
+    async def _wait_terminated(self, script_info):
+        """Wait for a script terminated by `_start_terminate` to exit."""
+        if script_info.process is not None:
+            await script_info.process.wait()
+        # let the script be removed or moved
+        await asyncio.sleep(0)
+
     def _insert_script(self, script_info, location, location_sal_index):
         """Insert a script info into the queue.
 
+        Parameters
+        ----------
+        script_info : `ScriptInfo`
+            Script info.
+        location : `Location`
+            Location of script.
+        location_sal_index : `int`
+            SAL index of script that ``location`` is relative to.
+
+        Raises
+        ------
+        ValueError
+            If ``location`` is not one of the supported enum values.
+        ValueError
+            If location is relative and a script at ``location_sal_index``
+            is not queued.
+        """
+        self._place_script(
+            script_info=script_info,
+            location=location,
+            location_sal_index=location_sal_index,
+        )
+        self._script_index[script_info.index] = (script_info, _QUEUED)
+        script_info.callback = self._script_info_callback
+        self._update_queue()
+
+    def _place_script(self, script_info, location, location_sal_index):
+        """Put a script info into ``self.queue`` at the specified location.
+
+        Unlike `_insert_script` this only updates ``self.queue``.
+
         Parameters
         ----------
         script_info : `ScriptInfo`
@@ -689,16 +1392,10 @@ class QueueModel:
             location_queue_index = self.get_queue_index(location_sal_index)
             if location == Location.AFTER:
                 location_queue_index += 1
-            if location_queue_index >= len(self.queue):
-                self.queue.append(script_info)
-            else:
-                self.queue.insert(location_queue_index, script_info)
+            self.queue.insert(location_queue_index, script_info)
         else:
             raise ValueError(f"Unknown location {location}")
 
-        script_info.callback = self._script_info_callback
-        self._update_queue()
-
     async def _remove_script(self, sal_index):
         """Remove a script from the queue."""
         key = ScriptKey(sal_index)
@@ -712,9 +1409,9 @@ class QueueModel:
             else:
                 # removal is handled by _update_queue
                 self._update_queue()
-        elif key in self.queue:
+        elif self._is_queued(sal_index):
             script_info = self.pop_script_info(sal_index)
-            self.history.appendleft(script_info)
+            self._append_history(script_info)
             if sal_index in self._scripts_being_stopped:
                 self._scripts_being_stopped.remove(sal_index)
                 if not self._scripts_being_stopped:
@@ -724,6 +1421,27 @@ class QueueModel:
             else:
                 self._update_queue()
 
+    def _append_history(self, script_info):
+        """Add a script to the start of the history.
+
+        The oldest script in the history is dropped from memory,
+        if necessary, to keep the history from growing beyond
+        ``MAX_HISTORY``.
+
+        Parameters
+        ----------
+        script_info : `ScriptInfo`
+            Script info.
+        """
+        self._script_index.pop(script_info.index, None)
+        self.metrics.add_script(script_info)
+        self.history.appendleft(script_info)
+
+    def _is_queued(self, sal_index):
+        """Return True if the specified script is on the queue."""
+        entry = self._script_index.get(sal_index)
+        return entry is not None and entry[1] == _QUEUED
+
     def _log_message_callback(self, data):
         """Print Script logMessage data to stdout.
 
@@ -819,6 +1537,14 @@ class QueueModel:
             return None
         return script_info
 
+    def _publish_script(self, script_info):
+        """Call ``script_callback``, if any; used by ``script_publisher``."""
+        if self.script_callback:
+            try:
+                self.script_callback(script_info)
+            except Exception:
+                self.log.exception("script_callback failed; continuing")
+
     def _script_metadata_callback(self, data):
         script_info = self._script_info_from_data(event_name="metadata", data=data)
         if script_info:
@@ -831,11 +1557,17 @@ class QueueModel:
 
     def _script_info_callback(self, script_info):
         """ScriptInfo callback."""
-        if self.script_callback:
-            try:
-                self.script_callback(script_info)
-            except Exception:
-                self.log.exception("script_callback failed; continuing")
+        self.script_publisher.put(script_info)
+
+        if (
+            script_info.process_done
+            and script_info is self.current_script
+            and script_info.index not in self._scripts_being_stopped
+        ):
+            # The current script is done; start the next script now,
+            # rather than in a new task, to minimize the handoff time.
+            self._update_queue()
+            return
 
         if script_info.process_done or script_info.terminated:
             asyncio.create_task(self._remove_script(script_info.index))
@@ -850,6 +1582,259 @@ class QueueModel:
             # or be ready to be run.
             self._update_queue(force_callback=False)
 
+    def _record_handoff(self, finished_script, next_script):
+        """Record the handoff time from a script that finished
+        to the next script, which was ready to run.
+
+        Parameters
+        ----------
+        finished_script : `ScriptInfo`
+            The script that finished.
+        next_script : `ScriptInfo`
+            The script that was just commanded to run.
+        """
+        handoff_time = (
+            next_script.timestamp_run_start - finished_script.timestamp_process_end
+        )
+        self.handoff_times.append(handoff_time)
+        self.metrics.add("gap", handoff_time)
+        self.log.debug(
+            f"Handoff from script {finished_script.index} "
+            f"to script {next_script.index} took {handoff_time*1000:0.1f} msec"
+        )
+
+    def _update_lookahead(self):
+        """Load the scripts in the lookahead window and unload
+        loaded scripts that have moved out of it.
+
+        The window is limited by ``self.lookahead`` and, if the memory
+        budget has been exceeded, by the number of scripts that fit
+        in the budget. Does nothing if there is no limit.
+        Scripts that move out of the window while being loaded
+        are unloaded when loading finishes.
+        """
+        window_size = self._window_size
+        if window_size is None:
+            return
+        for sal_index in list(self._loaded_indices):
+            if not self._is_queued(sal_index):
+                self._loaded_indices.discard(sal_index)
+                continue
+            if self.queue.position(sal_index) < window_size:
+                continue
+            script_info = self.queue.get(sal_index)
+            if (
+                script_info.process is None
+                or script_info.process_done
+                or script_info.terminated
+            ):
+                continue
+            script_info.unload()
+            self._loaded_indices.discard(sal_index)
+
+        for script_info in itertools.islice(self.queue, window_size):
+            if script_info.pending and script_info.index not in self._load_tasks:
+                self._loaded_indices.add(script_info.index)
+                load_task = asyncio.create_task(self._load_script(script_info))
+                load_task.add_done_callback(self._load_task_done)
+                self._load_tasks[script_info.index] = load_task
+
+    @property
+    def _window_size(self):
+        """The number of queued scripts that may be loaded,
+        or None if there is no limit.
+        """
+        sizes = [
+            size for size in (self.lookahead, self._memory_window) if size is not None
+        ]
+        return min(sizes) if sizes else None
+
+    def sample_resources(self):
+        """Sample the resource use of the script processes
+        and enforce the memory budget, if any.
+
+        Set ``resources`` of each `ScriptInfo` with a process
+        and ``self.total_rss``.
+
+        If the total resident memory exceeds ``self.memory_budget``
+        then unload idle queued scripts, starting at the back of the queue,
+        until the total fits. The next script to run is never unloaded.
+        Unloaded scripts are pending until there is room for them:
+        while the total is below the budget by at least the mean memory
+        of the loaded scripts, one more script is loaded per sample.
+
+        Returns
+        -------
+        total_rss : `int`
+            Total resident memory of the script processes (bytes).
+        """
+        script_infos = list(self.queue)
+        if self.current_script is not None:
+            script_infos.append(self.current_script)
+        total_rss = 0
+        num_sampled = 0
+        for script_info in script_infos:
+            if script_info.process is None or script_info.process_done:
+                continue
+            script_info.resources = read_process_resources(
+                script_info.process.pid, previous=script_info.resources
+            )
+            if script_info.resources is not None:
+                total_rss += script_info.resources.rss
+                num_sampled += 1
+        self.total_rss = total_rss
+        self.log.debug(
+            f"Sampled resources of {num_sampled} scripts; "
+            f"total RSS={total_rss / 2**20:0.1f} MiB"
+        )
+        if self.memory_budget is None:
+            return total_rss
+
+        if total_rss > self.memory_budget:
+            self._shrink_memory_window(total_rss)
+        elif (
+            self._memory_window is not None and num_sampled > 0 and not self._load_tasks
+        ):
+            # Only grow the window when no scripts are loading,
+            # so the memory of the most recently loaded script is known.
+            mean_rss = total_rss / num_sampled
+            if total_rss + mean_rss <= self.memory_budget:
+                self._memory_window += 1
+                self._update_lookahead()
+                max_window = (
+                    len(self.queue) if self.lookahead is None else self.lookahead
+                )
+                if self._memory_window >= max_window:
+                    # All the scripts that may be loaded fit.
+                    self._memory_window = None
+                    if self.lookahead is None:
+                        # Load new scripts as they are added.
+                        self._loaded_indices.clear()
+        return total_rss
+
+    def _shrink_memory_window(self, total_rss):
+        """Unload queued scripts, starting at the back of the queue,
+        until the total resident memory fits in the memory budget.
+
+        Parameters
+        ----------
+        total_rss : `int`
+            Total resident memory of the script processes (bytes).
+        """
+        # Loaded scripts other than the next script to run.
+        candidates = [
+            script_info
+            for script_info in itertools.islice(self.queue, 1, None)
+            if script_info.process is not None
+            and not script_info.process_done
+            and not script_info.terminated
+        ]
+        unloaded_indices = []
+        while candidates and total_rss > self.memory_budget:
+            script_info = candidates.pop()
+            if script_info.resources is not None:
+                total_rss -= script_info.resources.rss
+            unloaded_indices.append(script_info.index)
+            script_info.unload()
+        if not unloaded_indices:
+            self.log.warning(
+                f"Script memory {self.total_rss / 2**20:0.1f} MiB exceeds "
+                f"the budget of {self.memory_budget / 2**20:0.1f} MiB, "
+                "but there are no idle scripts to unload"
+            )
+            return
+        self.log.warning(
+            f"Script memory {self.total_rss / 2**20:0.1f} MiB exceeds "
+            f"the budget of {self.memory_budget / 2**20:0.1f} MiB; "
+            f"unloaded scripts {unloaded_indices}"
+        )
+        # The window ends just before the frontmost unloaded script.
+        self._memory_window = max(self.queue.position(unloaded_indices[-1]), 1)
+        self._loaded_indices.update(
+            script_info.index
+            for script_info in itertools.islice(self.queue, self._memory_window)
+            if not script_info.pending
+        )
+        self._update_lookahead()
+
+    def log_metrics(self):
+        """Log a summary of the metrics recorded since the previous call,
+        and start a new set of recent metrics.
+
+        The summary is logged at INFO level, so the ``ScriptQueue`` CSC
+        publishes it as a ``logMessage`` event.
+        Nothing is logged if there are no recent metrics.
+
+        Returns
+        -------
+        summary : `dict` [`str`, `dict`]
+            The summary of recent metrics; see `QueueMetrics.rollover`.
+        """
+        summary = self.metrics.rollover()
+        summary_str = self.metrics.format_summary(summary)
+        if summary_str:
+            self.log.info(f"Script metrics:\n{summary_str}")
+        return summary
+
+    async def _log_metrics_loop(self):
+        """Call `log_metrics` every ``metrics_interval`` seconds."""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            try:
+                self.log_metrics()
+            except Exception:
+                self.log.exception("log_metrics failed; continuing")
+
+    async def _sample_resources_loop(self):
+        """Call `sample_resources` every ``resource_sample_interval``
+        seconds.
+        """
+        while True:
+            try:
+                self.sample_resources()
+            except Exception:
+                self.log.exception("sample_resources failed; continuing")
+            await asyncio.sleep(self.resource_sample_interval)
+
+    async def _load_script(self, script_info):
+        """Load a script in the lookahead window.
+
+        Parameters
+        ----------
+        script_info : `ScriptInfo`
+            Script info.
+
+        Raises
+        ------
+        ValueError
+            If the script no longer exists or is not executable,
+            in which case it is terminated.
+        """
+        try:
+            try:
+                fullpath = self.make_full_path(
+                    script_info.is_standard, script_info.path
+                )
+            except ValueError as e:
+                self.log.warning(f"Could not load script {script_info.index}: {e}")
+                script_info.terminate()
+                raise
+            coro = script_info.start_loading(fullpath=fullpath, launcher=self.launcher)
+            await asyncio.wait_for(coro, _LOAD_TIMEOUT)
+        finally:
+            del self._load_tasks[script_info.index]
+            # Unload the script if it left the window while loading.
+            self._update_lookahead()
+
+    def _load_task_done(self, load_task):
+        """Retrieve the exception of a `_load_script` task, so asyncio
+        does not warn about it if nobody awaits the task.
+
+        Failures are logged by `_load_script` and `ScriptInfo`.
+        """
+        if not load_task.cancelled():
+            load_task.exception()
+
     def _update_queue(self, force_callback=True, pause_on_failure=True):
         """Call whenever the queue changes state.
 
@@ -870,9 +1855,13 @@ class QueueModel:
               script to history. This is intended for use by ``running``
               to allow the queue to resume after pausing on failure.
         """
-        initial_current_index = self.current_index
-        initial_queue_indices = self.queue_indices
-        initial_history_indices = self.history_indices
+        initial_state = (
+            self.current_index,
+            self.queue.version,
+            self.history.version,
+        )
+        # The script that finished, if it is moved to history here.
+        finished_script = None
         if self.current_script:
             if self.current_script.process_done:
                 if self.current_script.failed and (
@@ -882,7 +1871,8 @@ class QueueModel:
                     # not trigger _update_queue
                     self._running = False
                 else:
-                    self.history.appendleft(self.current_script)
+                    finished_script = self.current_script
+                    self._append_history(self.current_script)
                     self.current_script = None
 
         if self.enabled and self.running:
@@ -893,8 +1883,8 @@ class QueueModel:
                 # on the queue if it's not yet runnable.
                 script_info = self.queue[0]
                 if script_info.process_done or script_info.terminated:
-                    self.history.appendleft(script_info)
                     self.queue.popleft()
+                    self._append_history(script_info)
                     continue
                 if (
                     not self.current_script
@@ -903,8 +1893,21 @@ class QueueModel:
                 ):
                     self.current_script = script_info
                     self.queue.popleft()
+                    self._script_index[script_info.index] = (script_info, _CURRENT)
                     script_info.run()
+                    if finished_script is not None:
+                        self._record_handoff(finished_script, script_info)
+                    elif self._gap_start_time is not None:
+                        self.metrics.add(
+                            "gap",
+                            script_info.timestamp_run_start - self._gap_start_time,
+                        )
+                    self._gap_start_time = None
                 break
+            if finished_script is not None and self.queue and not self.current_script:
+                # The next script is not ready to run;
+                # measure the gap when it runs.
+                self._gap_start_time = finished_script.timestamp_process_end
 
             # Set the group ID of the top script, if needed
             # and clear the group ID of any other scripts, if needed
@@ -918,12 +1921,12 @@ class QueueModel:
                     if script_info.group_id or script_info.setting_group_id:
                         self.clear_group_id(script_info, command_script=True)
 
-        if (
-            self.queue_callback
-            and force_callback
-            or self.current_index != initial_current_index
-            or self.queue_indices != initial_queue_indices
-            or self.history_indices != initial_history_indices
+        self._update_lookahead()
+
+        if self.queue_callback and (
+            force_callback
+            or (self.current_index, self.queue.version, self.history.version)
+            != initial_state
         ):
             try:
                 self.queue_callback()
@@ -0,0 +1,91 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ProcessResources", "read_process_resources"]
+
+import collections
+import os
+import time
+
+_CLOCK_TICKS_PER_SEC = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+ProcessResources = collections.namedtuple(
+    "ProcessResources",
+    ["pid", "timestamp", "rss", "cpu_time", "cpu_percent", "num_fds"],
+)
+ProcessResources.__doc__ = """Resource use of a process,
+as read by `read_process_resources`.
+
+Fields are ``pid`` (process ID), ``timestamp`` (time of the sample,
+unix seconds), ``rss`` (resident set size, bytes), ``cpu_time``
+(user + system CPU time, seconds), ``cpu_percent`` (CPU use since
+the previous sample, percent of one core; 0 if there is no previous
+sample) and ``num_fds`` (number of open file descriptors).
+"""
+
+
+def read_process_resources(pid, previous=None):
+    """Read the resource use of a process from ``/proc/<pid>``.
+
+    Parameters
+    ----------
+    pid : `int`
+        Process ID.
+    previous : `ProcessResources` or `None` (optional)
+        The previous sample for this process, if any,
+        used to compute ``cpu_percent``.
+        Ignored if its ``pid`` does not match.
+
+    Returns
+    -------
+    resources : `ProcessResources` or `None`
+        Resource use, or None if the process does not exist
+        or ``/proc`` cannot be read (e.g. the OS is not Linux).
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat_data = f.read()
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            statm_data = f.read()
+        num_fds = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return None
+    timestamp = time.time()
+    # The command name (field 2) is in parentheses and may contain
+    # spaces, so split the fields that follow the last ")".
+    # utime and stime are fields 14 and 15.
+    fields = stat_data[stat_data.rindex(b")") + 2 :].split()
+    cpu_time = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS_PER_SEC
+    rss = int(statm_data.split()[1]) * _PAGE_SIZE
+    cpu_percent = 0
+    if previous is not None and previous.pid == pid and timestamp > previous.timestamp:
+        cpu_percent = (
+            100 * (cpu_time - previous.cpu_time) / (timestamp - previous.timestamp)
+        )
+    return ProcessResources(
+        pid=pid,
+        timestamp=timestamp,
+        rss=rss,
+        cpu_time=cpu_time,
+        cpu_percent=cpu_percent,
+        num_fds=num_fds,
+    )
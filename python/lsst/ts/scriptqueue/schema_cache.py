@@ -0,0 +1,500 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["SchemaCache", "SchemaPrefetchProgress"]
+
+import asyncio
+import functools
+import json
+import os
+import subprocess
+import time
+
+import jsonschema
+import yaml
+
+from lsst.ts import salobj
+from .launcher import ScriptLauncher
+
+# Time limit for a script to output its schema (seconds).
+SCHEMA_TIMEOUT = 20
+# Default maximum number of scripts `SchemaCache.prefetch` runs at once.
+DEFAULT_PREFETCH_CONCURRENCY = 2
+# Default niceness increment of scripts run by `SchemaCache.prefetch`.
+DEFAULT_PREFETCH_NICENESS = 10
+# Default delay between adding a schema and saving the cache file (seconds).
+DEFAULT_SAVE_DELAY = 5
+
+
+class SchemaPrefetchProgress:
+    """Progress of `SchemaCache.prefetch`.
+
+    Attributes
+    ----------
+    num_scripts : `int`
+        Number of scripts to prefetch.
+    num_done : `int`
+        Number of scripts whose schema has been obtained
+        (from the cache or by running the script), or failed.
+    num_failed : `int`
+        Number of scripts whose schema could not be obtained.
+    start_time : `float`
+        Time at which prefetching started (unix seconds).
+    end_time : `float`
+        Time at which prefetching finished (unix seconds), or 0 if not done.
+    """
+
+    def __init__(self, num_scripts):
+        self.num_scripts = num_scripts
+        self.num_done = 0
+        self.num_failed = 0
+        self.start_time = time.time()
+        self.end_time = 0
+
+    @property
+    def done(self):
+        """Is prefetching finished?"""
+        return self.end_time > 0
+
+    @property
+    def duration(self):
+        """Time spent prefetching so far, or in total if done (sec)."""
+        end_time = self.end_time if self.done else time.time()
+        return end_time - self.start_time
+
+    def __repr__(self):
+        return (
+            f"SchemaPrefetchProgress(num_scripts={self.num_scripts}, "
+            f"num_done={self.num_done}, num_failed={self.num_failed}, "
+            f"duration={self.duration:0.2f})"
+        )
+
+
+class SchemaCache:
+    """Cache of script configuration schemas.
+
+    A script's schema is obtained by running the script with ``--schema``.
+    Schemas are cached by full path, and a cached schema is used
+    only if the script's modification time, size and inode
+    are unchanged. Concurrent requests for the same schema
+    share one script process. Validators compiled from the schemas
+    are cached as well; see `check_config`.
+
+    Parameters
+    ----------
+    log : `logging.Logger`
+        Parent logger.
+    launcher : `ScriptLauncher` or `None` (optional)
+        Launcher used to run scripts. If None then use a default
+        `ScriptLauncher`.
+    path : `str`, `os.PathLike` or `None` (optional)
+        Path of a JSON file in which to save the cache, so it persists
+        across restarts. It is read, if it exists, and rewritten
+        (in a thread, so as not to block the event loop)
+        ``save_delay`` seconds after a schema is added,
+        at the end of `prefetch`, and by `save` and `close`.
+        If None then the cache is only kept in memory.
+    timeout : `float` (optional)
+        Time limit for a script to output its schema (seconds).
+    save_delay : `float` (optional)
+        Delay between adding a schema and saving the cache file (seconds),
+        so that schemas added in quick succession are saved together.
+    """
+
+    def __init__(
+        self,
+        log,
+        launcher=None,
+        path=None,
+        timeout=SCHEMA_TIMEOUT,
+        save_delay=DEFAULT_SAVE_DELAY,
+    ):
+        self.log = log.getChild("SchemaCache")
+        self.launcher = ScriptLauncher() if launcher is None else launcher
+        self.path = path
+        self.timeout = timeout
+        self.save_delay = save_delay
+        # Has the cache changed since it was last saved?
+        self._dirty = False
+        # Number of calls to `prefetch` in progress; the cache file
+        # is saved at the end of prefetching, rather than after a delay.
+        self._num_prefetching = 0
+        # asyncio.TimerHandle for the next delayed save, or None.
+        self._save_handle = None
+        # Task saving the cache file, started by the timer.
+        self._save_task = salobj.make_done_future()
+        # Lock that serializes writing the cache file.
+        self._save_lock = asyncio.Lock()
+        # dict of full path: (stat key, schema)
+        self._cache = dict()
+        # dict of (full path, stat key): task that gets the schema
+        self._tasks = dict()
+        # dict of schema: validator, or None if the schema is empty
+        # or cannot be parsed
+        self._validators = dict()
+        # Number of schemas served from the cache and by running a script.
+        self.num_hits = 0
+        self.num_misses = 0
+        # Progress of the most recent call to `prefetch`, or None.
+        self.prefetch_progress = None
+        if self.path is not None:
+            self._load()
+
+    async def get(self, fullpath, niceness=0):
+        """Get the configuration schema for a script.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script.
+        niceness : `int` (optional)
+            Niceness increment (see `os.nice`) for the script process,
+            if the script must be run.
+
+        Returns
+        -------
+        schema : `str`
+            The schema, as output by the script.
+
+        Raises
+        ------
+        OSError
+            If the script does not exist.
+        asyncio.TimeoutError
+            If the script does not output its schema in time.
+        """
+        fullpath = os.path.abspath(os.fsdecode(fullpath))
+        stat_key = self._get_stat_key(fullpath)
+        cached = self._cache.get(fullpath)
+        if cached is not None and cached[0] == stat_key:
+            self.num_hits += 1
+            return cached[1]
+
+        self.num_misses += 1
+        task_key = (fullpath, stat_key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = asyncio.create_task(
+                self._run_script(
+                    fullpath=fullpath, stat_key=stat_key, niceness=niceness
+                )
+            )
+            self._tasks[task_key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        # Shield the task so that a caller that gives up
+        # does not cancel the task for other callers.
+        return await asyncio.shield(task)
+
+    def get_cached(self, fullpath):
+        """Get the configuration schema for a script, if cached.
+
+        Unlike `get`, this never runs the script.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script.
+
+        Returns
+        -------
+        schema : `str` or `None`
+            The schema, as output by the script, or None if the schema
+            is not cached (or the script has changed since it was cached).
+
+        Raises
+        ------
+        OSError
+            If the script does not exist.
+        """
+        fullpath = os.path.abspath(os.fsdecode(fullpath))
+        cached = self._cache.get(fullpath)
+        if cached is None or cached[0] != self._get_stat_key(fullpath):
+            return None
+        self.num_hits += 1
+        return cached[1]
+
+    def check_config(self, fullpath, config):
+        """Check a script configuration against the script's cached schema.
+
+        Parameters
+        ----------
+        fullpath : `str`, `bytes` or `os.PathLike`
+            Full path to the script.
+        config : `str`
+            Configuration, as a YAML string.
+
+        Returns
+        -------
+        checked : `bool`
+            True if the configuration was checked and is valid;
+            False if it could not be checked because the schema
+            is not cached, is empty, or cannot be parsed.
+
+        Raises
+        ------
+        ValueError
+            If the configuration cannot be parsed or does not match
+            the schema.
+        OSError
+            If the script does not exist.
+        """
+        schema = self.get_cached(fullpath)
+        if schema is None:
+            return False
+        validator = self._get_validator(schema)
+        if validator is None:
+            return False
+        try:
+            config_dict = yaml.safe_load(config) if config.strip() else None
+        except yaml.YAMLError as e:
+            raise ValueError(f"Could not parse config as YAML: {e}")
+        if config_dict is None:
+            config_dict = dict()
+        elif not isinstance(config_dict, dict):
+            raise ValueError(f"config={config!r} is not a dict")
+        else:
+            # Scripts ignore metadata, so do not check it.
+            config_dict = config_dict.copy()
+            config_dict.pop("metadata", None)
+        try:
+            validator.validate(config_dict)
+        except jsonschema.ValidationError as e:
+            raise ValueError(f"config does not match the schema: {e.message}")
+        return True
+
+    async def prefetch(
+        self,
+        fullpaths,
+        max_concurrent=DEFAULT_PREFETCH_CONCURRENCY,
+        niceness=DEFAULT_PREFETCH_NICENESS,
+    ):
+        """Get the schema for each of a list of scripts, to fill the cache.
+
+        Failures are logged and counted, but otherwise ignored.
+
+        Parameters
+        ----------
+        fullpaths : ``iterable`` of `str`
+            Full paths to the scripts.
+        max_concurrent : `int` (optional)
+            Maximum number of scripts to run at the same time.
+        niceness : `int` (optional)
+            Niceness increment (see `os.nice`) for the script processes,
+            so they do not compete with running scripts.
+
+        Returns
+        -------
+        progress : `SchemaPrefetchProgress`
+            Final progress. Progress while prefetching is available
+            as ``self.prefetch_progress``.
+
+        Raises
+        ------
+        ValueError
+            If ``max_concurrent`` < 1.
+        """
+        if max_concurrent < 1:
+            raise ValueError(f"max_concurrent={max_concurrent} must be positive")
+        fullpaths = list(fullpaths)
+        progress = SchemaPrefetchProgress(num_scripts=len(fullpaths))
+        self.prefetch_progress = progress
+        self.log.info(f"Prefetching schemas for {len(fullpaths)} scripts")
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def prefetch_one(fullpath):
+            async with semaphore:
+                t0 = time.monotonic()
+                try:
+                    await self.get(fullpath, niceness=niceness)
+                    self.log.debug(
+                        f"Prefetched schema for {fullpath} "
+                        f"in {time.monotonic() - t0:0.2f} sec"
+                    )
+                except Exception as e:
+                    progress.num_failed += 1
+                    self.log.warning(f"Could not prefetch schema for {fullpath}: {e!r}")
+                progress.num_done += 1
+
+        self._num_prefetching += 1
+        try:
+            await asyncio.gather(*[prefetch_one(fullpath) for fullpath in fullpaths])
+        finally:
+            self._num_prefetching -= 1
+            progress.end_time = time.time()
+            self.log.info(f"Prefetch schemas finished: {progress}")
+        await self.save()
+        return progress
+
+    async def save(self):
+        """Save the cache to the cache file, if the cache has changed
+        since it was last saved.
+
+        The file is written in a thread, so the event loop is not blocked.
+        Does nothing if there is no cache file.
+        """
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        async with self._save_lock:
+            if self.path is None or not self._dirty:
+                return
+            data = {
+                fullpath: dict(stat_key=list(stat_key), schema=schema)
+                for fullpath, (stat_key, schema) in self._cache.items()
+            }
+            self._dirty = False
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, self._write, data):
+                self._dirty = True
+
+    async def close(self):
+        """Save the cache file, if needed."""
+        await self.save()
+        await self._save_task
+
+    def clear(self):
+        """Clear the cache (but not the cache file)."""
+        self._cache = dict()
+        self._validators = dict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    @staticmethod
+    def _get_stat_key(fullpath):
+        """Get the values that identify a version of a script."""
+        stat = os.stat(fullpath)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _get_validator(self, schema):
+        """Get a validator for a schema, compiling it if necessary.
+
+        Return None if the schema is empty or cannot be parsed.
+        """
+        if schema in self._validators:
+            return self._validators[schema]
+        validator = None
+        if schema.strip():
+            try:
+                schema_dict = yaml.safe_load(schema)
+                if schema_dict is not None:
+                    validator = salobj.DefaultingValidator(schema=schema_dict)
+            except Exception as e:
+                self.log.warning(f"Cannot make a validator from schema: {e!r}")
+        self._validators[schema] = validator
+        return validator
+
+    def _load(self):
+        """Load the cache from the cache file, if it exists."""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._cache = {
+                fullpath: (tuple(entry["stat_key"]), entry["schema"])
+                for fullpath, entry in data.items()
+            }
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.log.warning(f"Ignoring unreadable schema cache {self.path}: {e!r}")
+
+    def _schedule_save(self):
+        """Mark the cache as changed, and save it after ``save_delay``
+        seconds, unless prefetching or a save is already scheduled.
+        """
+        self._dirty = True
+        if self.path is None or self._num_prefetching > 0:
+            return
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(
+                self.save_delay, self._start_save
+            )
+
+    def _start_save(self):
+        """Start saving the cache file; called by the save timer."""
+        self._save_handle = None
+        if self._save_task.done():
+            self._save_task = asyncio.create_task(self.save())
+
+    def _write(self, data):
+        """Write cache data to the cache file.
+
+        Called in a thread by `save`.
+
+        Returns
+        -------
+        success : `bool`
+            True if the data was written, False if writing failed.
+        """
+        temp_path = f"{os.fspath(self.path)}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            self.log.warning(f"Could not save schema cache {self.path}: {e!r}")
+            return False
+        return True
+
+    async def _run_script(self, fullpath, stat_key, niceness):
+        """Run a script to get its schema and cache the result
+        if the script succeeds.
+        """
+        kwargs = dict()
+        if niceness != 0:
+            kwargs["preexec_fn"] = functools.partial(os.nice, niceness)
+        process = await self.launcher.create_process(
+            fullpath,
+            "0",
+            "--schema",
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **kwargs,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(), timeout=self.timeout
+            )
+        except BaseException as e:
+            if process.returncode is None:
+                process.terminate()
+                self.log.warning(
+                    f"Killed {fullpath} --schema after timeout or cancellation"
+                )
+                if isinstance(e, Exception):
+                    await process.wait()
+            raise
+        schema = stdout.decode()
+        if process.returncode == 0:
+            old_entry = self._cache.get(fullpath)
+            self._cache[fullpath] = (stat_key, schema)
+            if old_entry is not None and old_entry[1] in self._validators:
+                # Discard the validator for the old schema,
+                # unless another script has the same schema.
+                if not any(entry[1] == old_entry[1] for entry in self._cache.values()):
+                    del self._validators[old_entry[1]]
+            self._schedule_save()
+        else:
+            self.log.warning(
+                f"{fullpath} --schema failed with returncode={process.returncode}; "
+                "not caching the output"
+            )
+        return schema
@@ -0,0 +1,368 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ScriptHistoryRecord", "ScriptHistoryStore", "ScriptHistory"]
+
+import asyncio
+import collections
+import json
+import sqlite3
+
+
+class ScriptHistoryRecord:
+    """Immutable summary of a script that has left the queue.
+
+    Has the same attributes as `ScriptInfo` that are needed to report
+    the script (e.g. in the ``script`` event) and to requeue it,
+    but none of the tasks, process or metadata.
+
+    Parameters
+    ----------
+    **kwargs
+        Values for all fields in ``ScriptHistoryRecord.__slots__``.
+    """
+
+    __slots__ = (
+        "index",
+        "seq_num",
+        "is_standard",
+        "path",
+        "config",
+        "descr",
+        "log_level",
+        "pause_checkpoint",
+        "stop_checkpoint",
+        "group_id",
+        "script_state",
+        "process_state",
+        "returncode",
+        "timestamp_process_start",
+        "timestamp_configure_start",
+        "timestamp_configure_end",
+        "timestamp_run_start",
+        "timestamp_process_end",
+    )
+
+    def __init__(self, **kwargs):
+        missing_names = set(self.__slots__) - set(kwargs)
+        if missing_names:
+            raise TypeError(f"Missing fields {sorted(missing_names)}")
+        for name, value in kwargs.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_script_info(cls, script_info):
+        """Make a record from a `ScriptInfo`.
+        """
+        process = script_info.process
+        return cls(
+            index=script_info.index,
+            seq_num=script_info.seq_num,
+            is_standard=script_info.is_standard,
+            path=script_info.path,
+            config=script_info.config,
+            descr=script_info.descr,
+            log_level=script_info.log_level,
+            pause_checkpoint=script_info.pause_checkpoint,
+            stop_checkpoint=script_info.stop_checkpoint,
+            group_id=script_info.group_id,
+            script_state=int(script_info.script_state),
+            process_state=int(script_info.process_state),
+            returncode=None if process is None else process.returncode,
+            timestamp_process_start=script_info.timestamp_process_start,
+            timestamp_configure_start=script_info.timestamp_configure_start,
+            timestamp_configure_end=script_info.timestamp_configure_end,
+            timestamp_run_start=script_info.timestamp_run_start,
+            timestamp_process_end=script_info.timestamp_process_end,
+        )
+
+    @property
+    def process_done(self):
+        """True if the script process was started and is done."""
+        return self.returncode is not None
+
+    def as_dict(self):
+        """Return the fields as a dict."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        return self.index == other.index
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def __repr__(self):
+        return (
+            f"ScriptHistoryRecord(index={self.index}, seq_num={self.seq_num}, "
+            f"is_standard={self.is_standard}, path={self.path}, "
+            f"config={self.config}, descr={self.descr})"
+        )
+
+
+class ScriptHistoryStore:
+    """Append-only SQLite store of `ScriptHistoryRecord`.
+
+    Appended records are committed in batches: when ``commit_batch_size``
+    records are waiting, ``commit_interval`` seconds after the first
+    waiting record was appended (if there is a running event loop),
+    and by `flush` and `close`. Waiting records are visible to `get`.
+
+    Parameters
+    ----------
+    path : `str` or `os.PathLike`
+        Path of the SQLite database file. It is created if necessary.
+    max_records : `int` (optional)
+        Maximum number of records to retain; older records are deleted.
+    commit_batch_size : `int` (optional)
+        Maximum number of appended records waiting to be committed.
+    commit_interval : `float` (optional)
+        Maximum time an appended record waits to be committed (seconds),
+        if there is a running event loop.
+
+    Raises
+    ------
+    ValueError
+        If ``max_records`` or ``commit_batch_size`` < 1,
+        or ``commit_interval`` is not positive.
+    """
+
+    def __init__(
+        self, path, max_records=100000, commit_batch_size=100, commit_interval=1
+    ):
+        if max_records < 1:
+            raise ValueError(f"max_records={max_records} must be positive")
+        if commit_batch_size < 1:
+            raise ValueError(f"commit_batch_size={commit_batch_size} must be positive")
+        if commit_interval <= 0:
+            raise ValueError(f"commit_interval={commit_interval} must be positive")
+        self.path = path
+        self.max_records = int(max_records)
+        self.commit_batch_size = int(commit_batch_size)
+        self.commit_interval = commit_interval
+        self._connection = sqlite3.connect(str(path))
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS history "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "sal_index INTEGER NOT NULL, record TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS history_sal_index ON history (sal_index)"
+        )
+        self._connection.commit()
+        # Number of records appended since the store was last pruned.
+        self._num_appended = 0
+        # Number of appended records that are not yet committed.
+        self._num_uncommitted = 0
+        # asyncio.TimerHandle for the next call to `flush`, or None.
+        self._flush_handle = None
+
+    def append(self, record):
+        """Append a record.
+
+        Parameters
+        ----------
+        record : `ScriptHistoryRecord`
+            Record to append.
+        """
+        self._connection.execute(
+            "INSERT INTO history (sal_index, record) VALUES (?, ?)",
+            (record.index, json.dumps(record.as_dict())),
+        )
+        self._num_appended += 1
+        self._num_uncommitted += 1
+        # Prune occasionally, rather than on every append.
+        if self._num_appended >= max(1, self.max_records // 100):
+            self.prune()
+        elif self._num_uncommitted >= self.commit_batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._flush_handle = loop.call_later(self.commit_interval, self.flush)
+
+    def close(self):
+        """Commit appended records and close the database."""
+        self.flush()
+        self._connection.close()
+
+    def flush(self):
+        """Commit appended records."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._connection.commit()
+        self._num_uncommitted = 0
+
+    def get(self, sal_index):
+        """Get the most recent record for a given SAL index.
+
+        Returns
+        -------
+        record : `ScriptHistoryRecord` or `None`
+            The record, or None if not found.
+        """
+        row = self._connection.execute(
+            "SELECT record FROM history WHERE sal_index = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (sal_index,),
+        ).fetchone()
+        if row is None:
+            return None
+        return ScriptHistoryRecord(**json.loads(row[0]))
+
+    def prune(self):
+        """Delete all but the newest ``max_records`` records."""
+        self._connection.execute(
+            "DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?",
+            (self.max_records,),
+        )
+        self.flush()
+        self._num_appended = 0
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+
+class ScriptHistory:
+    """Bounded history of scripts, most recent first.
+
+    Scripts are stored as `ScriptHistoryRecord`. A script whose process
+    is still running (e.g. while it is being terminated) is kept as a
+    `ScriptInfo` until the process finishes, and is then replaced by a
+    record. Records that no longer fit are dropped, or appended
+    to ``store``, if specified.
+
+    ``version`` is incremented every time the history is modified,
+    so a change can be detected by comparing two values of ``version``.
+
+    Parameters
+    ----------
+    maxlen : `int`
+        Maximum number of scripts to keep in memory.
+    items : ``iterable`` (optional)
+        Initial items, most recent first.
+    store : `ScriptHistoryStore` or `None` (optional)
+        Store for scripts that no longer fit in memory.
+    """
+
+    def __init__(self, maxlen, items=(), store=None):
+        self.version = 0
+        self.store = store
+        self._items = collections.deque(items, maxlen=maxlen)
+        # dict of SAL index: item, for items in memory
+        self._item_dict = {item.index: item for item in self._items}
+
+    @property
+    def maxlen(self):
+        """Maximum number of scripts retained in memory."""
+        return self._items.maxlen
+
+    def appendleft(self, script_info):
+        """Add a script to the start of the history.
+
+        Parameters
+        ----------
+        script_info : `ScriptInfo` or `ScriptHistoryRecord`
+            The script to add.
+
+        Returns
+        -------
+        evicted : `ScriptHistoryRecord` or `None`
+            The oldest item, if it was dropped from memory to make room,
+            else None.
+        """
+        item = self._freeze_when_done(script_info)
+        evicted = None
+        if len(self._items) == self.maxlen:
+            evicted = self._items[-1]
+            if not isinstance(evicted, ScriptHistoryRecord):
+                evicted = ScriptHistoryRecord.from_script_info(evicted)
+            if self._item_dict.get(evicted.index) is self._items[-1]:
+                del self._item_dict[evicted.index]
+            if self.store is not None:
+                self.store.append(evicted)
+        self._items.appendleft(item)
+        self._item_dict[item.index] = item
+        self.version += 1
+        return evicted
+
+    def get(self, sal_index):
+        """Get a script from memory or the store.
+
+        Returns
+        -------
+        item : `ScriptHistoryRecord`, `ScriptInfo` or `None`
+            The script, or None if not found.
+        """
+        item = self._item_dict.get(sal_index)
+        if item is None and self.store is not None:
+            item = self.store.get(sal_index)
+        return item
+
+    def _freeze_when_done(self, script_info):
+        """Return a record for a script, if it is done, else return
+        the script and arrange to replace it with a record when done.
+        """
+        if isinstance(script_info, ScriptHistoryRecord):
+            return script_info
+        if script_info.process_task is None or script_info.process_task.done():
+            return ScriptHistoryRecord.from_script_info(script_info)
+
+        def freeze(_):
+            if self._item_dict.get(script_info.index) is not script_info:
+                return
+            record = ScriptHistoryRecord.from_script_info(script_info)
+            self._item_dict[script_info.index] = record
+            for i, item in enumerate(self._items):
+                if item is script_info:
+                    self._items[i] = record
+                    break
+
+        script_info.process_task.add_done_callback(freeze)
+        return script_info
+
+    def __copy__(self):
+        return type(self)(maxlen=self.maxlen, items=self._items, store=self.store)
+
+    def __getitem__(self, position):
+        return self._items[position]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return f"ScriptHistory({[item.index for item in self._items]})"
@@ -0,0 +1,419 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ScriptIndex"]
+
+import ctypes
+import ctypes.util
+import errno
+import itertools
+import os
+import struct
+import time
+
+from .utils import get_process_credentials, is_executable_mode
+
+# inotify constants, from <sys/inotify.h>
+_IN_ATTRIB = 0x00000004
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (
+    _IN_ATTRIB
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[]
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal ctypes wrapper around Linux inotify.
+
+    Raises
+    ------
+    OSError
+        If inotify is not available.
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("Cannot find the C library")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("The C library does not support inotify")
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+
+    def add_watch(self, path):
+        """Watch a directory and return the watch descriptor."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed: {os.strerror(err)}", path)
+        return wd
+
+    def rm_watch(self, wd):
+        """Stop watching a directory. Ignore errors."""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Read all pending events, without blocking.
+
+        Returns
+        -------
+        events : `list` [`tuple`]
+            List of (wd, mask, name) for each event.
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + name_len].rstrip(b"\0")
+                offset += name_len
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _DirInfo:
+    """Information about one directory in a `ScriptIndex`."""
+
+    __slots__ = ("mtime_ns", "scripts", "relpaths", "subdirs", "wd")
+
+    def __init__(self, mtime_ns, scripts, relpaths, subdirs, wd):
+        self.mtime_ns = mtime_ns
+        # Names of public scripts in this directory.
+        self.scripts = scripts
+        # Paths of public scripts in this directory, relative to the root.
+        self.relpaths = relpaths
+        # Names of subdirectories that are searched.
+        self.subdirs = subdirs
+        # inotify watch descriptor, or None.
+        self.wd = wd
+
+
+class ScriptIndex:
+    """An incrementally updated index of the public scripts in a directory.
+
+    Public scripts are as defined by `find_public_scripts`: executable
+    files whose names do not start with "." or "_", in the root directory
+    or any subdirectory whose name does not start with "."
+    (symbolic links to directories are not followed).
+
+    The index is built once, when constructed. After that `refresh`
+    only rescans directories that have changed. Changes are detected
+    using inotify, if available, and by checking the modification time
+    of each directory.
+
+    Parameters
+    ----------
+    root : `str`, `bytes` or `os.PathLike`
+        Path to root directory.
+    log : `logging.Logger`
+        Parent logger.
+    use_inotify : `bool` (optional)
+        Use inotify to detect changes, if available?
+    mtime_check_interval : `float` (optional)
+        Minimum interval between checks of directory modification times
+        when using inotify (seconds). Without inotify the modification
+        times are checked every time `refresh` is called.
+
+    Notes
+    -----
+    inotify does not report changes made on other hosts to a directory
+    mounted over NFS; the modification time checks catch those.
+
+    Changing the permissions of a script does not change the modification
+    time of its directory. Thus, without inotify, making a script
+    executable (or not) is only noticed when something else changes in
+    the same directory, or by calling `rescan`.
+    """
+
+    def __init__(self, root, log, use_inotify=True, mtime_check_interval=10):
+        self.root = os.path.abspath(os.fsdecode(root))
+        self.log = log.getChild("ScriptIndex")
+        self.mtime_check_interval = mtime_check_interval
+        # Incremented every time the set of scripts changes.
+        self.version = 0
+        # Time of the last check of directory modification times
+        # (monotonic seconds).
+        self._mtime_check_time = 0
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except Exception as e:
+                self.log.info(f"inotify not available; checking mtimes: {e!r}")
+        # dict of directory path relative to root ("" for root): _DirInfo
+        self._dirs = dict()
+        # dict of inotify watch descriptor: relative directory path
+        self._wd_dirs = dict()
+        self._scripts = None
+        self._joined = None
+        self.rescan()
+
+    @property
+    def uses_inotify(self):
+        """Is inotify being used to detect changes?"""
+        return self._inotify is not None
+
+    @property
+    def scripts(self):
+        """Relative paths of all public scripts, as a sorted `tuple`.
+
+        Call `refresh` first to be sure this is current.
+        """
+        if self._scripts is None:
+            self._scripts = tuple(
+                sorted(
+                    itertools.chain.from_iterable(
+                        dir_info.relpaths for dir_info in self._dirs.values()
+                    )
+                )
+            )
+        return self._scripts
+
+    @property
+    def joined(self):
+        """``scripts`` joined with ":"; cached until the scripts change."""
+        if self._joined is None:
+            self._joined = ":".join(self.scripts)
+        return self._joined
+
+    def refresh(self):
+        """Update the index to reflect changes to the directory tree.
+
+        Returns
+        -------
+        changed : `bool`
+            True if the set of scripts changed.
+        """
+        reldirs = set()
+        if self._inotify is not None:
+            try:
+                reldirs = self._read_changed_dirs()
+            except Exception as e:
+                self.log.warning(f"inotify failed; checking mtimes instead: {e!r}")
+                self._stop_inotify()
+                return self.rescan()
+            if reldirs is None:
+                # The event queue overflowed.
+                return self.rescan()
+        if (
+            self._inotify is None
+            or time.monotonic() - self._mtime_check_time > self.mtime_check_interval
+        ):
+            reldirs |= self._find_changed_dirs()
+        changed = False
+        for reldir in sorted(reldirs, key=len):
+            changed |= self._scan_dir(reldir)
+        if changed:
+            self._set_changed()
+        return changed
+
+    def rescan(self):
+        """Rebuild the index from scratch.
+
+        Returns
+        -------
+        changed : `bool`
+            True if the set of scripts changed.
+        """
+        old_scripts = self.scripts if self._dirs else ()
+        for reldir in list(self._dirs):
+            self._forget_dir(reldir)
+        self._mtime_check_time = time.monotonic()
+        self._scan_dir("")
+        self._set_changed()
+        return self.scripts != old_scripts
+
+    def close(self):
+        """Stop watching for changes."""
+        self._stop_inotify()
+
+    def __len__(self):
+        return len(self.scripts)
+
+    def _find_changed_dirs(self):
+        """Return relative paths of known directories whose mtime changed,
+        or that no longer exist."""
+        self._mtime_check_time = time.monotonic()
+        reldirs = set()
+        for reldir, dir_info in self._dirs.items():
+            try:
+                mtime_ns = os.stat(os.path.join(self.root, reldir)).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != dir_info.mtime_ns:
+                reldirs.add(reldir)
+        return reldirs
+
+    def _forget_dir(self, reldir):
+        """Remove a directory and all its subdirectories from the index."""
+        dir_info = self._dirs.pop(reldir, None)
+        if dir_info is None:
+            return
+        if dir_info.wd is not None:
+            if self._wd_dirs.get(dir_info.wd) == reldir:
+                del self._wd_dirs[dir_info.wd]
+            if self._inotify is not None:
+                self._inotify.rm_watch(dir_info.wd)
+        for name in dir_info.subdirs:
+            self._forget_dir(os.path.join(reldir, name) if reldir else name)
+
+    def _read_changed_dirs(self):
+        """Return relative paths of directories that inotify reports
+        have changed, or None if the event queue overflowed."""
+        reldirs = set()
+        for wd, mask, name in self._inotify.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            if mask & _IN_IGNORED:
+                self._wd_dirs.pop(wd, None)
+                continue
+            reldir = self._wd_dirs.get(wd)
+            if reldir is None:
+                continue
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                # Rescan the parent, which drops this directory.
+                reldir = os.path.dirname(reldir) if reldir else ""
+            reldirs.add(reldir)
+        return reldirs
+
+    def _scan_dir(self, reldir):
+        """Scan one directory, and any new subdirectories, recursively.
+
+        Returns
+        -------
+        changed : `bool`
+            True if the set of scripts changed.
+        """
+        path = os.path.join(self.root, reldir)
+        old_info = self._dirs.get(reldir)
+        old_scripts = set() if old_info is None else old_info.scripts
+        old_subdirs = set() if old_info is None else old_info.subdirs
+        wd = None if old_info is None else old_info.wd
+        if wd is None and self._inotify is not None:
+            # Watch before listing, so no change can be missed.
+            try:
+                wd = self._inotify.add_watch(path)
+                self._wd_dirs[wd] = reldir
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    self.log.warning(f"Cannot watch {path}; checking mtimes: {e!r}")
+                    self._stop_inotify()
+                    wd = None
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            entries = list(os.scandir(path))
+        except OSError:
+            # The directory is gone.
+            if old_info is None:
+                return False
+            self._forget_dir(reldir)
+            return bool(old_scripts) or bool(old_subdirs)
+
+        scripts = set()
+        subdirs = set()
+        credentials = get_process_credentials()
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if not entry.name.startswith(".") and not entry.is_symlink():
+                        subdirs.add(entry.name)
+                elif entry.name[0] not in (".", "_") and is_executable_mode(
+                    entry.stat(), credentials
+                ):
+                    scripts.add(entry.name)
+            except OSError:
+                continue
+        relpaths = [os.path.join(reldir, name) for name in scripts]
+        self._dirs[reldir] = _DirInfo(
+            mtime_ns=mtime_ns,
+            scripts=scripts,
+            relpaths=relpaths,
+            subdirs=subdirs,
+            wd=wd,
+        )
+
+        changed = scripts != old_scripts
+        for name in old_subdirs - subdirs:
+            subreldir = os.path.join(reldir, name) if reldir else name
+            if self._dirs.get(subreldir) is not None:
+                changed |= bool(self._subtree_has_scripts(subreldir))
+            self._forget_dir(subreldir)
+        for name in subdirs - old_subdirs:
+            subreldir = os.path.join(reldir, name) if reldir else name
+            changed |= self._scan_dir(subreldir)
+        return changed
+
+    def _set_changed(self):
+        """Note that the set of scripts has (or may have) changed."""
+        self._scripts = None
+        self._joined = None
+        self.version += 1
+
+    def _stop_inotify(self):
+        """Stop using inotify."""
+        if self._inotify is None:
+            return
+        self._inotify.close()
+        self._inotify = None
+        self._wd_dirs = dict()
+        for dir_info in self._dirs.values():
+            dir_info.wd = None
+
+    def _subtree_has_scripts(self, reldir):
+        """Does a directory or any of its subdirectories
+        contain any scripts?"""
+        dir_info = self._dirs.get(reldir)
+        if dir_info is None:
+            return False
+        if dir_info.scripts:
+            return True
+        return any(
+            self._subtree_has_scripts(os.path.join(reldir, name) if reldir else name)
+            for name in dir_info.subdirs
+        )
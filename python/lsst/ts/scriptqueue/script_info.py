@@ -22,15 +22,46 @@
 __all__ = ["ScriptInfo"]
 
 import asyncio
-import os
+import logging
 import time
 
 from lsst.ts.idl.enums.Script import ScriptState
 from lsst.ts.idl.enums.ScriptQueue import ScriptProcessState
+from .launcher import ScriptLauncher
 
 _SET_GROUP_ID_TIMEOUT = 5  # Time limit for setGroupId command (seconds)
 _CONFIGURE_TIMEOUT = 60  # Time limit for the configure command (seconds)
 
+# Script states that mark the end of running a script.
+_RUN_END_STATES = frozenset(
+    (
+        ScriptState.ENDING,
+        ScriptState.STOPPING,
+        ScriptState.FAILING,
+        ScriptState.DONE,
+        ScriptState.STOPPED,
+        ScriptState.FAILED,
+    )
+)
+
+
+class _ScriptInfoLogAdapter(logging.LoggerAdapter):
+    """Log adapter that prefixes messages with the script's SAL index.
+
+    All `ScriptInfo` share one logger (per parent logger) and each gets
+    one of these adapters. Using ``log.getChild`` with a name that
+    includes the SAL index would leak loggers, because the logging
+    manager keeps every logger forever.
+
+    The SAL index is also available to handlers and filters
+    as the ``script_index`` attribute of the log record.
+    Any ``extra`` specified by the caller is kept.
+    """
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**kwargs.get("extra", {}), **self.extra}
+        return f"ScriptInfo(index={self.extra['script_index']}): {msg}", kwargs
+
 
 class ScriptInfo:
     """Information about a loaded script.
@@ -38,11 +69,14 @@ class ScriptInfo:
     Parameters
     ----------
     log : `logging.Logger`
-        Logger.
-    remote : `salinfo.Remote`
-        Remote for the "Script" component with index=0.
-        This will be used to send commands but not receive events,
-        since the queue model does that.
+        Parent logger. Log messages are written to child logger
+        "ScriptInfo", which is shared by all scripts,
+        and are prefixed with the SAL index.
+    transport : `BaseScriptTransport`
+        Transport for Script SAL components, such as
+        `SalScriptTransport` with a remote for the "Script" component
+        with index=0. This will be used to send commands
+        but not receive events, since the queue model does that.
     index : `int`
         Index of script. This must be unique among all Script SAL
         components that are currently running.
@@ -72,7 +106,7 @@ class ScriptInfo:
     def __init__(
         self,
         log,
-        remote,
+        transport,
         index,
         seq_num,
         is_standard,
@@ -84,8 +118,10 @@ class ScriptInfo:
         stop_checkpoint="",
         verbose=False,
     ):
-        self.log = log.getChild(f"ScriptInfo(index={index})")
-        self.remote = remote
+        self.log = _ScriptInfoLogAdapter(
+            log.getChild("ScriptInfo"), dict(script_index=int(index))
+        )
+        self.transport = transport
         self.index = int(index)
         self.seq_num = int(seq_num)
         self.is_standard = bool(is_standard)
@@ -116,8 +152,16 @@ class ScriptInfo:
         self.timestamp_configure_end = 0
         # Time at which the script started running. 0 before that.
         self.timestamp_run_start = 0
+        # Time at which the script reported that it was ending, stopping
+        # or failing (or was done, if it skipped those states).
+        # 0 before that.
+        self.timestamp_run_end = 0
         # Time at which the script process finished. 0 before that.
         self.timestamp_process_end = 0
+        # Most recent resource use of the script process,
+        # a `ProcessResources`, or None if not sampled.
+        # Set by `QueueModel.sample_resources`.
+        self.resources = None
         # Task for creating self.process, or None if just beginning to load.
         self.create_process_task = None
         # Task that finishes when configuration starts.
@@ -143,6 +187,9 @@ class ScriptInfo:
         # Reset to None when group ID is cleared.
         self.set_group_id_task = None
         self._callback = None
+        # Task awaiting exit of the process of an earlier load,
+        # if the script was unloaded; otherwise None.
+        self._unload_task = None
 
         # The following guarantees that if we terminate a process
         # and it sucessfully stops, then we can report it as terminated;
@@ -181,6 +228,16 @@ class ScriptInfo:
         """True if the script could not be loaded."""
         return self.process_done and self.timestamp_configure_start == 0
 
+    @property
+    def pending(self):
+        """True if the script has not been loaded (or has been unloaded
+        with `unload`) and has not been terminated.
+
+        A pending script has no process; its `process_state`
+        is ``LOADING`` and its process start timestamp is 0.
+        """
+        return self.create_process_task is None and not self._terminated
+
     @property
     def running(self):
         """True if the script was commanded to run and is not done."""
@@ -266,7 +323,7 @@ class ScriptInfo:
         """
         if not self.runnable:
             raise RuntimeError("Script is not runnable")
-        asyncio.create_task(self.remote.cmd_run.set_start(ScriptID=self.index))
+        asyncio.create_task(self.transport.send_command("run", self.index))
         self.timestamp_run_start = time.time()
 
     @property
@@ -313,8 +370,8 @@ class ScriptInfo:
         self._cancel_set_clear_group_id()
         if command_script and self.configured and not self.started:
             self.clear_group_id_task = asyncio.create_task(
-                self.remote.cmd_setGroupId.set_start(
-                    ScriptID=self.index, groupId="", timeout=_SET_GROUP_ID_TIMEOUT
+                self.transport.send_command(
+                    "setGroupId", self.index, groupId="", timeout=_SET_GROUP_ID_TIMEOUT,
                 )
             )
 
@@ -347,15 +404,18 @@ class ScriptInfo:
 
         self._cancel_set_clear_group_id()
         self.set_group_id_task = asyncio.create_task(
-            self.remote.cmd_setGroupId.set_start(
-                ScriptID=self.index, groupId=group_id, timeout=_SET_GROUP_ID_TIMEOUT
+            self.transport.send_command(
+                "setGroupId",
+                self.index,
+                groupId=group_id,
+                timeout=_SET_GROUP_ID_TIMEOUT,
             )
         )
         await self.set_group_id_task
         self.group_id = group_id
         self._run_callback()
 
-    async def start_loading(self, fullpath):
+    async def start_loading(self, fullpath, launcher=None):
         """Start the script process and start a task that will configure
         the script when it is ready.
 
@@ -363,6 +423,9 @@ class ScriptInfo:
         ----------
         fullpath : `str`, `bytes` or `os.PathLike`
             Full path to the script.
+        launcher : `ScriptLauncher` or `None` (optional)
+            Launcher used to start the script process.
+            If None then use a `ScriptLauncher` with no launcher pool.
 
         Notes
         -----
@@ -371,17 +434,21 @@ class ScriptInfo:
         """
         if self.create_process_task is not None:
             raise RuntimeError("Already started loading")
+        if self._unload_task is not None:
+            # wait for the process of the previous load to exit,
+            # so two processes never share this SAL index
+            await self._unload_task
+            self._unload_task = None
         if self._terminated:
             # this can happen if the user stops a script with stopScript
             # while the script is being added
             return
-        initialpath = os.environ["PATH"]
+        if launcher is None:
+            launcher = ScriptLauncher()
         try:
-            scriptdir, scriptname = os.path.split(fullpath)
-            os.environ["PATH"] = scriptdir + ":" + initialpath
             # save task so process creation can be cancelled if it hangs
             self.create_process_task = asyncio.create_task(
-                asyncio.create_subprocess_exec(scriptname, str(self.index))
+                launcher.start_script(fullpath=fullpath, index=self.index)
             )
             self.process = await self.create_process_task
             self.process_task = asyncio.create_task(self.process.wait())
@@ -399,7 +466,6 @@ class ScriptInfo:
             self._terminated = True
             raise
         finally:
-            os.environ["PATH"] = initialpath
             if not self.timestamp_process_start == 0:
                 self._run_callback()
 
@@ -440,6 +506,60 @@ class ScriptInfo:
             self._run_callback()
         return self._terminated
 
+    def unload(self):
+        """Terminate the script process and return the script
+        to the pending state, so it can be loaded again later.
+
+        Does nothing if the script is pending.
+        Unlike `terminate` this does not mark the script as terminated,
+        and the callback is kept.
+
+        Raises
+        ------
+        RuntimeError
+            If the script is being loaded (the process has not yet
+            been created), has been commanded to run,
+            or is done or terminated.
+        """
+        if self.pending:
+            return
+        if (
+            self.process is None
+            or self.timestamp_run_start > 0
+            or self.process_done
+            or self._terminated
+        ):
+            raise RuntimeError(f"Cannot unload script {self.index}")
+        self.log.debug("Unload")
+        process = self.process
+        process_task = self.process_task
+        process_task.remove_done_callback(self._cleanup)
+        config_task = self.config_task
+        # Clear config_task before cancelling it, so that _configure
+        # does not terminate the script.
+        self.config_task = None
+        if config_task is not None:
+            config_task.remove_done_callback(self._run_callback)
+            config_task.cancel()
+        self.group_id = ""
+        self._cancel_set_clear_group_id()
+        self.create_process_task = None
+        self.process = None
+        self.process_task = None
+        self.metadata = None
+        self.script_state = 0
+        self.state_delay = 0
+        self.timestamp_process_start = 0
+        self.timestamp_configure_start = 0
+        self.timestamp_configure_end = 0
+        self.resources = None
+        if self.start_task.done():
+            self.start_task = asyncio.Future()
+        if process.returncode is None:
+            process.terminate()
+        self._unload_task = process_task
+        self._run_callback()
+
     def __eq__(self, other):
         return self.index == other.index
 
@@ -470,13 +590,13 @@ class ScriptInfo:
         """Clean up when the Script subprocess exits.
 
         Set the timestamp_process_end, cancel the config task,
-        delete the remote, run the callback and delete the callback.
+        delete the transport, run the callback and delete the callback.
         """
         self.timestamp_process_end = time.time()
         if self.config_task:
             self.config_task.cancel()
         self._cancel_set_clear_group_id()
-        self.remote = None
+        self.transport = None
         self._run_callback()
         self._callback = None
 
@@ -498,8 +618,9 @@ class ScriptInfo:
                     f"instead of {ScriptState.UNCONFIGURED!r}"
                 )
 
-            await self.remote.cmd_configure.set_start(
-                ScriptID=self.index,
+            await self.transport.send_command(
+                "configure",
+                self.index,
                 config=self.config,
                 logLevel=self.log_level,
                 pauseCheckpoint=self.pause_checkpoint,
@@ -508,15 +629,21 @@ class ScriptInfo:
             )
         except asyncio.CancelledError:
             self.log.info("Configuration cancelled")
-            asyncio.create_task(self._start_terminate())
+            # config_task is cleared if the script is being unloaded
+            if asyncio.current_task() is self.config_task:
+                asyncio.create_task(self._start_terminate())
             raise
         except Exception:
             # terminate the script but first let the configure_task fail
             self.log.exception("Configuration failed")
-            asyncio.create_task(self._start_terminate())
+            if asyncio.current_task() is self.config_task:
+                asyncio.create_task(self._start_terminate())
             raise
         finally:
-            self.timestamp_configure_end = time.time()
+            # config_task is cleared if the script is being unloaded,
+            # in which case the script is pending and has no timestamps.
+            if asyncio.current_task() is self.config_task:
+                self.timestamp_configure_end = time.time()
 
     async def _start_terminate(self):
         self.terminate()
@@ -531,6 +658,9 @@ class ScriptInfo:
             self.callback(self)
 
     def _script_state_callback(self, state):
+        if self.pending:
+            # a late event from the process of an unloaded script
+            return
         self.script_state = state.state
         self.state_delay = time.time() - state.private_sndStamp
         if self.script_state == ScriptState.UNCONFIGURED and self.config_task is None:
@@ -538,4 +668,10 @@ class ScriptInfo:
             self.config_task = asyncio.create_task(self._configure())
             self.config_task.add_done_callback(self._run_callback)
             self.start_task.set_result(None)
+        elif (
+            self.script_state in _RUN_END_STATES
+            and self.timestamp_run_start > 0
+            and self.timestamp_run_end == 0
+        ):
+            self.timestamp_run_end = time.time()
         self._run_callback()
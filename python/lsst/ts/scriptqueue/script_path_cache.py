@@ -0,0 +1,178 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ScriptPathCache"]
+
+import os
+import pathlib
+import stat
+import time
+
+from .utils import is_executable_mode
+
+# Default time for which a validated path is trusted
+# without checking the file again (seconds).
+DEFAULT_PATH_CACHE_TTL = 10
+
+
+class _PathCacheEntry:
+    """A validated script path, as cached by `ScriptPathCache`."""
+
+    __slots__ = ("fullpath", "stat_key", "expiry")
+
+    def __init__(self, fullpath, stat_key, expiry):
+        self.fullpath = fullpath
+        self.stat_key = stat_key
+        self.expiry = expiry
+
+
+class ScriptPathCache:
+    """Validate paths of scripts relative to a root directory,
+    caching the results.
+
+    A validated path is trusted for ``ttl`` seconds. After that
+    the script is checked with a single ``os.stat``, and fully validated
+    again only if its modification time, size, inode or mode changed.
+    Invalid paths are not cached.
+
+    Parameters
+    ----------
+    root : `str`, `bytes` or `os.PathLike`
+        Root directory of the scripts.
+    ttl : `float` (optional)
+        Time for which a validated path is trusted
+        without checking the file again (seconds).
+    index : `ScriptIndex` or `None` (optional)
+        Index of the scripts in ``root``. If specified then the cache
+        is cleared whenever the index's ``version`` changes.
+
+    Notes
+    -----
+    The containment check is done on normalized path strings,
+    so it needs no system calls. Symbolic links in ``path`` are not
+    resolved, so a link in ``root`` to a script elsewhere is allowed,
+    just as it is listed by `ScriptIndex` and `find_public_scripts`.
+    """
+
+    def __init__(self, root, ttl=DEFAULT_PATH_CACHE_TTL, index=None):
+        if ttl < 0:
+            raise ValueError(f"ttl={ttl} must not be negative")
+        self.root = os.path.normpath(os.path.abspath(os.fsdecode(root)))
+        self.ttl = ttl
+        self.index = index
+        self._root_prefix = os.path.join(self.root, "")
+        self._index_version = None if index is None else index.version
+        # dict of path (as specified by the caller): _PathCacheEntry
+        self._cache = dict()
+        # Number of paths served from the cache and validated.
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def get(self, path):
+        """Get the full path to a script and check that it is runnable.
+
+        Parameters
+        ----------
+        path : `str`, `bytes` or `os.PathLike`
+            Path to script, relative to the root directory.
+
+        Returns
+        -------
+        fullpath : `pathlib.Path`
+            The full path to the script.
+
+        Raises
+        ------
+        ValueError
+            If the full path is not in the root directory.
+        ValueError
+            If the script does not exist or is not a file,
+            is invisible (name starts with ".")
+            or private (name starts with "_"),
+            or is not executable.
+        """
+        path = os.fsdecode(path)
+        if self.index is not None and self.index.version != self._index_version:
+            self._index_version = self.index.version
+            self._cache.clear()
+
+        entry = self._cache.get(path)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.expiry:
+                self.num_hits += 1
+                return entry.fullpath
+            try:
+                stat_key = self._make_stat_key(os.stat(entry.fullpath))
+            except OSError:
+                stat_key = None
+            if stat_key == entry.stat_key:
+                self.num_hits += 1
+                entry.expiry = now + self.ttl
+                return entry.fullpath
+            del self._cache[path]
+
+        self.num_misses += 1
+        fullpath, stat_key = self._validate(path)
+        self._cache[path] = _PathCacheEntry(
+            fullpath=fullpath, stat_key=stat_key, expiry=time.monotonic() + self.ttl
+        )
+        return fullpath
+
+    def clear(self):
+        """Clear the cache."""
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    @staticmethod
+    def _make_stat_key(stat_result):
+        """Get the values that identify a version of a script
+        from the result of ``os.stat``.
+        """
+        return (
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            stat_result.st_ino,
+            stat_result.st_mode,
+        )
+
+    def _validate(self, path):
+        """Validate a path and return the full path and its stat key.
+
+        Raises ValueError if the path is not valid.
+        """
+        fullpath_str = os.path.normpath(os.path.join(self.root, path))
+        if not fullpath_str.startswith(self._root_prefix):
+            raise ValueError(f"path {path} is not relative to {self.root}")
+        fullpath = pathlib.Path(fullpath_str)
+        try:
+            stat_result = os.stat(fullpath_str)
+        except OSError:
+            raise ValueError(f"Cannot find script {fullpath}.")
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise ValueError(f"Cannot find script {fullpath}.")
+        if fullpath.name[0] in (".", "_"):
+            raise ValueError(f"script {path} is invisible or private")
+        if not is_executable_mode(stat_result):
+            raise ValueError(f"Script {fullpath} is not executable.")
+        return fullpath, self._make_stat_key(stat_result)
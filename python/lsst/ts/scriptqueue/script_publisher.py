@@ -0,0 +1,154 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CoalescingScriptPublisher"]
+
+import asyncio
+
+from lsst.ts.idl.enums.Script import ScriptState
+
+# Script states after which a script reports nothing new
+# except the end of its process.
+_FINAL_SCRIPT_STATES = frozenset(
+    (ScriptState.DONE, ScriptState.STOPPED, ScriptState.FAILED)
+)
+
+
+class _Window:
+    """The publication window of one script."""
+
+    __slots__ = ("pending", "handle")
+
+    def __init__(self, handle):
+        # ScriptInfo to publish when the window ends, or None.
+        self.pending = None
+        # asyncio.TimerHandle for the end of the window.
+        self.handle = handle
+
+
+class CoalescingScriptPublisher:
+    """Publish information about scripts at a limited rate per script.
+
+    The first change to a script is published at once, and opens
+    a window of ``min_interval`` seconds for that script. Changes
+    during the window are coalesced: only the latest is published,
+    when the window ends (and that opens a new window).
+    Changes to a script that has reached a final state
+    (its process is done, it was terminated, or its script state is
+    ``DONE``, ``STOPPED`` or ``FAILED``) are always published at once,
+    so the final state of each script is never delayed.
+
+    Because a `ScriptInfo` is updated in place, the latest information
+    is the one that is published; nothing is copied.
+
+    Parameters
+    ----------
+    callback : ``callable``
+        Function to call to publish information about a script.
+        It receives one argument: a `ScriptInfo`.
+    min_interval : `float` (optional)
+        Minimum interval between publications for one script (seconds).
+        If 0 then publish every change at once.
+
+    Raises
+    ------
+    ValueError
+        If ``min_interval`` < 0.
+
+    Attributes
+    ----------
+    num_put : `int`
+        Number of changes reported by `put`.
+    num_published : `int`
+        Number of calls to ``callback``.
+    """
+
+    def __init__(self, callback, min_interval=0):
+        if min_interval < 0:
+            raise ValueError(f"min_interval={min_interval} must not be negative")
+        self.callback = callback
+        self.min_interval = min_interval
+        # dict of SAL index: _Window, for scripts that are in a window.
+        self._windows = dict()
+        self.num_put = 0
+        self.num_published = 0
+
+    @property
+    def num_pending(self):
+        """Number of scripts with a change that has not been published."""
+        return sum(1 for window in self._windows.values() if window.pending is not None)
+
+    def put(self, script_info):
+        """Report a change to a script: publish it now or later.
+
+        Parameters
+        ----------
+        script_info : `ScriptInfo`
+            Information about the script.
+        """
+        self.num_put += 1
+        if self.min_interval == 0:
+            self._publish(script_info)
+            return
+        window = self._windows.get(script_info.index)
+        if self._is_final(script_info):
+            if window is not None:
+                window.handle.cancel()
+                del self._windows[script_info.index]
+            self._publish(script_info)
+        elif window is None:
+            self._publish(script_info)
+            self._start_window(script_info.index)
+        else:
+            window.pending = script_info
+
+    def flush(self):
+        """Publish all pending changes now and end all windows."""
+        windows = self._windows
+        self._windows = dict()
+        for window in windows.values():
+            window.handle.cancel()
+            if window.pending is not None:
+                self._publish(window.pending)
+
+    def _start_window(self, index):
+        handle = asyncio.get_running_loop().call_later(
+            self.min_interval, self._end_window, index
+        )
+        self._windows[index] = _Window(handle)
+
+    def _end_window(self, index):
+        window = self._windows.pop(index)
+        if window.pending is not None:
+            self._publish(window.pending)
+            self._start_window(index)
+
+    def _publish(self, script_info):
+        self.num_published += 1
+        self.callback(script_info)
+
+    @staticmethod
+    def _is_final(script_info):
+        return (
+            script_info.process_done
+            or script_info.terminated
+            or script_info.script_state in _FINAL_SCRIPT_STATES
+        )
@@ -22,8 +22,9 @@
 __all__ = ["ScriptQueue"]
 
 import asyncio
+import math
 import os
-import subprocess
+import signal
 
 import numpy as np
 
@@ -31,6 +32,7 @@ from lsst.ts import salobj
 from . import utils
 from .script_info import ScriptInfo
 from .queue_model import QueueModel
+from .tracing import DEFAULT_TRACE_BUFFER_SIZE
 
 SCRIPT_INDEX_MULT = 100000
 """Minimum Script SAL index is ScriptQueue SAL index * SCRIPT_INDEX_MULT
@@ -38,6 +40,12 @@ and the maximum is SCRIPT_INDEX_MULT-1 more.
 """
 _MAX_SCRIPTQUEUE_INDEX = salobj.MAX_SAL_INDEX // SCRIPT_INDEX_MULT - 1
 
+# Maximum time to stop one script, if the stop command is accepted:
+# the stop command timeout plus the time to exit (seconds).
+_STOP_SCRIPT_TIMEOUT = 7
+# Maximum length of the ``result`` field of a command acknowledgement.
+_MAX_RESULT_LEN = 256
+
 
 class ScriptQueue(salobj.BaseCsc):
     """CSC to load and configure scripts, so they can be run.
@@ -60,6 +68,56 @@ class ScriptQueue(salobj.BaseCsc):
         ``lsst.ts.externalscripts.get_scripts_dir()``.
     verbose : `bool`
         If True then print diagnostic messages to stdout.
+    history_path : `str`, `os.PathLike` or `None` (optional)
+        Path to a SQLite database in which to save information about
+        scripts that no longer fit in the in-memory history,
+        so they can still be shown and requeued.
+        If None then such scripts are forgotten.
+    launcher_pool_size : `int` (optional)
+        Number of pre-started launcher processes to keep ready,
+        to reduce the time needed to load Python scripts.
+        If 0 then start each script by executing it.
+    schema_cache_path : `str`, `os.PathLike` or `None` (optional)
+        Path of a JSON file in which to cache script configuration schemas
+        across restarts. If None then schemas are only cached in memory.
+    prefetch_schemas : `bool` (optional)
+        If True then, whenever the CSC is enabled, get the configuration
+        schema of every available script in the background,
+        so ``showSchema`` is fast.
+    validate_configs : `bool` (optional)
+        If True then the ``add`` command checks the configuration
+        against the script's cached schema, and rejects an invalid
+        configuration without starting the script.
+        Works best with ``prefetch_schemas``.
+    lookahead : `int` or `None` (optional)
+        If not None then only load the first ``lookahead`` queued scripts;
+        scripts further back on the queue are pending until they move
+        forward. If None then load every script as soon as it is added.
+    resource_sample_interval : `float` or `None` (optional)
+        Interval between samples of the memory and CPU use
+        of the script processes (seconds). If None then do not sample.
+    memory_budget : `int` or `None` (optional)
+        Maximum total resident memory of the script processes (bytes).
+        If exceeded, idle queued scripts are unloaded, starting at the back
+        of the queue, and loaded again when there is room.
+        Requires ``resource_sample_interval``.
+    metrics_interval : `float` or `None` (optional)
+        Interval between summaries of script lifecycle durations
+        (load, configure, run and teardown time, and the gap
+        between scripts), which are output as log messages (seconds).
+        If None then do not output summaries.
+    trace_path : `str`, `os.PathLike` or `None` (optional)
+        If not None then trace the callbacks that handle script events
+        and update the queue, and measure event loop lag;
+        see `QueueModel` argument ``trace_buffer_size``.
+        The recent trace events are written to this path, as a Chrome
+        trace-event JSON file, when the CSC receives SIGUSR1
+        and when it closes; see `write_trace`.
+    script_event_interval : `float` (optional)
+        Minimum interval between ``script`` events for one script (seconds).
+        Changes to a script within this interval are coalesced,
+        so only the latest is output, except that final states
+        are output at once. If 0 then output every change.
 
     Raises
     ------
@@ -78,6 +136,17 @@ class ScriptQueue(salobj.BaseCsc):
         standardpath=None,
         externalpath=None,
         verbose=False,
+        history_path=None,
+        launcher_pool_size=0,
+        schema_cache_path=None,
+        prefetch_schemas=False,
+        validate_configs=False,
+        lookahead=None,
+        resource_sample_interval=None,
+        memory_budget=None,
+        metrics_interval=None,
+        trace_path=None,
+        script_event_interval=0,
     ):
         if index < 0 or index > _MAX_SCRIPTQUEUE_INDEX:
             raise ValueError(
@@ -86,6 +155,9 @@ class ScriptQueue(salobj.BaseCsc):
         standardpath = self._get_scripts_path(standardpath, is_standard=True)
         externalpath = self._get_scripts_path(externalpath, is_standard=False)
         self.verbose = verbose
+        self.trace_path = trace_path
+        # Task writing the trace, started by SIGUSR1.
+        self.write_trace_task = salobj.make_done_future()
 
         min_sal_index = index * SCRIPT_INDEX_MULT
         max_sal_index = min_sal_index + SCRIPT_INDEX_MULT - 1
@@ -106,6 +178,17 @@ class ScriptQueue(salobj.BaseCsc):
             min_sal_index=min_sal_index,
             max_sal_index=max_sal_index,
             verbose=verbose,
+            history_path=history_path,
+            launcher_pool_size=launcher_pool_size,
+            schema_cache_path=schema_cache_path,
+            prefetch_schemas=prefetch_schemas,
+            validate_configs=validate_configs,
+            lookahead=lookahead,
+            resource_sample_interval=resource_sample_interval,
+            memory_budget=memory_budget,
+            metrics_interval=metrics_interval,
+            trace_buffer_size=None if trace_path is None else DEFAULT_TRACE_BUFFER_SIZE,
+            script_callback_interval=script_event_interval,
         )
 
     def _get_scripts_path(self, patharg, is_standard):
@@ -150,13 +233,56 @@ class ScriptQueue(salobj.BaseCsc):
             force_output=True,
         )
         self.put_queue()
+        if self.trace_path is not None:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1, self._start_write_trace
+            )
         await super().start()
 
     async def close_tasks(self):
         """Shut down the queue, terminate all scripts and free resources."""
+        if self.trace_path is not None:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+            await self.write_trace_task
+            await self.write_trace()
         await self.model.close()
         await super().close_tasks()
 
+    async def write_trace(self):
+        """Write recent trace events to ``trace_path``
+        as a Chrome trace-event JSON file.
+
+        The events are copied in the event loop, then formatted
+        and written in a thread, so the event loop is not blocked.
+        Also log statistics for each traced callback.
+        Does nothing if ``trace_path`` is None.
+        """
+        if self.trace_path is None:
+            return
+        tracer = self.model.tracer
+        events = tracer.snapshot()
+        stats = tracer.stats()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, tracer.write_chrome_trace, self.trace_path, events
+            )
+        except Exception:
+            self.log.exception(f"Could not write trace to {self.trace_path}")
+            return
+        stats_str = "; ".join(
+            f"{name}: count={stats['count']}, mean={stats['mean']*1000:0.3f}, "
+            f"max={stats['max']*1000:0.3f} msec"
+            for name, stats in stats.items()
+        )
+        self.log.info(f"Wrote trace to {self.trace_path}; {stats_str}")
+
+    def _start_write_trace(self):
+        """Start writing the trace, unless already doing so;
+        the SIGUSR1 handler.
+        """
+        if self.write_trace_task.done():
+            self.write_trace_task = asyncio.create_task(self.write_trace())
+
     def do_showAvailableScripts(self, data=None):
         """Output a list of available scripts.
 
@@ -168,14 +294,18 @@ class ScriptQueue(salobj.BaseCsc):
         self.assert_enabled("showAvailableScripts")
         scripts = self.model.find_available_scripts()
         self.evt_availableScripts.set_put(
-            standard=":".join(scripts.standard),
-            external=":".join(scripts.external),
+            standard=scripts.joined_standard,
+            external=scripts.joined_external,
             force_output=True,
         )
 
     async def do_showSchema(self, data):
         """Output the config schema for a script.
 
+        The schema is cached, so the script is only run (with ``--schema``)
+        if it has not been run before, or has changed since;
+        see `SchemaCache`.
+
         Parameters
         ----------
         data : ``cmd_showSchema.DataType``
@@ -183,29 +313,13 @@ class ScriptQueue(salobj.BaseCsc):
         """
         self.assert_enabled("showSchema")
         fullpath = self.model.make_full_path(data.isStandard, data.path)
-        initialpath = os.environ["PATH"]
-        scriptdir, scriptname = os.path.split(fullpath)
-        os.environ["PATH"] = scriptdir + ":" + initialpath
-        process = await asyncio.create_subprocess_exec(
-            scriptname, "0", "--schema", stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        schema = await self.model.schema_cache.get(fullpath)
+        self.evt_configSchema.set_put(
+            isStandard=data.isStandard,
+            path=data.path,
+            configSchema=schema,
+            force_output=True,
         )
-        try:
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=20)
-            self.evt_configSchema.set_put(
-                isStandard=data.isStandard,
-                path=data.path,
-                configSchema=stdout,
-                force_output=True,
-            )
-        except Exception:
-            if process.returncode is None:
-                process.terminate()
-                self.log.warning(
-                    "showSchema killed a process that was not properly terminated"
-                )
-            raise
-        finally:
-            os.environ["PATH"] = initialpath
 
     def do_showQueue(self, data):
         """Output the queue event.
@@ -221,6 +335,9 @@ class ScriptQueue(salobj.BaseCsc):
     def do_showScript(self, data):
         """Output the script event for one script.
 
+        The script may be queued, running, or in the history
+        (including the history database, if there is one).
+
         Parameters
         ----------
         data : ``cmd_showScript.DataType`` (optional)
@@ -268,7 +385,7 @@ class ScriptQueue(salobj.BaseCsc):
         self.assert_enabled("add")
         script_info = ScriptInfo(
             log=self.log,
-            remote=self.model.remote,
+            transport=self.model.transport,
             index=self.model.next_sal_index,
             seq_num=data.private_seqNum,
             is_standard=data.isStandard,
@@ -324,17 +441,41 @@ class ScriptQueue(salobj.BaseCsc):
 
         If you stop the current script, it is moved to the history.
         If you stop queued scripts they are not not moved to the history.
+
+        Scripts are stopped concurrently; see `QueueModel.stop_scripts`.
+        On success the ``result`` field of the final acknowledgement
+        lists what was done with each script, e.g.
+        "stopped: 100001; terminated: 100002, 100003".
         """
         self.assert_enabled("stopScripts")
         if data.length <= 0:
             raise salobj.ExpectedError(f"length={data.length} must be positive")
-        timeout = 5 + 0.2 * data.length
-        await asyncio.wait_for(
+        # Scripts are stopped in batches of ``max_concurrent_stops``,
+        # and stopping one script takes at most ``_STOP_SCRIPT_TIMEOUT``,
+        # plus the time needed to terminate it if the stop command fails.
+        nbatches = math.ceil(data.length / self.model.max_concurrent_stops)
+        timeout = 5 + _STOP_SCRIPT_TIMEOUT * nbatches
+        outcomes = await asyncio.wait_for(
             self.model.stop_scripts(
                 sal_indices=data.salIndices[0 : data.length], terminate=data.terminate
             ),
             timeout,
         )
+        indices_by_outcome = dict()
+        for sal_index, outcome in outcomes.items():
+            indices_by_outcome.setdefault(outcome.value, []).append(str(sal_index))
+        result = "; ".join(
+            f"{outcome}: {', '.join(indices)}"
+            for outcome, indices in indices_by_outcome.items()
+        )
+        self.log.info(f"stopScripts: {result}")
+        if len(result) > _MAX_RESULT_LEN:
+            result = result[0 : _MAX_RESULT_LEN - 3] + "..."
+        return self.salinfo.make_ackcmd(
+            private_seqNum=data.private_seqNum,
+            ack=salobj.SalRetCode.CMD_COMPLETE,
+            result=result,
+        )
 
     def report_summary_state(self):
         super().report_summary_state()
@@ -470,9 +611,89 @@ class ScriptQueue(salobj.BaseCsc):
             action="store_true",
             help="Print diagnostic information to stdout",
         )
+        parser.add_argument(
+            "--history",
+            help="SQLite database in which to save information about old scripts; "
+            "if omitted then scripts that no longer fit in memory are forgotten",
+        )
+        parser.add_argument(
+            "--launchers",
+            type=int,
+            default=0,
+            help="Number of pre-started processes to keep ready to run Python scripts; "
+            "if 0 then start each script by executing it",
+        )
+        parser.add_argument(
+            "--schema-cache",
+            help="JSON file in which to cache script configuration schemas; "
+            "if omitted then schemas are only cached in memory",
+        )
+        parser.add_argument(
+            "--prefetch-schemas",
+            action="store_true",
+            help="Get the configuration schema of every available script "
+            "in the background when the CSC is enabled",
+        )
+        parser.add_argument(
+            "--validate-configs",
+            action="store_true",
+            help="Check the configuration of each added script against "
+            "the script's cached schema before starting the script",
+        )
+        parser.add_argument(
+            "--lookahead",
+            type=int,
+            help="Only load this many queued scripts; "
+            "if omitted then load every script when it is added",
+        )
+        parser.add_argument(
+            "--sample-interval",
+            type=float,
+            help="Interval between samples of the memory and CPU use "
+            "of script processes (seconds); if omitted then do not sample",
+        )
+        parser.add_argument(
+            "--memory-budget",
+            type=float,
+            help="Maximum total resident memory of script processes (MiB); "
+            "requires --sample-interval",
+        )
+        parser.add_argument(
+            "--metrics-interval",
+            type=float,
+            help="Interval between logged summaries of script lifecycle "
+            "durations (seconds); if omitted then do not log summaries",
+        )
+        parser.add_argument(
+            "--trace",
+            dest="trace_path",
+            help="Trace callbacks and event loop lag, and write recent "
+            "trace events to this Chrome trace-event JSON file "
+            "on SIGUSR1 and on exit",
+        )
+        parser.add_argument(
+            "--script-event-interval",
+            type=float,
+            default=0,
+            help="Minimum interval between script events for one script "
+            "(seconds); changes within this interval are coalesced, "
+            "except final states. If 0 then output every change",
+        )
 
     @classmethod
     def add_kwargs_from_args(cls, args, kwargs):
         kwargs["standardpath"] = args.standard
         kwargs["externalpath"] = args.external
         kwargs["verbose"] = args.verbose
+        kwargs["history_path"] = args.history
+        kwargs["launcher_pool_size"] = args.launchers
+        kwargs["schema_cache_path"] = args.schema_cache
+        kwargs["prefetch_schemas"] = args.prefetch_schemas
+        kwargs["validate_configs"] = args.validate_configs
+        kwargs["lookahead"] = args.lookahead
+        kwargs["resource_sample_interval"] = args.sample_interval
+        kwargs["metrics_interval"] = args.metrics_interval
+        kwargs["trace_path"] = args.trace_path
+        kwargs["script_event_interval"] = args.script_event_interval
+        if args.memory_budget is not None:
+            kwargs["memory_budget"] = int(args.memory_budget * 2 ** 20)
@@ -0,0 +1,207 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = [
+    "DEFAULT_LEAP_SECONDS",
+    "get_leap_seconds",
+    "set_leap_seconds",
+    "read_leap_seconds_file",
+    "tai_minus_utc",
+    "tai_isot",
+    "current_tai_isot",
+]
+
+import bisect
+import time
+
+# Seconds between the NTP epoch (1900-01-01) and the unix epoch (1970-01-01).
+_NTP_TO_UNIX = 2208988800
+
+# Leap second table: a tuple of (UTC unix time, TAI-UTC in seconds),
+# where each TAI-UTC applies from the specified time on.
+# Update this (or call `set_leap_seconds` or `read_leap_seconds_file`)
+# when the IERS announces a new leap second.
+DEFAULT_LEAP_SECONDS = (
+    (63072000, 10),  # 1972-01-01
+    (78796800, 11),  # 1972-07-01
+    (94694400, 12),  # 1973-01-01
+    (126230400, 13),  # 1974-01-01
+    (157766400, 14),  # 1975-01-01
+    (189302400, 15),  # 1976-01-01
+    (220924800, 16),  # 1977-01-01
+    (252460800, 17),  # 1978-01-01
+    (283996800, 18),  # 1979-01-01
+    (315532800, 19),  # 1980-01-01
+    (362793600, 20),  # 1981-07-01
+    (394329600, 21),  # 1982-07-01
+    (425865600, 22),  # 1983-07-01
+    (489024000, 23),  # 1985-07-01
+    (567993600, 24),  # 1988-01-01
+    (631152000, 25),  # 1990-01-01
+    (662688000, 26),  # 1991-01-01
+    (709948800, 27),  # 1992-07-01
+    (741484800, 28),  # 1993-07-01
+    (773020800, 29),  # 1994-07-01
+    (820454400, 30),  # 1996-01-01
+    (867715200, 31),  # 1997-07-01
+    (915148800, 32),  # 1999-01-01
+    (1136073600, 33),  # 2006-01-01
+    (1230768000, 34),  # 2009-01-01
+    (1341100800, 35),  # 2012-07-01
+    (1435708800, 36),  # 2015-07-01
+    (1483228800, 37),  # 2017-01-01
+)
+
+# The leap second table in use, split into two lists for `bisect`.
+_leap_times = []
+_leap_offsets = []
+
+
+def get_leap_seconds():
+    """Get the leap second table in use.
+
+    Returns
+    -------
+    table : `tuple` [`tuple`]
+        Leap second table: a tuple of (UTC unix time, TAI-UTC in seconds),
+        in increasing order of time.
+    """
+    return tuple(zip(_leap_times, _leap_offsets))
+
+
+def set_leap_seconds(table):
+    """Set the leap second table.
+
+    Parameters
+    ----------
+    table : `iterable` [`tuple`]
+        Leap second table: (UTC unix time, TAI-UTC in seconds) pairs,
+        in any order.
+
+    Raises
+    ------
+    ValueError
+        If ``table`` is empty or has duplicate times.
+    """
+    table = sorted((int(utc), int(offset)) for utc, offset in table)
+    if not table:
+        raise ValueError("table is empty")
+    times = [utc for utc, offset in table]
+    if len(set(times)) != len(times):
+        raise ValueError("table has duplicate times")
+    _leap_times[:] = times
+    _leap_offsets[:] = [offset for utc, offset in table]
+
+
+def read_leap_seconds_file(path):
+    """Set the leap second table from a ``leap-seconds.list`` file.
+
+    This is the format published by the IERS and IETF
+    and distributed with tzdata: lines of NTP time (seconds since
+    1900-01-01) and TAI-UTC, with comments starting with "#".
+
+    Parameters
+    ----------
+    path : `str` or `os.PathLike`
+        Path to the file.
+
+    Raises
+    ------
+    ValueError
+        If the file cannot be parsed or has no entries.
+    """
+    table = []
+    with open(path, "r") as f:
+        for line in f:
+            data = line.split("#", 1)[0].split()
+            if not data:
+                continue
+            try:
+                ntp_time, offset = int(data[0]), int(data[1])
+            except (IndexError, ValueError):
+                raise ValueError(f"Cannot parse line {line!r} of {path}")
+            table.append((ntp_time - _NTP_TO_UNIX, offset))
+    set_leap_seconds(table)
+
+
+def tai_minus_utc(utc):
+    """Get TAI-UTC at the specified UTC time.
+
+    Parameters
+    ----------
+    utc : `float`
+        UTC unix time (seconds since 1970-01-01, excluding leap seconds),
+        as returned by `time.time`.
+
+    Returns
+    -------
+    tai_minus_utc : `int`
+        TAI-UTC (seconds).
+
+    Raises
+    ------
+    ValueError
+        If ``utc`` is earlier than the first entry in the leap second table
+        (1972-01-01 for the default table); before 1972 TAI-UTC
+        was not an integer number of seconds.
+    """
+    i = bisect.bisect_right(_leap_times, utc)
+    if i == 0:
+        raise ValueError(f"utc={utc} precedes the leap second table")
+    return _leap_offsets[i - 1]
+
+
+def tai_isot(utc):
+    """Format a UTC unix time as a TAI ISO-8601 string.
+
+    The format matches ``astropy.time.Time.tai.isot``:
+    "YYYY-MM-DDThh:mm:ss.sss", rounded to the nearest millisecond.
+
+    Parameters
+    ----------
+    utc : `float`
+        UTC unix time (seconds since 1970-01-01, excluding leap seconds),
+        as returned by `time.time`.
+
+    Returns
+    -------
+    isot : `str`
+        TAI date and time as an ISO-8601 string.
+
+    Raises
+    ------
+    ValueError
+        If ``utc`` is earlier than the first entry in the leap second table.
+    """
+    tai_ms = round((utc + tai_minus_utc(utc)) * 1000)
+    tai_sec, ms = divmod(tai_ms, 1000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(tai_sec)) + f".{ms:03d}"
+
+
+def current_tai_isot():
+    """Get the current TAI time as an ISO-8601 string.
+
+    Equivalent to ``astropy.time.Time.now().tai.isot``, but much faster.
+    """
+    return tai_isot(time.time())
+
+
+set_leap_seconds(DEFAULT_LEAP_SECONDS)
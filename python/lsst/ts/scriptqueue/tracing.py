@@ -0,0 +1,291 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["LOOP_LAG_NAME", "TraceEvent", "CallTracer"]
+
+import asyncio
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+# Name of the trace events that record event loop lag.
+LOOP_LAG_NAME = "event_loop_lag"
+
+# Default maximum number of call events kept by `CallTracer`.
+DEFAULT_TRACE_BUFFER_SIZE = 100000
+
+# Default maximum number of event loop lag events kept by `CallTracer`;
+# an hour at 10 Hz.
+DEFAULT_LAG_BUFFER_SIZE = 36000
+
+TraceEvent = collections.namedtuple("TraceEvent", ["name", "timestamp", "duration"])
+TraceEvent.__doc__ = """An event recorded by `CallTracer`.
+
+Fields are ``name`` (name of the traced function, or `LOOP_LAG_NAME`),
+``timestamp`` (time at which the call started, or at which the lag
+was measured, unix seconds) and ``duration`` (duration of the call,
+or the event loop lag, seconds).
+"""
+
+
+class _CallStats:
+    """Statistics for calls to one traced function."""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+class CallTracer:
+    """Record the duration of calls to synchronous functions,
+    and the lag of the event loop, in a ring buffer.
+
+    Use `wrap` to trace a function, and `start_loop_lag_monitor`
+    to measure event loop lag. The most recent ``maxlen`` call events
+    and ``lag_maxlen`` lag events are kept, in separate buffers,
+    so frequent lag measurements do not push out call events.
+    They are available from `dump`, or as a Chrome trace-event file
+    (for ``chrome://tracing`` or Perfetto) from `write_chrome_trace`.
+    Per-function call counts and durations, from `stats`,
+    cover all calls, not just those in the buffer.
+
+    Parameters
+    ----------
+    maxlen : `int` (optional)
+        Maximum number of call events kept.
+    lag_maxlen : `int` (optional)
+        Maximum number of event loop lag events kept.
+
+    Raises
+    ------
+    ValueError
+        If ``maxlen`` or ``lag_maxlen`` < 1.
+    """
+
+    def __init__(
+        self, maxlen=DEFAULT_TRACE_BUFFER_SIZE, lag_maxlen=DEFAULT_LAG_BUFFER_SIZE
+    ):
+        if maxlen < 1:
+            raise ValueError(f"maxlen={maxlen} must be positive")
+        if lag_maxlen < 1:
+            raise ValueError(f"lag_maxlen={lag_maxlen} must be positive")
+        self.events = collections.deque(maxlen=maxlen)
+        self.lag_events = collections.deque(maxlen=lag_maxlen)
+        # dict of name: _CallStats
+        self._stats = dict()
+        self.loop_lag_task = None
+
+    def wrap(self, name, func):
+        """Wrap a function so that each call is traced.
+
+        Parameters
+        ----------
+        name : `str`
+            Name for the trace events.
+        func : ``callable``
+            Synchronous function to trace.
+
+        Returns
+        -------
+        wrapped : ``callable``
+            The wrapped function.
+        """
+        stats = self._stats.setdefault(name, _CallStats())
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timestamp = time.time()
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - t0
+                stats.count += 1
+                stats.total += duration
+                if duration > stats.max:
+                    stats.max = duration
+                self.events.append(TraceEvent(name, timestamp, duration))
+
+        return wrapper
+
+    def start_loop_lag_monitor(self, interval):
+        """Start measuring event loop lag.
+
+        Sleep for ``interval`` seconds, over and over, and record how much
+        longer than that each sleep took, as events named `LOOP_LAG_NAME`.
+        Call this from a coroutine or callback running in the event loop.
+
+        Parameters
+        ----------
+        interval : `float`
+            Interval between measurements (seconds).
+
+        Raises
+        ------
+        ValueError
+            If ``interval`` is not positive.
+        """
+        if interval <= 0:
+            raise ValueError(f"interval={interval} must be positive")
+        self.stop_loop_lag_monitor()
+        self._stats.setdefault(LOOP_LAG_NAME, _CallStats())
+        self.loop_lag_task = asyncio.create_task(self._loop_lag_loop(interval))
+
+    def stop_loop_lag_monitor(self):
+        """Stop measuring event loop lag, if running."""
+        if self.loop_lag_task is not None:
+            self.loop_lag_task.cancel()
+            self.loop_lag_task = None
+
+    def clear(self):
+        """Clear the events and statistics."""
+        self.events.clear()
+        self.lag_events.clear()
+        for stats in self._stats.values():
+            stats.count = 0
+            stats.total = 0
+            stats.max = 0
+
+    def dump(self):
+        """Get the recorded events.
+
+        Returns
+        -------
+        events : `list` [`TraceEvent`]
+            The most recent call and lag events, sorted by timestamp.
+        """
+        return sorted(self.snapshot(), key=lambda event: event.timestamp)
+
+    def snapshot(self):
+        """Get a copy of the recorded events, in no particular order.
+
+        This is faster than `dump`, and the result can safely be used
+        in another thread, e.g. by `write_chrome_trace`.
+
+        Returns
+        -------
+        events : `list` [`TraceEvent`]
+            The most recent call and lag events.
+        """
+        return list(self.events) + list(self.lag_events)
+
+    def stats(self):
+        """Get statistics for each traced function
+        and for event loop lag.
+
+        Returns
+        -------
+        stats : `dict` [`str`, `dict`]
+            A dict of name: dict with keys ``count``, ``total``, ``mean``
+            and ``max``. Durations are in seconds.
+        """
+        return {
+            name: dict(
+                count=stats.count,
+                total=stats.total,
+                mean=stats.total / stats.count if stats.count > 0 else 0,
+                max=stats.max,
+            )
+            for name, stats in self._stats.items()
+        }
+
+    def as_chrome_trace(self, events=None):
+        """Get the recorded events in Chrome trace-event format.
+
+        Calls are complete ("X") events and event loop lag
+        is a counter ("C") event, in msec.
+
+        Parameters
+        ----------
+        events : `list` [`TraceEvent`] or `None` (optional)
+            Events to format. If None then use `snapshot`.
+
+        Returns
+        -------
+        trace : `dict`
+            Trace data that can be saved as JSON.
+        """
+        if events is None:
+            events = self.snapshot()
+        pid = os.getpid()
+        tid = threading.get_ident()
+        trace_events = []
+        for event in events:
+            ts = event.timestamp * 1e6
+            if event.name == LOOP_LAG_NAME:
+                trace_events.append(
+                    dict(
+                        name=event.name,
+                        ph="C",
+                        ts=ts,
+                        pid=pid,
+                        args=dict(lag_msec=event.duration * 1000),
+                    )
+                )
+            else:
+                trace_events.append(
+                    dict(
+                        name=event.name,
+                        ph="X",
+                        ts=ts,
+                        dur=event.duration * 1e6,
+                        pid=pid,
+                        tid=tid,
+                    )
+                )
+        return dict(traceEvents=trace_events, displayTimeUnit="ms")
+
+    def write_chrome_trace(self, path, events=None):
+        """Write the recorded events as a Chrome trace-event JSON file.
+
+        To avoid blocking the event loop, take a `snapshot` in the
+        event loop, then call this in a thread with that snapshot.
+
+        Parameters
+        ----------
+        path : `str` or `os.PathLike`
+            Path of the file to write.
+        events : `list` [`TraceEvent`] or `None` (optional)
+            Events to write. If None then use `snapshot`.
+        """
+        trace = self.as_chrome_trace(events)
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+    async def _loop_lag_loop(self, interval):
+        """Measure event loop lag every ``interval`` seconds."""
+        stats = self._stats[LOOP_LAG_NAME]
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - t0 - interval, 0)
+            stats.count += 1
+            stats.total += lag
+            if lag > stats.max:
+                stats.max = lag
+            self.lag_events.append(TraceEvent(LOOP_LAG_NAME, time.time(), lag))
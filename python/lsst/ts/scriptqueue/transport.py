@@ -0,0 +1,201 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["BaseScriptTransport", "SalScriptTransport", "LocalScriptTransport"]
+
+import abc
+import asyncio
+import time
+import types
+
+from lsst.ts import salobj
+
+
+class BaseScriptTransport(abc.ABC):
+    """Send commands to, and receive events from, Script SAL components.
+
+    This is all the communication with scripts that `QueueModel`
+    and `ScriptInfo` need, so they can run without DDS
+    using `LocalScriptTransport`.
+
+    Attributes
+    ----------
+    start_task : `asyncio.Future`
+        Done when the transport is ready to use.
+    """
+
+    @abc.abstractmethod
+    async def send_command(self, name, sal_index, timeout=None, **kwargs):
+        """Send a command to a script and wait for it to finish.
+
+        Parameters
+        ----------
+        name : `str`
+            Command name, e.g. "configure", without the "cmd\\_" prefix.
+        sal_index : `int`
+            SAL index of the script.
+        timeout : `float` or `None` (optional)
+            Time limit (seconds). If None then use the default
+            for the transport.
+        **kwargs
+            Command parameters.
+
+        Returns
+        -------
+        ack : ``ackcmd``
+            The final command acknowledgement.
+            Its ``ack`` attribute is ``salobj.SalRetCode.CMD_COMPLETE``
+            and its ``result`` attribute is a `str`.
+
+        Raises
+        ------
+        Exception
+            If the command fails or times out; the exception type
+            depends on the transport, e.g. `salobj.AckError`
+            or `asyncio.TimeoutError`.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def set_event_callback(self, name, callback):
+        """Set the function to call when a script outputs an event.
+
+        Parameters
+        ----------
+        name : `str`
+            Event name, e.g. "state", without the "evt\\_" prefix.
+        callback : ``callable`` or `None`
+            Function to call with one argument: the event data,
+            which has a ``ScriptID`` attribute (the SAL index of
+            the script) and attributes for the event fields.
+            If None then clear the callback.
+        """
+        raise NotImplementedError()
+
+
+class SalScriptTransport(BaseScriptTransport):
+    """Communicate with scripts using a `salobj.Remote`.
+
+    Parameters
+    ----------
+    remote : `salobj.Remote`
+        Remote for Script SAL components. Use index 0 to communicate
+        with all scripts, as `QueueModel` does.
+    """
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.start_task = remote.start_task
+
+    async def send_command(self, name, sal_index, timeout=None, **kwargs):
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        command = getattr(self.remote, f"cmd_{name}")
+        return await command.set_start(ScriptID=sal_index, **kwargs)
+
+    def set_event_callback(self, name, callback):
+        getattr(self.remote, f"evt_{name}").callback = callback
+
+
+class LocalScriptTransport(BaseScriptTransport):
+    """Communicate with scripts that are emulated in-process.
+
+    The emulator registers a handler for each command it supports,
+    with `set_command_handler`, and outputs events with `put_event`.
+    Events are delivered synchronously.
+
+    Attributes
+    ----------
+    num_commands : `int`
+        Number of commands sent.
+    num_events : `int`
+        Number of events output.
+    """
+
+    def __init__(self):
+        self.start_task = asyncio.Future()
+        self.start_task.set_result(None)
+        # dict of command name: handler
+        self._command_handlers = dict()
+        # dict of event name: callback
+        self._event_callbacks = dict()
+        self.num_commands = 0
+        self.num_events = 0
+
+    def set_command_handler(self, name, handler):
+        """Set the function that handles a command.
+
+        Parameters
+        ----------
+        name : `str`
+            Command name, without the "cmd\\_" prefix.
+        handler : ``coroutine`` or `None`
+            Async function to call with keyword arguments:
+            ``sal_index`` (SAL index of the script) and the command
+            parameters. It may return a `str` for the ``result`` field
+            of the acknowledgement, and raises to fail the command.
+            If None then clear the handler.
+        """
+        if handler is None:
+            self._command_handlers.pop(name, None)
+        else:
+            self._command_handlers[name] = handler
+
+    def put_event(self, name, sal_index, **kwargs):
+        """Output an event: call the event callback, if any.
+
+        Parameters
+        ----------
+        name : `str`
+            Event name, without the "evt\\_" prefix.
+        sal_index : `int`
+            SAL index of the script.
+        **kwargs
+            Event fields.
+        """
+        self.num_events += 1
+        callback = self._event_callbacks.get(name)
+        if callback is not None:
+            callback(
+                types.SimpleNamespace(
+                    ScriptID=sal_index, private_sndStamp=time.time(), **kwargs
+                )
+            )
+
+    async def send_command(self, name, sal_index, timeout=None, **kwargs):
+        self.num_commands += 1
+        handler = self._command_handlers.get(name)
+        if handler is None:
+            raise RuntimeError(f"No handler for command {name!r}")
+        coro = handler(sal_index=sal_index, **kwargs)
+        if timeout is None:
+            result = await coro
+        else:
+            result = await asyncio.wait_for(coro, timeout=timeout)
+        return types.SimpleNamespace(
+            ack=salobj.SalRetCode.CMD_COMPLETE, error=0, result=result or ""
+        )
+
+    def set_event_callback(self, name, callback):
+        if callback is None:
+            self._event_callbacks.pop(name, None)
+        else:
+            self._event_callbacks[name] = callback
@@ -27,8 +27,6 @@ import logging
 import pathlib
 import random
 
-import astropy
-
 from lsst.ts import salobj
 from lsst.ts import scriptqueue
 
@@ -175,7 +173,7 @@ async def run_one_script(index, script, config, loglevel=None):
         print("starting the script process")
         script_info = scriptqueue.ScriptInfo(
             log=remote.salinfo.log,
-            remote=remote,
+            transport=scriptqueue.SalScriptTransport(remote),
             index=index,
             seq_num=1,
             is_standard=False,
@@ -195,7 +193,7 @@ async def run_one_script(index, script, config, loglevel=None):
                 await remote.cmd_setLogLevel.set_start(
                     level=loglevel, timeout=STD_TIMEOUT
                 )
-            group_id = astropy.time.Time.now().tai.isot
+            group_id = scriptqueue.current_tai_isot()
             print(f"setting group ID={group_id}")
             await script_info.set_group_id(group_id=group_id)
             print("running the script")
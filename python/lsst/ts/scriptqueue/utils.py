@@ -20,22 +20,197 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 __all__ = [
+    "ProcessCredentials",
+    "ScriptEntry",
     "find_public_scripts",
+    "get_process_credentials",
+    "is_executable_mode",
+    "scan_public_scripts",
     "configure_logging",
     "generate_logfile",
     "get_default_scripts_dir",
 ]
 
+import collections
+import concurrent.futures
 import os
 import logging
+import stat
 import time
 
+ScriptEntry = collections.namedtuple(
+    "ScriptEntry", ["relpath", "size", "mtime", "mode"]
+)
+ScriptEntry.__doc__ = """Information about a public script found by
+`scan_public_scripts`.
+
+Fields are ``relpath`` (path relative to the root directory),
+``size`` (bytes), ``mtime`` (modification time, unix seconds)
+and ``mode`` (``st_mode`` of the script).
+"""
+
+ProcessCredentials = collections.namedtuple(
+    "ProcessCredentials", ["euid", "egid", "groups"]
+)
+ProcessCredentials.__doc__ = """User and group IDs of this process,
+as used by `is_executable_mode`.
+
+Fields are ``euid`` (effective user ID), ``egid`` (effective group ID)
+and ``groups`` (`frozenset` of supplementary group IDs).
+Get them with `get_process_credentials`.
+"""
+
+
+def get_process_credentials():
+    """Get the user and group IDs of this process.
+
+    Returns
+    -------
+    credentials : `ProcessCredentials`
+        The credentials.
+    """
+    return ProcessCredentials(
+        euid=os.geteuid(), egid=os.getegid(), groups=frozenset(os.getgroups())
+    )
+
+
+def is_executable_mode(stat_result, credentials=None):
+    """Return True if a file is executable by this process,
+    according to its mode bits.
+
+    This is equivalent to ``os.access(path, os.X_OK)``
+    except that access control lists are ignored.
+
+    Parameters
+    ----------
+    stat_result : `os.stat_result`
+        Result of ``os.stat`` for the file.
+    credentials : `ProcessCredentials` or `None` (optional)
+        Credentials of this process. If None then get them;
+        when checking many files, get them once with
+        `get_process_credentials` and specify them.
+    """
+    mode = stat_result.st_mode
+    if not stat.S_ISREG(mode):
+        return False
+    if credentials is None:
+        credentials = get_process_credentials()
+    if credentials.euid == 0:
+        return bool(mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH))
+    if stat_result.st_uid == credentials.euid:
+        return bool(mode & stat.S_IXUSR)
+    if (
+        stat_result.st_gid == credentials.egid
+        or stat_result.st_gid in credentials.groups
+    ):
+        return bool(mode & stat.S_IXGRP)
+    return bool(mode & stat.S_IXOTH)
+
+
+def _scan_dir(dirpath, relprefix, credentials, executor=None):
+    """Scan a directory tree for public scripts.
+
+    Parameters
+    ----------
+    dirpath : `str`
+        Path of directory to scan.
+    relprefix : `str`
+        Path of ``dirpath`` relative to the root, plus a trailing
+        separator, or "" for the root.
+    credentials : `ProcessCredentials`
+        Credentials of this process.
+    executor : `concurrent.futures.Executor` or `None`
+        If not None then scan each subdirectory in a separate job.
+
+    Returns
+    -------
+    entries : `list` [`ScriptEntry`]
+        The public scripts found.
+    """
+    entries = []
+    futures = []
+    try:
+        dir_entries = list(os.scandir(dirpath))
+    except OSError:
+        return entries
+    for entry in dir_entries:
+        name = entry.name
+        try:
+            if entry.is_dir():
+                if name.startswith(".") or entry.is_symlink():
+                    continue
+                subprefix = relprefix + name + os.sep
+                if executor is None:
+                    entries += _scan_dir(entry.path, subprefix, credentials)
+                else:
+                    futures.append(
+                        executor.submit(_scan_dir, entry.path, subprefix, credentials)
+                    )
+            elif name[0] not in (".", "_"):
+                stat_result = entry.stat()
+                if is_executable_mode(stat_result, credentials):
+                    entries.append(
+                        ScriptEntry(
+                            relpath=relprefix + name,
+                            size=stat_result.st_size,
+                            mtime=stat_result.st_mtime,
+                            mode=stat_result.st_mode,
+                        )
+                    )
+        except OSError:
+            # e.g. a broken symbolic link, or a file deleted during the scan
+            continue
+    for future in futures:
+        entries += future.result()
+    return entries
+
+
+def scan_public_scripts(root, max_workers=None):
+    """Find all public scripts in the specified root path,
+    with information about each.
+
+    Public scripts are executable files whose names do not start
+    with "." or "_", in the root directory or any subdirectory
+    whose name does not start with "." (symbolic links to directories
+    are not followed).
+
+    Parameters
+    ----------
+    root : `str`, `bytes` or `os.PathLike`
+        Path to root directory.
+    max_workers : `int` or `None` (optional)
+        If not None then scan the subdirectories of ``root``
+        in parallel on a pool of this many threads.
+        This can help if the scripts are on a network file system.
+
+    Returns
+    -------
+    entries : `list` [`ScriptEntry`]
+        Information about each public script, sorted by relative path.
+
+    Raises
+    ------
+    ValueError
+        If ``max_workers`` is not None and < 1.
+    """
+    root = os.fsdecode(root)
+    credentials = get_process_credentials()
+    if max_workers is None:
+        entries = _scan_dir(root, "", credentials)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Only parallelize the subdirectories of root: jobs that
+            # waited for other jobs could deadlock the pool.
+            entries = _scan_dir(root, "", credentials, executor=executor)
+    entries.sort()
+    return entries
+
 
 def find_public_scripts(root):
     """Find all public scripts in the specified root path.
 
     Public scripts are executable files whose names do not start
-    with "." or "_".
+    with "." or "_". See `scan_public_scripts` for details.
 
     Parameters
     ----------
@@ -47,16 +222,7 @@ def find_public_scripts(root):
     scripts : `list` [`str`]
         Relative path of each public script found in ``root``.
     """
-    paths = []
-    for dirpath, dirnames, filenames in os.walk(root, topdown=True, followlinks=False):
-        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
-        paths += [
-            os.path.join(dirpath, filename)
-            for filename in filenames
-            if filename[0] not in (".", "_")
-        ]
-    executables = [path for path in paths if os.access(path, os.X_OK)]
-    return [os.path.relpath(exe, root) for exe in executables]
+    return [entry.relpath for entry in scan_public_scripts(root)]
 
 
 def configure_logging(verbose=0, console_format=None, filename=None):
@@ -0,0 +1,184 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import copy
+import random
+import unittest
+
+from lsst.ts import scriptqueue
+
+
+class Item:
+    """A minimal queue item."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return f"Item({self.index})"
+
+
+class IndexedQueueTestCase(unittest.TestCase):
+    def assert_queue_equal(self, queue, expected_indices):
+        expected_indices = list(expected_indices)
+        self.assertEqual(len(queue), len(expected_indices))
+        self.assertEqual([item.index for item in queue], expected_indices)
+        for position, sal_index in enumerate(expected_indices):
+            self.assertEqual(queue[position].index, sal_index)
+            self.assertEqual(queue.position(sal_index), position)
+            self.assertEqual(queue.index(Item(sal_index)), position)
+            self.assertIn(Item(sal_index), queue)
+
+    def test_basics(self):
+        queue = scriptqueue.IndexedQueue()
+        self.assertFalse(queue)
+        self.assertEqual(len(queue), 0)
+        with self.assertRaises(IndexError):
+            queue.popleft()
+        with self.assertRaises(IndexError):
+            queue[0]
+
+        queue.append(Item(1))
+        queue.append(Item(2))
+        queue.appendleft(Item(3))
+        queue.insert(1, Item(4))
+        queue.insert(100, Item(5))
+        self.assertTrue(queue)
+        self.assert_queue_equal(queue, [3, 4, 1, 2, 5])
+        self.assertEqual(queue[-1].index, 5)
+        self.assertEqual(queue.get(4).index, 4)
+        self.assertIsNone(queue.get(999))
+        self.assertNotIn(Item(999), queue)
+        with self.assertRaises(ValueError):
+            queue.append(Item(1))
+        with self.assertRaises(ValueError):
+            queue.position(999)
+        with self.assertRaises(ValueError):
+            queue.remove(Item(999))
+
+        self.assertEqual(queue.popleft().index, 3)
+        self.assertEqual(queue.pop().index, 5)
+        self.assertEqual(queue.remove(Item(1)).index, 1)
+        del queue[0]
+        self.assert_queue_equal(queue, [2])
+
+        queue_copy = copy.copy(queue)
+        queue.append(Item(6))
+        self.assert_queue_equal(queue_copy, [2])
+        self.assert_queue_equal(queue, [2, 6])
+
+        queue.clear()
+        self.assert_queue_equal(queue, [])
+
+    def test_version(self):
+        queue = scriptqueue.IndexedQueue(Item(i) for i in range(5))
+        versions = [queue.version]
+
+        def assert_version_incremented():
+            self.assertGreater(queue.version, versions[-1])
+            versions.append(queue.version)
+
+        queue.append(Item(5))
+        assert_version_incremented()
+        queue.insert(2, Item(6))
+        assert_version_incremented()
+        queue.popleft()
+        assert_version_incremented()
+        queue.remove(Item(3))
+        assert_version_incremented()
+
+        # Reading the queue does not change the version.
+        queue.position(4)
+        queue[0]
+        list(queue)
+        self.assertEqual(queue.version, versions[-1])
+
+        # A failed transaction changes the version,
+        # even though the contents are restored.
+        with self.assertRaises(ValueError):
+            with queue.transaction():
+                queue.remove(Item(1))
+                queue.remove(Item(999))
+        assert_version_incremented()
+
+    def test_reset(self):
+        queue = scriptqueue.IndexedQueue(Item(i) for i in range(5))
+        version = queue.version
+        queue.reset(Item(i) for i in (4, 2, 0, 1, 3))
+        self.assert_queue_equal(queue, [4, 2, 0, 1, 3])
+        self.assertGreater(queue.version, version)
+
+        with self.assertRaises(ValueError):
+            queue.reset(Item(i) for i in (1, 2, 1))
+        self.assert_queue_equal(queue, [4, 2, 0, 1, 3])
+
+        with queue.transaction():
+            with self.assertRaises(RuntimeError):
+                queue.reset([])
+
+    def test_random_operations(self):
+        """Compare a long series of random operations to a list."""
+        rng = random.Random(47)
+        queue = scriptqueue.IndexedQueue(Item(i) for i in range(50))
+        expected = list(range(50))
+        next_index = 50
+        for i in range(2000):
+            if expected and rng.random() < 0.45:
+                sal_index = rng.choice(expected)
+                queue.remove(Item(sal_index))
+                expected.remove(sal_index)
+            else:
+                position = rng.randint(0, len(expected))
+                queue.insert(position, Item(next_index))
+                expected.insert(position, next_index)
+                next_index += 1
+            if i % 100 == 0:
+                self.assert_queue_equal(queue, expected)
+        self.assert_queue_equal(queue, expected)
+
+    def test_transaction(self):
+        queue = scriptqueue.IndexedQueue(Item(i) for i in range(10))
+        initial_indices = list(range(10))
+
+        # A successful transaction keeps its changes.
+        with queue.transaction():
+            item = queue.remove(Item(3))
+            queue.insert(7, item)
+        self.assert_queue_equal(queue, [0, 1, 2, 4, 5, 6, 7, 3, 8, 9])
+
+        # A failed transaction is rolled back.
+        queue = scriptqueue.IndexedQueue(Item(i) for i in range(10))
+        with self.assertRaises(ValueError):
+            with queue.transaction():
+                queue.remove(Item(3))
+                queue.popleft()
+                queue.append(Item(20))
+                queue.position(999)
+        self.assert_queue_equal(queue, initial_indices)
+
+        with queue.transaction():
+            with self.assertRaises(RuntimeError):
+                with queue.transaction():
+                    pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,263 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import os
+import pathlib
+import stat
+import types
+from unittest import mock
+import tempfile
+import unittest
+
+import asynctest
+
+from lsst.ts import scriptqueue
+
+# Long enough to start a process (seconds).
+STD_TIMEOUT = 60
+
+# A Python script that writes its name, command-line arguments
+# and whether it was run as __main__ to the file named by
+# environment variable ``LAUNCHER_TEST_OUTPUT``.
+PYTHON_SCRIPT = """#!/usr/bin/env python
+import os
+import sys
+
+with open(os.environ["LAUNCHER_TEST_OUTPUT"], "w") as f:
+    f.write(f"{__name__} {os.path.basename(sys.argv[0])} {sys.argv[1]}")
+"""
+
+SHELL_SCRIPT = """#!/bin/sh
+echo "shell" > "$LAUNCHER_TEST_OUTPUT"
+"""
+
+
+class LauncherPoolTestCase(asynctest.TestCase):
+    def setUp(self):
+        self.log = logging.getLogger()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dirpath = pathlib.Path(self.tempdir.name)
+        self.output_path = self.dirpath / "output.txt"
+        os.environ["LAUNCHER_TEST_OUTPUT"] = str(self.output_path)
+        self.python_script = self.make_script("python_script", PYTHON_SCRIPT)
+        self.shell_script = self.make_script("shell_script", SHELL_SCRIPT)
+
+    def tearDown(self):
+        del os.environ["LAUNCHER_TEST_OUTPUT"]
+        self.tempdir.cleanup()
+
+    def make_script(self, name, text):
+        path = self.dirpath / name
+        path.write_text(text)
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+        return path
+
+    async def wait_idle(self, pool, num_idle):
+        """Wait for the pool to have the specified number
+        of idle launchers."""
+        for i in range(int(STD_TIMEOUT / 0.01)):
+            if pool.num_idle == num_idle:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"num_idle={pool.num_idle} != {num_idle}")
+
+    def test_is_python_script(self):
+        self.assertTrue(scriptqueue.is_python_script(self.python_script))
+        self.assertFalse(scriptqueue.is_python_script(self.shell_script))
+        self.assertFalse(scriptqueue.is_python_script(self.dirpath / "no_such_file"))
+
+    async def test_launch(self):
+        with self.assertRaises(ValueError):
+            scriptqueue.LauncherPool(size=0, log=self.log)
+
+        pool = scriptqueue.LauncherPool(size=2, log=self.log, preload_modules=())
+        try:
+            pool.start()
+            await self.wait_idle(pool, 2)
+
+            # A Python script is run by a launcher, as __main__,
+            # and the pool is refilled.
+            for i in range(3):
+                process = await pool.launch(fullpath=self.python_script, index=i)
+                self.assertIsNotNone(process)
+                await asyncio.wait_for(process.wait(), timeout=STD_TIMEOUT)
+                self.assertEqual(process.returncode, 0)
+                self.assertEqual(
+                    self.output_path.read_text(), f"__main__ python_script {i}"
+                )
+                await self.wait_idle(pool, 2)
+            self.assertEqual(pool.num_warm_starts, 3)
+            self.assertEqual(pool.num_cold_starts, 0)
+
+            # A script that is not a Python script must be executed.
+            process = await pool.launch(fullpath=self.shell_script, index=5)
+            self.assertIsNone(process)
+            self.assertEqual(pool.num_cold_starts, 1)
+            self.assertEqual(pool.num_idle, 2)
+
+            # If no launcher is ready the script must be executed.
+            idle = pool._idle
+            pool._idle = []
+            for process in idle:
+                process.kill()
+                await process.wait()
+            process = await pool.launch(fullpath=self.python_script, index=6)
+            self.assertIsNone(process)
+            self.assertEqual(pool.num_cold_starts, 2)
+            await self.wait_idle(pool, 2)
+
+            # The result of is_python_script is cached until
+            # the script changes.
+            with mock.patch.object(
+                scriptqueue.launcher, "is_python_script", return_value=False
+            ) as mock_is_python_script:
+                process = await pool.launch(fullpath=self.python_script, index=8)
+                self.assertIsNotNone(process)
+                await asyncio.wait_for(process.wait(), timeout=STD_TIMEOUT)
+                mock_is_python_script.assert_not_called()
+                self.make_script("python_script", PYTHON_SCRIPT + "\n")
+                process = await pool.launch(fullpath=self.python_script, index=9)
+                self.assertIsNone(process)
+                mock_is_python_script.assert_called_once()
+            await self.wait_idle(pool, 2)
+
+            # If the request cannot be sent the launcher is killed
+            # and reaped, and the script must be executed.
+            def fail_write(data):
+                raise RuntimeError("Intentional failure")
+
+            launcher = pool._idle[0]
+            stdin = launcher.stdin
+            launcher.stdin = types.SimpleNamespace(write=fail_write)
+            self.make_script("python_script", PYTHON_SCRIPT)
+            process = await pool.launch(fullpath=self.python_script, index=10)
+            self.assertIsNone(process)
+            self.assertIsNotNone(launcher.returncode)
+            stdin.close()
+            await self.wait_idle(pool, 2)
+        finally:
+            await pool.close()
+        self.assertEqual(pool.num_idle, 0)
+        self.assertIsNone(await pool.launch(fullpath=self.python_script, index=7))
+
+
+# A shell script that writes the name of its directory,
+# its SAL index and the first directory on its PATH
+# to a file named for the SAL index. With --schema it also
+# writes the name of its directory to stdout.
+REPORTING_SCRIPT = """#!/bin/sh
+dirname=$(basename $(dirname $0))
+echo "$dirname $1 ${PATH%%:*}" > "$LAUNCHER_TEST_OUTPUT/$1"
+if [ "$2" = "--schema" ]; then
+    echo "$dirname"
+fi
+"""
+
+
+class ScriptLauncherTestCase(asynctest.TestCase):
+    def setUp(self):
+        self.log = logging.getLogger()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dirpath = pathlib.Path(self.tempdir.name)
+        self.outdir = self.dirpath / "output"
+        self.outdir.mkdir()
+        os.environ["LAUNCHER_TEST_OUTPUT"] = str(self.outdir)
+
+    def tearDown(self):
+        del os.environ["LAUNCHER_TEST_OUTPUT"]
+        self.tempdir.cleanup()
+
+    def make_scripts(self, num_scripts):
+        """Make scripts with the same name in different directories.
+
+        Returns
+        -------
+        paths : `list` [`pathlib.Path`]
+            Full path of each script.
+        """
+        paths = []
+        for i in range(num_scripts):
+            scriptdir = self.dirpath / f"dir{i}"
+            scriptdir.mkdir()
+            path = scriptdir / "script"
+            path.write_text(REPORTING_SCRIPT)
+            path.chmod(path.stat().st_mode | stat.S_IXUSR)
+            paths.append(path)
+        return paths
+
+    def test_make_env(self):
+        initial_environ = dict(os.environ)
+        env = scriptqueue.ScriptLauncher.make_env("/a/b/script")
+        self.assertEqual(env["PATH"], "/a/b:" + os.environ["PATH"])
+        self.assertEqual(dict(os.environ), initial_environ)
+
+    async def test_concurrent_launches(self):
+        """Start hundreds of scripts and schema requests concurrently,
+        and check that each process ran the right script.
+        """
+        num_scripts = 100
+        paths = self.make_scripts(num_scripts)
+        launcher = scriptqueue.ScriptLauncher()
+        initial_path = os.environ["PATH"]
+
+        async def load(i):
+            """Load a script as QueueModel.add does."""
+            script_info = scriptqueue.ScriptInfo(
+                log=self.log,
+                transport=None,
+                index=i,
+                seq_num=i,
+                is_standard=False,
+                path=f"dir{i}/script",
+                config="",
+                descr="",
+            )
+            await script_info.start_loading(fullpath=paths[i], launcher=launcher)
+            return await script_info.process_task
+
+        async def show_schema(i):
+            """Get a schema as ScriptQueue.do_showSchema does."""
+            process = await launcher.create_process(
+                paths[i],
+                str(num_scripts + i),
+                "--schema",
+                stdout=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await process.communicate()
+            return stdout.decode().strip()
+
+        coros = [load(i) for i in range(num_scripts)]
+        coros += [show_schema(i) for i in range(num_scripts)]
+        results = await asyncio.wait_for(asyncio.gather(*coros), timeout=STD_TIMEOUT)
+        self.assertEqual(results[0:num_scripts], [0] * num_scripts)
+        self.assertEqual(results[num_scripts:], [f"dir{i}" for i in range(num_scripts)])
+        self.assertEqual(os.environ["PATH"], initial_path)
+
+        for sal_index in range(2 * num_scripts):
+            i = sal_index % num_scripts
+            output = (self.outdir / str(sal_index)).read_text().split()
+            self.assertEqual(output, [f"dir{i}", str(sal_index), str(paths[i].parent)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import random
+import types
+import unittest
+
+from lsst.ts import scriptqueue
+
+
+class LatencyHistogramTestCase(unittest.TestCase):
+    def test_constructor_errors(self):
+        for kwargs in (
+            dict(resolution=0),
+            dict(resolution=1, max_value=0.5),
+            dict(precision_bits=0),
+        ):
+            with self.subTest(kwargs=kwargs):
+                with self.assertRaises(ValueError):
+                    scriptqueue.LatencyHistogram(**kwargs)
+
+    def test_empty(self):
+        hist = scriptqueue.LatencyHistogram()
+        self.assertEqual(hist.count, 0)
+        summary = hist.summary()
+        self.assertEqual(summary["count"], 0)
+        for name in ("mean", "min", "p50", "p90", "p99", "max"):
+            self.assertTrue(math.isnan(summary[name]))
+
+    def test_percentiles(self):
+        random.seed(47)
+        precision_bits = 5
+        hist = scriptqueue.LatencyHistogram(precision_bits=precision_bits)
+        num_buckets = len(hist.counts)
+        values = sorted(random.lognormvariate(0, 3) for i in range(10000))
+        for value in values:
+            hist.add(value)
+        self.assertEqual(len(hist.counts), num_buckets)
+        self.assertEqual(hist.count, len(values))
+        self.assertAlmostEqual(hist.mean, sum(values) / len(values))
+        self.assertEqual(hist.min, values[0])
+        self.assertEqual(hist.max, values[-1])
+        self.assertEqual(hist.percentile(0), values[0])
+        self.assertEqual(hist.percentile(100), values[-1])
+        max_rel_error = 2 ** -precision_bits
+        for percent in (1, 10, 50, 90, 99, 99.9):
+            with self.subTest(percent=percent):
+                expected = values[math.ceil(len(values) * percent / 100) - 1]
+                measured = hist.percentile(percent)
+                self.assertLessEqual(
+                    abs(measured - expected), max_rel_error * expected + 1e-6
+                )
+        for percent in (-1, 101):
+            with self.assertRaises(ValueError):
+                hist.percentile(percent)
+
+    def test_clip_and_negative(self):
+        hist = scriptqueue.LatencyHistogram(max_value=10)
+        hist.add(-1)
+        hist.add(1000)
+        self.assertEqual(hist.min, 0)
+        self.assertEqual(hist.max, 1000)
+        self.assertEqual(hist.percentile(0), 0)
+        self.assertEqual(hist.percentile(100), 1000)
+
+    def test_merge_and_clear(self):
+        hist1 = scriptqueue.LatencyHistogram()
+        hist2 = scriptqueue.LatencyHistogram()
+        for value in (1, 2, 3):
+            hist1.add(value)
+        for value in (0.5, 4):
+            hist2.add(value)
+        hist1.merge(hist2)
+        self.assertEqual(hist1.count, 5)
+        self.assertEqual(hist1.min, 0.5)
+        self.assertEqual(hist1.max, 4)
+        self.assertAlmostEqual(hist1.total, 10.5)
+
+        with self.assertRaises(ValueError):
+            hist1.merge(scriptqueue.LatencyHistogram(precision_bits=3))
+
+        hist1.clear()
+        self.assertEqual(hist1.count, 0)
+        self.assertEqual(sum(hist1.counts), 0)
+        self.assertTrue(math.isnan(hist1.max))
+
+
+class QueueMetricsTestCase(unittest.TestCase):
+    def make_script_info(self, **kwargs):
+        timestamps = dict(
+            timestamp_process_start=0,
+            timestamp_configure_start=0,
+            timestamp_configure_end=0,
+            timestamp_run_start=0,
+            timestamp_run_end=0,
+            timestamp_process_end=0,
+        )
+        timestamps.update(kwargs)
+        return types.SimpleNamespace(**timestamps)
+
+    def test_add_script(self):
+        metrics = scriptqueue.QueueMetrics()
+        metrics.add_script(
+            self.make_script_info(
+                timestamp_process_start=100,
+                timestamp_configure_start=102,
+                timestamp_configure_end=102.5,
+                timestamp_run_start=103,
+                timestamp_run_end=113,
+                timestamp_process_end=113.25,
+            )
+        )
+        summary = metrics.summary()
+        for name, expected in (
+            ("load", 2),
+            ("configure", 0.5),
+            ("run", 10),
+            ("teardown", 0.25),
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(summary[name]["count"], 1)
+                self.assertAlmostEqual(summary[name]["mean"], expected)
+        self.assertEqual(summary["gap"]["count"], 0)
+
+        # A script that was terminated while running: the run ends
+        # with the process and there is no teardown.
+        metrics.clear()
+        metrics.add_script(
+            self.make_script_info(
+                timestamp_process_start=100,
+                timestamp_configure_start=101,
+                timestamp_configure_end=102,
+                timestamp_run_start=103,
+                timestamp_process_end=104,
+            )
+        )
+        summary = metrics.summary()
+        self.assertAlmostEqual(summary["run"]["mean"], 1)
+        self.assertEqual(summary["teardown"]["count"], 0)
+
+        # A script that was never loaded.
+        metrics.clear()
+        metrics.add_script(self.make_script_info())
+        for data in metrics.summary().values():
+            self.assertEqual(data["count"], 0)
+
+    def test_rollover(self):
+        metrics = scriptqueue.QueueMetrics()
+        metrics.add("gap", 0.1)
+        metrics.add("gap", 0.3)
+        with self.assertRaises(KeyError):
+            metrics.add("no_such_metric", 1)
+
+        summary = metrics.rollover()
+        self.assertEqual(summary["gap"]["count"], 2)
+        self.assertIn("gap: count=2", metrics.format_summary(summary))
+        self.assertNotIn("run", metrics.format_summary(summary))
+
+        metrics.add("gap", 0.2)
+        summary = metrics.rollover()
+        self.assertEqual(summary["gap"]["count"], 1)
+        self.assertEqual(metrics.summary()["gap"]["count"], 3)
+        self.assertEqual(metrics.format_summary(metrics.rollover()), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import unittest
+
+import asynctest
+
+from lsst.ts import scriptqueue
+from lsst.ts.scriptqueue import benchmarks
+
+
+class QueueBenchmarkTestCase(asynctest.TestCase):
+    async def test_run_queue_benchmark(self):
+        num_scripts = 20
+        results = await benchmarks.run_queue_benchmark(
+            num_scripts=num_scripts, num_ops=200
+        )
+        # The results can be saved as JSON.
+        json.dumps(results, allow_nan=False)
+        for name in benchmarks.SCENARIO_NAMES:
+            with self.subTest(name=name):
+                result = results[name]
+                self.assertGreater(result["num_ops"], 0)
+                self.assertGreater(result["ops_per_sec"], 0)
+                self.assertLessEqual(result["latency_p50"], result["latency_max"])
+        self.assertEqual(results["add"]["num_ops"], num_scripts)
+        self.assertEqual(results["move"]["num_ops"], 200)
+        self.assertEqual(results["reorder"]["num_ops"], 2)
+        self.assertEqual(results["history"]["history_length"], num_scripts)
+        self.assertIsNotNone(results["history"]["gap_p50"])
+
+    async def test_scenarios(self):
+        results = await benchmarks.run_queue_benchmark(
+            num_scripts=2, num_ops=1, scenarios=["reorder"]
+        )
+        self.assertEqual(set(results), {"num_scripts", "num_ops", "reorder"})
+
+        for kwargs in (
+            dict(num_scripts=1),
+            dict(num_ops=0),
+            dict(scenarios=["no_such_scenario"]),
+        ):
+            with self.subTest(kwargs=kwargs):
+                with self.assertRaises(ValueError):
+                    await benchmarks.run_queue_benchmark(**kwargs)
+
+    async def test_fake_script_schema(self):
+        """A QueueModel with a FakeScriptLauncher can get script schemas
+        and check configurations.
+        """
+        datadir = os.path.join(os.path.dirname(__file__), "data")
+        fake_scripts = benchmarks.FakeScripts()
+        model = scriptqueue.QueueModel(
+            domain=None,
+            log=logging.getLogger(),
+            standardpath=os.path.join(datadir, "standard"),
+            externalpath=os.path.join(datadir, "external"),
+            validate_configs=True,
+            transport=fake_scripts.transport,
+            launcher=benchmarks.FakeScriptLauncher(fake_scripts),
+        )
+        try:
+            fullpath = os.path.join(datadir, "standard", "script1")
+            schema = await model.schema_cache.get(fullpath)
+            self.assertEqual(schema, benchmarks.FAKE_SCRIPT_SCHEMA)
+            self.assertTrue(model.schema_cache.check_config(fullpath, "wait_time: 1"))
+            with self.assertRaises(ValueError):
+                model.schema_cache.check_config(fullpath, "no_such_field: 1")
+            with self.assertRaises(NotImplementedError):
+                await model.launcher.create_process(fullpath, "0")
+        finally:
+            await model.close()
+            fake_scripts.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,6 +26,7 @@ import os
 import time
 import unittest
 import warnings
+from unittest import mock
 
 import asynctest
 
@@ -279,7 +280,7 @@ class QueueModelTestCase(asynctest.TestCase):
         sal_index = self.model.next_sal_index
         return scriptqueue.ScriptInfo(
             log=self.log,
-            remote=self.model.remote,
+            transport=self.model.transport,
             index=sal_index,
             seq_num=sal_index * 2,  # arbitrary
             is_standard=is_standard,
@@ -494,6 +495,57 @@ class QueueModelTestCase(asynctest.TestCase):
         # Make sure that next_visit_canceled_callback was not called
         self.assertTrue(self.next_visit_canceled_queue.empty())
 
+    async def test_add_many(self):
+        """Test add_many."""
+        await self.assert_next_queue(enabled=True, running=True)
+
+        # Pause the queue so we know what to expect of queue state.
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+
+        add_kwargs = self.make_add_kwargs(location=Location.LAST)
+        i0 = add_kwargs["script_info"].index
+        await asyncio.wait_for(self.model.add(**add_kwargs), timeout=STD_TIMEOUT)
+        await self.assert_next_queue(sal_indices=[i0])
+
+        # Fail add_many due to an incorrect path; nothing is added.
+        script_infos = [self.make_script_info(), self.make_script_info()]
+        script_infos[1].path = "bogus_script_name"
+        with self.assertRaises(ValueError):
+            await self.model.add_many(
+                script_infos=script_infos,
+                location=Location.FIRST,
+                location_sal_index=0,
+            )
+        await self.assert_next_queue(sal_indices=[i0], wait=False)
+
+        # Fail add_many due to incorrect location_sal_index.
+        script_infos = [self.make_script_info(), self.make_script_info()]
+        with self.assertRaises(ValueError):
+            await self.model.add_many(
+                script_infos=script_infos,
+                location=Location.AFTER,
+                location_sal_index=4321,
+            )
+        await self.assert_next_queue(sal_indices=[i0], wait=False)
+
+        # Add three scripts before i0; there should be only one queue event.
+        script_infos = [self.make_script_info() for i in range(3)]
+        new_indices = [script_info.index for script_info in script_infos]
+        errors = await asyncio.wait_for(
+            self.model.add_many(
+                script_infos=script_infos,
+                location=Location.BEFORE,
+                location_sal_index=i0,
+                max_concurrent=2,
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        self.assertEqual(errors, [None] * 3)
+        await self.assert_next_queue(sal_indices=new_indices + [i0])
+        self.assertTrue(self.queue_info_queue.empty())
+        await self.wait_configured(*new_indices, i0)
+
     async def test_add_bad_config(self):
         """Test adding a script with invalid configuration.
         """
@@ -514,6 +566,220 @@ class QueueModelTestCase(asynctest.TestCase):
         self.assertEqual(script0.process_done, True)
         self.assertEqual(script0.process_state, ScriptProcessState.CONFIGUREFAILED)
 
+    async def test_validate_configs(self):
+        """Test rejecting a script with invalid configuration
+        without starting it.
+        """
+        await self.assert_next_queue(enabled=True, running=True)
+        self.model.validate_configs = True
+
+        # The schema is not cached, so the configuration cannot be checked
+        # but the schema is fetched in the background.
+        add_kwargs = self.make_add_kwargs(config="invalid: True")
+        script_info = add_kwargs["script_info"]
+        fullpath = self.model.make_full_path(
+            is_standard=script_info.is_standard, path=script_info.path
+        )
+        self.assertFalse(
+            self.model.check_config(script_info=script_info, fullpath=fullpath)
+        )
+        await asyncio.wait_for(
+            asyncio.gather(*self.model._schema_fetch_tasks), timeout=STD_TIMEOUT
+        )
+        self.assertIsNotNone(self.model.schema_cache.get_cached(fullpath))
+
+        # Now an invalid configuration is rejected by add and add_many,
+        # without adding or starting the script.
+        with self.assertRaises(ValueError):
+            await self.model.add(**add_kwargs)
+        self.assertIsNone(script_info.process)
+        script_infos = [self.make_script_info(), self.make_script_info()]
+        script_infos[1].config = "invalid: True"
+        with self.assertRaises(ValueError):
+            await self.model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            )
+        self.assertEqual(len(self.model.queue), 0)
+        self.assertTrue(self.queue_info_queue.empty())
+
+        # A valid configuration is checked, then the script is added.
+        add_kwargs = self.make_add_kwargs()
+        i0 = add_kwargs["script_info"].index
+        await asyncio.wait_for(self.model.add(**add_kwargs), timeout=STD_TIMEOUT)
+        await self.assert_next_queue(running=True, sal_indices=[i0])
+
+    async def test_lookahead(self):
+        """Test loading only the scripts in the lookahead window."""
+        await self.assert_next_queue(enabled=True, running=True)
+
+        # Pause the queue so we know what to expect of queue state.
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+        self.model.lookahead = 2
+
+        script_infos = [self.make_script_info() for i in range(4)]
+        sal_indices = [script_info.index for script_info in script_infos]
+        errors = await asyncio.wait_for(
+            self.model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        self.assertEqual(errors, [None] * 4)
+        await self.assert_next_queue(sal_indices=sal_indices)
+        for script_info in script_infos[:2]:
+            self.assertFalse(script_info.pending)
+            self.assertIsNotNone(script_info.process)
+        for script_info in script_infos[2:]:
+            self.assertTrue(script_info.pending)
+            self.assertIsNone(script_info.process)
+            self.assertEqual(script_info.process_state, ScriptProcessState.LOADING)
+            self.assertEqual(script_info.timestamp_process_start, 0)
+        await self.wait_configured(*sal_indices[:2])
+
+        # Move the last script to the front of the queue:
+        # it is loaded and the script that leaves the window is unloaded.
+        unloaded_process = script_infos[1].process
+        self.model.move(
+            sal_index=sal_indices[3], location=Location.FIRST, location_sal_index=0
+        )
+        await self.assert_next_queue(
+            sal_indices=[sal_indices[3]] + sal_indices[:3], wait=False
+        )
+        self.assertTrue(script_infos[1].pending)
+        self.assertFalse(script_infos[1].terminated)
+        self.assertEqual(script_infos[1].process_state, ScriptProcessState.LOADING)
+        await asyncio.wait_for(unloaded_process.wait(), timeout=STD_TIMEOUT)
+        self.assertFalse(script_infos[3].pending)
+        await self.wait_configured(sal_indices[3], sal_indices[0])
+
+        # Run the queue; each script is loaded as it enters the window.
+        self.model.running = True
+        t0 = time.monotonic()
+        while len(self.model.history) < 4:
+            self.assertLess(time.monotonic() - t0, STD_TIMEOUT)
+            await asyncio.sleep(0.1)
+        self.assertEqual(
+            self.model.history_indices, [sal_indices[i] for i in (2, 1, 0, 3)],
+        )
+        for script_info in script_infos:
+            self.assertEqual(script_info.process_state, ScriptProcessState.DONE)
+
+    async def test_handoff_times(self):
+        """Test that the time between scripts is measured."""
+        await self.assert_next_queue(enabled=True, running=True)
+
+        # Pause the queue so we know what to expect of queue state.
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+
+        script_infos = [self.make_script_info() for i in range(3)]
+        sal_indices = [script_info.index for script_info in script_infos]
+        await asyncio.wait_for(
+            self.model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        await self.wait_configured(*sal_indices)
+        self.assertEqual(len(self.model.handoff_times), 0)
+
+        self.model.running = True
+        t0 = time.monotonic()
+        while len(self.model.history) < 3:
+            self.assertLess(time.monotonic() - t0, STD_TIMEOUT)
+            await asyncio.sleep(0.1)
+        # The group ID of the next script is set while the current script
+        # runs, so each handoff should be recorded, and fast.
+        self.assertGreater(len(self.model.handoff_times), 0)
+        for handoff_time in self.model.handoff_times:
+            self.assertGreaterEqual(handoff_time, 0)
+            self.assertLess(handoff_time, 1)
+
+    async def test_metrics(self):
+        """Test histograms of script lifecycle durations."""
+        await self.assert_next_queue(enabled=True, running=True)
+
+        # Pause the queue so we know what to expect of queue state.
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+
+        script_infos = [self.make_script_info() for i in range(3)]
+        sal_indices = [script_info.index for script_info in script_infos]
+        await asyncio.wait_for(
+            self.model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        await self.wait_configured(*sal_indices)
+        for name in scriptqueue.METRIC_NAMES:
+            self.assertEqual(self.model.metrics.histograms[name].count, 0)
+
+        self.model.running = True
+        t0 = time.monotonic()
+        while len(self.model.history) < 3:
+            self.assertLess(time.monotonic() - t0, STD_TIMEOUT)
+            await asyncio.sleep(0.1)
+        histograms = self.model.metrics.histograms
+        for name in ("load", "configure", "run", "teardown"):
+            self.assertEqual(histograms[name].count, 3)
+            self.assertGreaterEqual(histograms[name].min, 0)
+        self.assertEqual(histograms["gap"].count, len(self.model.handoff_times))
+        self.assertGreaterEqual(histograms["gap"].count, 1)
+
+        summary = self.model.log_metrics()
+        self.assertEqual(summary["run"]["count"], 3)
+        summary = self.model.log_metrics()
+        self.assertEqual(summary["run"]["count"], 0)
+        self.assertEqual(self.model.metrics.summary()["run"]["count"], 3)
+
+    async def test_memory_budget(self):
+        """Test unloading and reloading scripts to fit a memory budget."""
+        await self.assert_next_queue(enabled=True, running=True)
+
+        # Pause the queue so we know what to expect of queue state.
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+
+        script_infos = [self.make_script_info() for i in range(4)]
+        sal_indices = [script_info.index for script_info in script_infos]
+        await asyncio.wait_for(
+            self.model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        await self.wait_configured(*sal_indices)
+
+        total_rss = self.model.sample_resources()
+        self.assertGreater(total_rss, 0)
+        self.assertEqual(total_rss, self.model.total_rss)
+        for script_info in script_infos:
+            self.assertGreater(script_info.resources.rss, 0)
+
+        # Set a budget that only fits about half the scripts;
+        # scripts at the back of the queue are unloaded.
+        self.model.memory_budget = total_rss // 2
+        self.model.sample_resources()
+        self.assertFalse(script_infos[0].pending)
+        self.assertTrue(script_infos[3].pending)
+        self.assertEqual(self.model.queue_indices, sal_indices)
+        # A new script is pending.
+        add_kwargs = self.make_add_kwargs()
+        await asyncio.wait_for(self.model.add(**add_kwargs), timeout=STD_TIMEOUT)
+        self.assertTrue(add_kwargs["script_info"].pending)
+
+        # Raise the budget; the pending scripts are loaded again,
+        # one per sample.
+        self.model.memory_budget = total_rss * 10
+        t0 = time.monotonic()
+        while any(script_info.pending for script_info in self.model.queue):
+            self.assertLess(time.monotonic() - t0, STD_TIMEOUT)
+            self.model.sample_resources()
+            await asyncio.sleep(0.1)
+        self.assertIsNone(self.model._memory_window)
+
     async def check_add_then_stop_script(self, terminate):
         """Test adding a script immediately followed by stoppping it.
         """
@@ -646,9 +912,33 @@ class QueueModelTestCase(asynctest.TestCase):
             past_sal_indices=[i0 + 2, i0 + 1, i0],
         )
 
+    def test_get_script_info_history_eviction(self):
+        """Test that scripts dropped from the in-memory history
+        cannot be found if there is no history database.
+        """
+        nextra = 5
+        info_list = [
+            self.make_script_info()
+            for i in range(scriptqueue.queue_model.MAX_HISTORY + nextra)
+        ]
+        for script_info in info_list:
+            self.model._append_history(script_info)
+        self.assertEqual(len(self.model.history), scriptqueue.queue_model.MAX_HISTORY)
+        self.assertEqual(len(self.model._script_index), 0)
+        for script_info in info_list[0:nextra]:
+            with self.assertRaises(ValueError):
+                self.model.get_script_info(script_info.index, search_history=True)
+        for script_info in info_list[nextra:]:
+            with self.assertRaises(ValueError):
+                self.model.get_script_info(script_info.index, search_history=False)
+            record = self.model.get_script_info(script_info.index, search_history=True)
+            self.assertIsInstance(record, scriptqueue.ScriptHistoryRecord)
+            self.assert_script_info_equal(record, script_info)
+
     def test_make_full_path(self):
         for is_standard, badpath in (
             (True, "../script5"),  # file is in external, not standard
+            (True, "../external/script5"),  # file is in external, not standard
             (True, "subdir/nonex2"),  # file is not executable
             (True, "doesnotexist"),  # file does not exist
             (False, "subdir/_private"),  # file is private
@@ -937,9 +1227,62 @@ class QueueModelTestCase(asynctest.TestCase):
         # and that the final script state Done is sent and recorded.
         script_info = self.model.get_script_info(i0 + 2, search_history=True)
         self.assertTrue(script_info.process_done)
-        self.assertEqual(script_info.process.returncode, 0)
+        self.assertEqual(script_info.returncode, 0)
         self.assertEqual(script_info.script_state, ScriptState.DONE)
 
+    async def test_reorder(self):
+        await self.assert_next_queue(enabled=True, running=True)
+
+        # Pause the queue so we know what to expect of queue state.
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+
+        script_infos = [
+            self.make_script_info(
+                is_standard=True, path=os.path.join("subdir", "script3")
+            )
+            for i in range(4)
+        ]
+        await asyncio.wait_for(
+            self.model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        i0 = script_infos[0].index
+        await self.assert_next_queue(sal_indices=[i0, i0 + 1, i0 + 2, i0 + 3])
+
+        # Complete reorder.
+        self.model.reorder([i0 + 3, i0 + 1, i0, i0 + 2])
+        await self.assert_next_queue(sal_indices=[i0 + 3, i0 + 1, i0, i0 + 2])
+
+        # Partial reorder: the remaining scripts keep their order.
+        self.model.reorder([i0 + 2, i0])
+        await self.assert_next_queue(sal_indices=[i0 + 2, i0, i0 + 3, i0 + 1])
+
+        # Invalid reorders leave the queue unchanged.
+        for bad_sal_indices in (
+            [],
+            [i0, i0],
+            [i0, 4321],
+        ):
+            with self.subTest(bad_sal_indices=bad_sal_indices):
+                with self.assertRaises(ValueError):
+                    self.model.reorder(bad_sal_indices)
+                await self.assert_next_queue(
+                    sal_indices=[i0 + 2, i0, i0 + 3, i0 + 1], wait=False
+                )
+
+        # Run the queue, after reordering it again.
+        await self.wait_configured(i0, i0 + 1, i0 + 2, i0 + 3)
+        self.model.reorder([i0 + 1, i0, i0 + 2, i0 + 3])
+        await self.assert_next_queue(sal_indices=[i0 + 1, i0, i0 + 2, i0 + 3])
+        self.model.running = True
+        await self.assert_next_next_visit(sal_index=i0 + 1)
+        await self.assert_next_queue(
+            running=True, current_sal_index=i0 + 1, sal_indices=[i0, i0 + 2, i0 + 3]
+        )
+
     async def test_requeue(self):
         """Test requeue
         """
@@ -1197,10 +1540,21 @@ class QueueModelTestCase(asynctest.TestCase):
         # The current script is added to the history,
         # but the queued script is not.
         print(f"stop {i0+1} and {i0+3}")
-        await asyncio.wait_for(
+        outcomes = await asyncio.wait_for(
             self.model.stop_scripts(sal_indices=[i0 + 1, i0 + 3], terminate=terminate),
             timeout=STD_TIMEOUT,
         )
+        # The queued script is always terminated.
+        expected_outcome1 = (
+            scriptqueue.StopOutcome.TERMINATED
+            if terminate
+            else scriptqueue.StopOutcome.STOPPED
+        )
+        self.assertEqual(
+            outcomes,
+            {i0 + 1: expected_outcome1, i0 + 3: scriptqueue.StopOutcome.TERMINATED},
+        )
+        self.assertEqual(self.model._scripts_being_stopped, set())
         # After a queue callback or two, i0 + 2 should be the current script,
         # and the queue should be empty.
         while True:
@@ -1275,11 +1629,125 @@ class QueueModelTestCase(asynctest.TestCase):
             past_sal_indices={i0 + 2, i0 + 3, i0 + 1, i0},
         )
 
-        # try to stop a script that doesn't exist
-        await asyncio.wait_for(
+        # try to stop a script that doesn't exist, or is done
+        outcomes = await asyncio.wait_for(
             self.model.stop_scripts(sal_indices=[333], terminate=terminate),
             timeout=STD_TIMEOUT,
         )
+        self.assertEqual(outcomes, {333: scriptqueue.StopOutcome.NOT_FOUND})
+
+    async def test_stop_scripts_concurrent(self):
+        await self.assert_next_queue(enabled=True, running=True)
+
+        # Pause the queue so we know what to expect of queue state.
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+
+        script_infos = [
+            self.make_script_info(
+                is_standard=False,
+                path=os.path.join("subdir", "script6"),
+                config="wait_time: 10",
+            )
+            for i in range(5)
+        ]
+        await asyncio.wait_for(
+            self.model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        i0 = script_infos[0].index
+        await self.assert_next_queue(sal_indices=[i0, i0 + 1, i0 + 2, i0 + 3, i0 + 4])
+        await self.wait_configured(i0, i0 + 1, i0 + 2, i0 + 3, i0 + 4)
+
+        with self.assertRaises(ValueError):
+            await self.model.stop_scripts(
+                sal_indices=[i0], terminate=True, max_concurrent=0
+            )
+
+        # Overlapping calls to stop_scripts must not interfere
+        # with each other.
+        outcomes_list = await asyncio.wait_for(
+            asyncio.gather(
+                self.model.stop_scripts(
+                    sal_indices=[i0, i0 + 1, 333], terminate=False, max_concurrent=1
+                ),
+                self.model.stop_scripts(sal_indices=[i0 + 2, i0 + 3], terminate=True),
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        self.assertEqual(
+            outcomes_list,
+            [
+                {
+                    i0: scriptqueue.StopOutcome.TERMINATED,
+                    i0 + 1: scriptqueue.StopOutcome.TERMINATED,
+                    333: scriptqueue.StopOutcome.NOT_FOUND,
+                },
+                {
+                    i0 + 2: scriptqueue.StopOutcome.TERMINATED,
+                    i0 + 3: scriptqueue.StopOutcome.TERMINATED,
+                },
+            ],
+        )
+        self.assertEqual(self.model._scripts_being_stopped, set())
+        for script_info in script_infos[0:4]:
+            self.assertTrue(script_info.process_done)
+            self.assertTrue(script_info.terminated)
+        self.assertEqual(self.model.queue_indices, [i0 + 4])
+
+        outcomes = await asyncio.wait_for(
+            self.model.stop_scripts(sal_indices=[i0, i0 + 4], terminate=True),
+            timeout=STD_TIMEOUT,
+        )
+        self.assertEqual(
+            outcomes,
+            {
+                i0: scriptqueue.StopOutcome.NOT_FOUND,
+                i0 + 4: scriptqueue.StopOutcome.TERMINATED,
+            },
+        )
+        self.assertEqual(self.model.queue_indices, [])
+
+    async def test_stop_scripts_finished_first(self):
+        """A script that finishes just before it is terminated
+        is reported as already done."""
+        await self.assert_next_queue(enabled=True, running=True)
+        self.model.running = False
+        await self.assert_next_queue(running=False)
+
+        script_info = self.make_script_info(
+            is_standard=False,
+            path=os.path.join("subdir", "script6"),
+            config="wait_time: 10",
+        )
+        await asyncio.wait_for(
+            self.model.add(
+                script_info=script_info, location=Location.LAST, location_sal_index=0
+            ),
+            timeout=STD_TIMEOUT,
+        )
+        await self.wait_configured(script_info.index)
+
+        def finish_then_start_terminate(script_info):
+            # Simulate the script finishing on its own
+            # just before _start_terminate is called.
+            script_info.process.kill()
+            return False
+
+        with mock.patch.object(
+            self.model, "_start_terminate", side_effect=finish_then_start_terminate
+        ):
+            outcomes = await asyncio.wait_for(
+                self.model.stop_scripts(
+                    sal_indices=[script_info.index], terminate=True
+                ),
+                timeout=STD_TIMEOUT,
+            )
+        self.assertEqual(
+            outcomes, {script_info.index: scriptqueue.StopOutcome.ALREADY_DONE}
+        )
 
     async def test_stop_scripts_noterminate(self):
         await self.check_stop_scripts(terminate=False)
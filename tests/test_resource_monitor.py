@@ -0,0 +1,73 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from lsst.ts import scriptqueue
+
+
+@unittest.skipIf(not os.path.isdir("/proc/self"), "/proc is not available")
+class ResourceMonitorTestCase(unittest.TestCase):
+    def test_read_process_resources(self):
+        resources = scriptqueue.read_process_resources(os.getpid())
+        self.assertIsInstance(resources, scriptqueue.ProcessResources)
+        self.assertEqual(resources.pid, os.getpid())
+        self.assertGreater(resources.rss, 0)
+        self.assertGreater(resources.cpu_time, 0)
+        self.assertGreaterEqual(resources.num_fds, 3)
+        self.assertEqual(resources.cpu_percent, 0)
+        self.assertAlmostEqual(resources.timestamp, time.time(), delta=10)
+
+        # Use some CPU time, then sample again.
+        t0 = time.process_time()
+        while time.process_time() - t0 < 0.2:
+            pass
+        resources2 = scriptqueue.read_process_resources(os.getpid(), previous=resources)
+        self.assertGreater(resources2.cpu_time, resources.cpu_time)
+        self.assertGreater(resources2.cpu_percent, 0)
+
+        # A previous sample of a different process is ignored.
+        resources3 = scriptqueue.read_process_resources(
+            os.getpid(), previous=resources._replace(pid=resources.pid + 1)
+        )
+        self.assertEqual(resources3.cpu_percent, 0)
+
+    def test_child_process(self):
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)"]
+        )
+        try:
+            resources = scriptqueue.read_process_resources(process.pid)
+            self.assertEqual(resources.pid, process.pid)
+            self.assertGreater(resources.rss, 0)
+        finally:
+            process.kill()
+            process.wait()
+        # The process no longer exists.
+        self.assertIsNone(scriptqueue.read_process_resources(process.pid))
+
+
+if __name__ == "__main__":
+    unittest.main()
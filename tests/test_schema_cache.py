@@ -0,0 +1,262 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import os
+import pathlib
+import stat
+import tempfile
+import unittest
+
+import asynctest
+
+from lsst.ts import scriptqueue
+
+# Long enough to run a few scripts (seconds).
+STD_TIMEOUT = 60
+
+# A script that outputs a schema and appends its niceness to the file
+# named by environment variable ``SCHEMA_TEST_RUNS``, so runs can be counted.
+SCHEMA_SCRIPT = """#!/bin/sh
+nice >> "$SCHEMA_TEST_RUNS"
+sleep 0.2
+echo "{schema}"
+exit {returncode}
+"""
+
+
+class SchemaCacheTestCase(asynctest.TestCase):
+    def setUp(self):
+        self.log = logging.getLogger()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dirpath = pathlib.Path(self.tempdir.name)
+        self.runs_path = self.dirpath / "runs.txt"
+        os.environ["SCHEMA_TEST_RUNS"] = str(self.runs_path)
+        self.script_path = self.dirpath / "script"
+        self.write_script(schema="schema1")
+
+    def tearDown(self):
+        del os.environ["SCHEMA_TEST_RUNS"]
+        self.tempdir.cleanup()
+
+    @property
+    def niceness_list(self):
+        """The niceness of each script run."""
+        if not self.runs_path.exists():
+            return []
+        return [int(value) for value in self.runs_path.read_text().split()]
+
+    @property
+    def num_runs(self):
+        """The number of times a script has been run."""
+        return len(self.niceness_list)
+
+    def write_script(self, schema, returncode=0, path=None):
+        if path is None:
+            path = self.script_path
+        path.write_text(SCHEMA_SCRIPT.format(schema=schema, returncode=returncode))
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+
+    async def test_get(self):
+        cache = scriptqueue.SchemaCache(log=self.log)
+        self.assertEqual(len(cache), 0)
+
+        # Concurrent requests share one script process.
+        schemas = await asyncio.wait_for(
+            asyncio.gather(*[cache.get(self.script_path) for i in range(10)]),
+            timeout=STD_TIMEOUT,
+        )
+        self.assertEqual(schemas, ["schema1\n"] * 10)
+        self.assertEqual(self.num_runs, 1)
+        self.assertEqual(len(cache), 1)
+
+        # Later requests use the cache.
+        schema = await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertEqual(schema, "schema1\n")
+        self.assertEqual(self.num_runs, 1)
+        self.assertEqual(cache.num_hits, 1)
+
+        # Changing the script invalidates the cache.
+        self.write_script(schema="schema22")
+        schema = await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertEqual(schema, "schema22\n")
+        self.assertEqual(self.num_runs, 2)
+
+        # Output of a script that fails is not cached.
+        self.write_script(schema="bad", returncode=1)
+        for i in range(2):
+            schema = await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+            self.assertEqual(schema, "bad\n")
+        self.assertEqual(self.num_runs, 4)
+
+        with self.assertRaises(FileNotFoundError):
+            await cache.get(self.dirpath / "no_such_script")
+
+    async def test_check_config(self):
+        cache = scriptqueue.SchemaCache(log=self.log)
+        schema = (
+            "{type: object, properties: {wait_time: {type: number}}, "
+            "additionalProperties: false}"
+        )
+        self.write_script(schema=schema)
+        self.assertIsNone(cache.get_cached(self.script_path))
+
+        # The configuration cannot be checked if the schema is not cached.
+        self.assertFalse(cache.check_config(self.script_path, "wait_time: 1"))
+        self.assertEqual(self.num_runs, 0)
+
+        await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertEqual(cache.get_cached(self.script_path), schema + "\n")
+        for good_config in ("", "  ", "wait_time: 1", "{wait_time: 0.5}"):
+            with self.subTest(good_config=good_config):
+                self.assertTrue(cache.check_config(self.script_path, good_config))
+        for bad_config in ("wait_time: foo", "no_such_field: 1", "[1, 2]", "{"):
+            with self.subTest(bad_config=bad_config):
+                with self.assertRaises(ValueError):
+                    cache.check_config(self.script_path, bad_config)
+        # The validator is compiled once per schema.
+        self.assertEqual(len(cache._validators), 1)
+        self.assertEqual(self.num_runs, 1)
+
+        # A script with no schema cannot be checked.
+        self.write_script(schema="")
+        self.assertIsNone(cache.get_cached(self.script_path))
+        await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertFalse(cache.check_config(self.script_path, "no_such_field: 1"))
+        self.assertEqual(len(cache._validators), 1)
+
+    async def test_prefetch(self):
+        cache = scriptqueue.SchemaCache(log=self.log)
+        self.assertIsNone(cache.prefetch_progress)
+        paths = [self.script_path]
+        for i in range(4):
+            path = self.dirpath / f"script{i}"
+            self.write_script(
+                schema=f"schema{i}", returncode=1 if i == 3 else 0, path=path
+            )
+            paths.append(path)
+        paths.append(self.dirpath / "no_such_script")
+
+        with self.assertRaises(ValueError):
+            await cache.prefetch(paths, max_concurrent=0)
+
+        # Get one schema first, so it is already cached.
+        await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        initial_niceness = self.niceness_list[0]
+
+        progress = await asyncio.wait_for(
+            cache.prefetch(paths, max_concurrent=2, niceness=5), timeout=STD_TIMEOUT
+        )
+        self.assertIs(progress, cache.prefetch_progress)
+        self.assertTrue(progress.done)
+        self.assertEqual(progress.num_scripts, 6)
+        self.assertEqual(progress.num_done, 6)
+        # The missing script fails; the script that exits with
+        # a non-zero return code is counted as prefetched, but not cached.
+        self.assertEqual(progress.num_failed, 1)
+        self.assertGreater(progress.duration, 0)
+        self.assertEqual(len(cache), 4)
+        self.assertEqual(self.niceness_list[1:], [initial_niceness + 5] * 4)
+
+        for i in range(3):
+            schema = await asyncio.wait_for(cache.get(paths[i + 1]), STD_TIMEOUT)
+            self.assertEqual(schema, f"schema{i}\n")
+        self.assertEqual(self.num_runs, 5)
+
+    async def test_timeout(self):
+        cache = scriptqueue.SchemaCache(log=self.log, timeout=0.01)
+        with self.assertLogs(self.log, level=logging.WARNING) as cm:
+            with self.assertRaises(asyncio.TimeoutError):
+                await cache.get(self.script_path)
+        self.assertIn(
+            f"Killed {self.script_path} --schema after timeout or cancellation",
+            cm.output[0],
+        )
+        self.assertEqual(len(cache), 0)
+
+    async def test_persistence(self):
+        cache_path = self.dirpath / "cache.json"
+        cache = scriptqueue.SchemaCache(log=self.log, path=cache_path)
+        schema = await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertEqual(schema, "schema1\n")
+        # The cache file is saved after a delay, or when closed.
+        self.assertFalse(cache_path.exists())
+        await cache.close()
+        self.assertTrue(cache_path.exists())
+
+        # A new cache reads the cache file.
+        cache = scriptqueue.SchemaCache(log=self.log, path=cache_path)
+        self.assertEqual(len(cache), 1)
+        schema = await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertEqual(schema, "schema1\n")
+        self.assertEqual(self.num_runs, 1)
+
+        # An unreadable cache file is ignored.
+        cache_path.write_text("not json")
+        cache = scriptqueue.SchemaCache(log=self.log, path=cache_path)
+        self.assertEqual(len(cache), 0)
+        schema = await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertEqual(schema, "schema1\n")
+        self.assertEqual(self.num_runs, 2)
+        await cache.close()
+
+    async def test_save_delay(self):
+        cache_path = self.dirpath / "cache.json"
+        cache = scriptqueue.SchemaCache(log=self.log, path=cache_path, save_delay=0.1)
+        await asyncio.wait_for(cache.get(self.script_path), STD_TIMEOUT)
+        self.assertFalse(cache_path.exists())
+        for i in range(int(STD_TIMEOUT / 0.05)):
+            if cache_path.exists():
+                break
+            await asyncio.sleep(0.05)
+        reader = scriptqueue.SchemaCache(log=self.log, path=cache_path)
+        self.assertEqual(len(reader), 1)
+
+    async def test_save_after_prefetch(self):
+        """Prefetch saves the cache file once, at the end."""
+        cache_path = self.dirpath / "cache.json"
+        cache = scriptqueue.SchemaCache(log=self.log, path=cache_path, save_delay=0)
+        paths = []
+        for i in range(3):
+            path = self.dirpath / f"script{i}"
+            self.write_script(schema=f"schema{i}", path=path)
+            paths.append(path)
+        write_sizes = []
+        write = cache._write
+
+        def counting_write(data):
+            write_sizes.append(len(data))
+            return write(data)
+
+        cache._write = counting_write
+        await asyncio.wait_for(cache.prefetch(paths), timeout=STD_TIMEOUT)
+        self.assertEqual(write_sizes, [3])
+        reader = scriptqueue.SchemaCache(log=self.log, path=cache_path)
+        self.assertEqual(len(reader), 3)
+
+        # Saving again does nothing if the cache has not changed.
+        await cache.close()
+        self.assertEqual(write_sizes, [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import copy
+import pathlib
+import tempfile
+import unittest
+
+from lsst.ts import scriptqueue
+
+
+def make_record(index, **kwargs):
+    """Make a ScriptHistoryRecord with arbitrary values."""
+    field_values = dict(
+        index=index,
+        seq_num=index * 2,
+        is_standard=False,
+        path="subdir/script6",
+        config="wait_time: 1",
+        descr=f"script {index}",
+        log_level=0,
+        pause_checkpoint="",
+        stop_checkpoint="",
+        group_id="",
+        script_state=8,
+        process_state=4,
+        returncode=0,
+        timestamp_process_start=1.0,
+        timestamp_configure_start=2.0,
+        timestamp_configure_end=3.0,
+        timestamp_run_start=4.0,
+        timestamp_process_end=5.0,
+    )
+    field_values.update(kwargs)
+    return scriptqueue.ScriptHistoryRecord(**field_values)
+
+
+class ScriptHistoryTestCase(unittest.TestCase):
+    def test_basics(self):
+        maxlen = 3
+        history = scriptqueue.ScriptHistory(maxlen=maxlen)
+        self.assertEqual(history.maxlen, maxlen)
+        self.assertEqual(len(history), 0)
+        self.assertFalse(history)
+
+        version = history.version
+        for i in range(maxlen):
+            evicted = history.appendleft(make_record(i))
+            self.assertIsNone(evicted)
+            self.assertGreater(history.version, version)
+            version = history.version
+        self.assertEqual([item.index for item in history], [2, 1, 0])
+        self.assertEqual(history[0].index, 2)
+
+        history_copy = copy.copy(history)
+
+        evicted = history.appendleft(make_record(maxlen))
+        self.assertEqual(evicted.index, 0)
+        self.assertGreater(history.version, version)
+        self.assertEqual([item.index for item in history], [3, 2, 1])
+        self.assertEqual([item.index for item in history_copy], [2, 1, 0])
+
+    def test_record(self):
+        record = make_record(index=5)
+        self.assertTrue(record.process_done)
+        self.assertFalse(hasattr(record, "__dict__"))
+        with self.assertRaises(AttributeError):
+            record.path = "other"
+        with self.assertRaises(AttributeError):
+            record.new_attribute = 1
+        with self.assertRaises(AttributeError):
+            del record.path
+        record_copy = scriptqueue.ScriptHistoryRecord(**record.as_dict())
+        self.assertEqual(record_copy.as_dict(), record.as_dict())
+        self.assertFalse(make_record(index=5, returncode=None).process_done)
+        with self.assertRaises(TypeError):
+            scriptqueue.ScriptHistoryRecord(index=5)
+
+        # Records are hashable, and equal if the SAL index is the same.
+        self.assertEqual(hash(record), hash(make_record(index=5, descr="other")))
+        self.assertEqual(len({record, make_record(index=5), make_record(index=6)}), 2)
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = pathlib.Path(tempdir) / "history.sqlite"
+            max_records = 10
+            store = scriptqueue.ScriptHistoryStore(path=path, max_records=max_records)
+            self.assertIsNone(store.get(1))
+            for index in range(1, 31):
+                store.append(make_record(index=index))
+            store.prune()
+            self.assertEqual(len(store), max_records)
+            self.assertIsNone(store.get(1))
+            record = store.get(30)
+            self.assertEqual(record.as_dict(), make_record(index=30).as_dict())
+
+            # The most recent record for a SAL index wins.
+            store.append(make_record(index=30, descr="newer"))
+            self.assertEqual(store.get(30).descr, "newer")
+            store.close()
+
+            # Records persist.
+            store = scriptqueue.ScriptHistoryStore(path=path, max_records=max_records)
+            self.assertEqual(store.get(30).descr, "newer")
+            store.close()
+
+            with self.assertRaises(ValueError):
+                scriptqueue.ScriptHistoryStore(path=path, max_records=0)
+            with self.assertRaises(ValueError):
+                scriptqueue.ScriptHistoryStore(path=path, commit_batch_size=0)
+            with self.assertRaises(ValueError):
+                scriptqueue.ScriptHistoryStore(path=path, commit_interval=0)
+
+    def test_store_batched_commits(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = pathlib.Path(tempdir) / "history.sqlite"
+            store = scriptqueue.ScriptHistoryStore(path=path, commit_batch_size=3)
+            reader = scriptqueue.ScriptHistoryStore(path=path)
+            for index in (1, 2):
+                store.append(make_record(index=index))
+            # Records waiting to be committed are visible to the store
+            # but not to other connections.
+            self.assertEqual(store.get(2).index, 2)
+            self.assertEqual(len(reader), 0)
+            store.append(make_record(index=3))
+            self.assertEqual(len(reader), 3)
+            store.append(make_record(index=4))
+            self.assertEqual(len(reader), 3)
+            store.flush()
+            self.assertEqual(len(reader), 4)
+            store.append(make_record(index=5))
+            store.close()
+            self.assertEqual(len(reader), 5)
+            reader.close()
+
+    def test_store_commit_interval(self):
+        async def doit(store, reader):
+            store.append(make_record(index=1))
+            self.assertEqual(len(reader), 0)
+            await asyncio.sleep(0.2)
+            self.assertEqual(len(reader), 1)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = pathlib.Path(tempdir) / "history.sqlite"
+            store = scriptqueue.ScriptHistoryStore(path=path, commit_interval=0.05)
+            reader = scriptqueue.ScriptHistoryStore(path=path)
+            asyncio.run(doit(store, reader))
+            store.close()
+            reader.close()
+
+    def test_history_with_store(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = pathlib.Path(tempdir) / "history.sqlite"
+            store = scriptqueue.ScriptHistoryStore(path=path)
+            maxlen = 3
+            history = scriptqueue.ScriptHistory(maxlen=maxlen, store=store)
+            for index in range(1, 11):
+                history.appendleft(make_record(index=index))
+            self.assertEqual([item.index for item in history], [10, 9, 8])
+            self.assertEqual(len(store), 7)
+            for index in range(1, 11):
+                record = history.get(index)
+                self.assertEqual(record.as_dict(), make_record(index=index).as_dict())
+            self.assertIsNone(history.get(11))
+            store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
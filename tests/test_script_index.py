@@ -0,0 +1,143 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from lsst.ts import scriptqueue
+
+
+class ScriptIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.log = logging.getLogger()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tempdir.name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def make_file(self, relpath, executable=True):
+        path = self.root / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("#!/bin/sh\n")
+        path.chmod(0o755 if executable else 0o644)
+
+    def assert_index_correct(self, index, expected_changed):
+        changed = index.refresh()
+        self.assertEqual(changed, expected_changed)
+        expected_scripts = sorted(scriptqueue.find_public_scripts(self.root))
+        self.assertEqual(list(index.scripts), expected_scripts)
+        self.assertEqual(index.joined, ":".join(expected_scripts))
+        self.assertEqual(len(index), len(expected_scripts))
+
+    def test_data_dir(self):
+        for use_inotify in (False, True):
+            with self.subTest(use_inotify=use_inotify):
+                for category in ("standard", "external"):
+                    root = os.path.join(os.path.dirname(__file__), "data", category)
+                    index = scriptqueue.ScriptIndex(
+                        root=root, log=self.log, use_inotify=use_inotify
+                    )
+                    try:
+                        self.assertEqual(
+                            set(index.scripts),
+                            set(scriptqueue.find_public_scripts(root)),
+                        )
+                        self.assertFalse(index.refresh())
+                    finally:
+                        index.close()
+
+    def check_changes(self, use_inotify):
+        self.make_file("script1")
+        self.make_file("_private")
+        self.make_file("nonexe", executable=False)
+        self.make_file("subdir/script2")
+        self.make_file(".hidden/script3")
+        index = scriptqueue.ScriptIndex(
+            root=self.root,
+            log=self.log,
+            use_inotify=use_inotify,
+            mtime_check_interval=0,
+        )
+        try:
+            if not use_inotify:
+                self.assertFalse(index.uses_inotify)
+            self.assertEqual(index.scripts, ("script1", "subdir/script2"))
+            self.assert_index_correct(index, expected_changed=False)
+
+            version = index.version
+            self.make_file("subdir/script4")
+            self.assert_index_correct(index, expected_changed=True)
+            self.assertGreater(index.version, version)
+
+            # Add a new directory tree.
+            self.make_file("newdir/a/b/script5")
+            self.make_file("newdir/a/script6")
+            self.assert_index_correct(index, expected_changed=True)
+
+            # Add a script to the new tree.
+            self.make_file("newdir/a/b/script7")
+            self.assert_index_correct(index, expected_changed=True)
+
+            # Remove a file and a directory tree.
+            (self.root / "script1").unlink()
+            shutil.rmtree(self.root / "newdir")
+            self.assert_index_correct(index, expected_changed=True)
+
+            # Rename a directory.
+            (self.root / "subdir").rename(self.root / "renamed")
+            self.assert_index_correct(index, expected_changed=True)
+
+            # Add a symlink to a directory (which is not followed)
+            # and to a script (which is).
+            os.symlink(self.root / "renamed", self.root / "dirlink")
+            os.symlink(self.root / "renamed" / "script2", self.root / "filelink")
+            self.assert_index_correct(index, expected_changed=True)
+
+            # Private and non-executable files are ignored.
+            self.make_file("renamed/_private2")
+            self.make_file("renamed/nonexe2", executable=False)
+            self.assert_index_correct(index, expected_changed=False)
+
+            # Changing permissions is noticed immediately with inotify,
+            # else after rescan.
+            (self.root / "renamed" / "nonexe2").chmod(0o755)
+            if index.uses_inotify:
+                self.assert_index_correct(index, expected_changed=True)
+            else:
+                self.assertTrue(index.rescan())
+                self.assert_index_correct(index, expected_changed=False)
+        finally:
+            index.close()
+
+    def test_changes_mtime(self):
+        self.check_changes(use_inotify=False)
+
+    def test_changes_inotify(self):
+        self.check_changes(use_inotify=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
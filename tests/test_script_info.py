@@ -0,0 +1,163 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import pathlib
+import tempfile
+import time
+import types
+import unittest
+
+import asynctest
+
+from lsst.ts import scriptqueue
+from lsst.ts.idl.enums.Script import ScriptState
+
+
+class ScriptInfoTestCase(asynctest.TestCase):
+    def make_script_info(self, log, index):
+        return scriptqueue.ScriptInfo(
+            log=log,
+            transport=None,
+            index=index,
+            seq_num=index,
+            is_standard=False,
+            path="script1",
+            config="",
+            descr=f"{index}",
+        )
+
+    async def test_logger_not_leaked(self):
+        """Creating many scripts must not create many loggers."""
+        log = logging.getLogger("test_logger_not_leaked")
+        initial_nloggers = len(logging.Logger.manager.loggerDict)
+        for index in range(1, 5001):
+            script_info = self.make_script_info(log=log, index=index)
+            script_info.log.debug("created")
+        # The shared "ScriptInfo" child logger may be new.
+        self.assertLessEqual(
+            len(logging.Logger.manager.loggerDict), initial_nloggers + 1
+        )
+
+    async def test_log_messages(self):
+        log = logging.getLogger("test_log_messages")
+        script_info = self.make_script_info(log=log, index=47)
+        with self.assertLogs(log, level=logging.INFO) as cm:
+            script_info.log.info("a message")
+        self.assertEqual(len(cm.records), 1)
+        record = cm.records[0]
+        self.assertEqual(record.name, "test_log_messages.ScriptInfo")
+        self.assertEqual(record.getMessage(), "ScriptInfo(index=47): a message")
+        self.assertEqual(record.script_index, 47)
+
+        # Extra data specified by the caller is kept,
+        # but cannot override the SAL index.
+        with self.assertLogs(log, level=logging.INFO) as cm:
+            script_info.log.info(
+                "another message", extra=dict(script_index=5, detail="x")
+            )
+        record = cm.records[0]
+        self.assertEqual(record.script_index, 47)
+        self.assertEqual(record.detail, "x")
+
+    async def test_unload(self):
+        log = logging.getLogger("test_unload")
+        script_info = self.make_script_info(log=log, index=48)
+        callback_states = []
+        script_info.callback = lambda info: callback_states.append(info.pending)
+        with tempfile.TemporaryDirectory() as tempdir:
+            fullpath = pathlib.Path(tempdir) / "sleeper"
+            fullpath.write_text("#!/bin/sh\nexec sleep 30\n")
+            fullpath.chmod(0o755)
+
+            self.assertTrue(script_info.pending)
+            # Unloading a pending script does nothing.
+            script_info.unload()
+            self.assertEqual(callback_states, [])
+
+            await asyncio.wait_for(script_info.start_loading(fullpath), timeout=10)
+            self.assertFalse(script_info.pending)
+            process = script_info.process
+            self.assertIsNone(process.returncode)
+
+            script_info.unload()
+            self.assertTrue(script_info.pending)
+            self.assertFalse(script_info.terminated)
+            self.assertIsNone(script_info.process)
+            self.assertIsNone(script_info.process_task)
+            self.assertEqual(script_info.timestamp_process_start, 0)
+            self.assertEqual(callback_states[-1], True)
+            await asyncio.wait_for(process.wait(), timeout=10)
+
+            # An unloaded script can be loaded again.
+            await asyncio.wait_for(script_info.start_loading(fullpath), timeout=10)
+            self.assertFalse(script_info.pending)
+            self.assertIsNot(script_info.process, process)
+
+            script_info.terminate()
+            self.assertFalse(script_info.pending)
+            await asyncio.wait_for(script_info.process_task, timeout=10)
+            self.assertTrue(script_info.terminated)
+            with self.assertRaises(RuntimeError):
+                script_info.unload()
+
+    async def test_unload_while_configuring(self):
+        log = logging.getLogger("test_unload_while_configuring")
+        transport = scriptqueue.LocalScriptTransport()
+        configure_started = asyncio.Event()
+
+        async def do_configure(sal_index, **kwargs):
+            configure_started.set()
+            await asyncio.sleep(60)
+
+        transport.set_command_handler("configure", do_configure)
+        script_info = self.make_script_info(log=log, index=49)
+        script_info.transport = transport
+        with tempfile.TemporaryDirectory() as tempdir:
+            fullpath = pathlib.Path(tempdir) / "sleeper"
+            fullpath.write_text("#!/bin/sh\nexec sleep 30\n")
+            fullpath.chmod(0o755)
+
+            await asyncio.wait_for(script_info.start_loading(fullpath), timeout=10)
+            process = script_info.process
+            script_info._script_state_callback(
+                types.SimpleNamespace(
+                    state=ScriptState.UNCONFIGURED, private_sndStamp=time.time()
+                )
+            )
+            config_task = script_info.config_task
+            await asyncio.wait_for(configure_started.wait(), timeout=10)
+
+            script_info.unload()
+            self.assertTrue(script_info.pending)
+            with self.assertRaises(asyncio.CancelledError):
+                await config_task
+            # Let anything started by the cancelled configuration run.
+            await asyncio.sleep(0.1)
+            self.assertEqual(script_info.timestamp_configure_start, 0)
+            self.assertEqual(script_info.timestamp_configure_end, 0)
+            self.assertFalse(script_info.terminated)
+            await asyncio.wait_for(process.wait(), timeout=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
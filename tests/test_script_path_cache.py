@@ -0,0 +1,132 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import os
+import pathlib
+import tempfile
+import time
+import unittest
+
+from lsst.ts import scriptqueue
+
+
+class ScriptPathCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tempdir.name) / "scripts"
+        self.make_file("script1")
+        self.make_file("subdir/script2")
+        self.make_file("_private")
+        self.make_file("nonexe", executable=False)
+        # A script outside the root directory.
+        self.make_file("../outside")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def make_file(self, relpath, executable=True):
+        path = self.root / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("#!/bin/sh\n")
+        path.chmod(0o755 if executable else 0o644)
+
+    def test_validation(self):
+        cache = scriptqueue.ScriptPathCache(root=self.root)
+        for badpath in (
+            "../outside",
+            "subdir/../../outside",
+            str(self.root.parent / "outside"),
+            "doesnotexist",
+            "subdir",
+            "_private",
+            "nonexe",
+        ):
+            with self.subTest(badpath=badpath):
+                with self.assertRaises(ValueError):
+                    cache.get(badpath)
+        self.assertEqual(len(cache), 0)
+
+        for goodpath in ("script1", "subdir/script2", "subdir/../script1"):
+            with self.subTest(goodpath=goodpath):
+                fullpath = cache.get(goodpath)
+                self.assertIsInstance(fullpath, pathlib.Path)
+                self.assertTrue(fullpath.samefile(self.root / goodpath))
+        self.assertEqual(len(cache), 3)
+
+        with self.assertRaises(ValueError):
+            scriptqueue.ScriptPathCache(root=self.root, ttl=-1)
+
+    def test_ttl(self):
+        cache = scriptqueue.ScriptPathCache(root=self.root, ttl=1000)
+        fullpath = cache.get("script1")
+        self.assertEqual((cache.num_hits, cache.num_misses), (0, 1))
+        self.assertEqual(cache.get("script1"), fullpath)
+        self.assertEqual((cache.num_hits, cache.num_misses), (1, 1))
+
+        # Changes are not noticed until the entry expires.
+        (self.root / "script1").chmod(0o644)
+        self.assertEqual(cache.get("script1"), fullpath)
+
+        cache = scriptqueue.ScriptPathCache(root=self.root, ttl=0)
+        (self.root / "script1").chmod(0o755)
+        fullpath = cache.get("script1")
+        # An expired entry is used if the script is unchanged...
+        time.sleep(0.001)
+        self.assertEqual(cache.get("script1"), fullpath)
+        self.assertEqual((cache.num_hits, cache.num_misses), (1, 1))
+
+        # ...but the script is validated again if it changed.
+        (self.root / "script1").chmod(0o644)
+        with self.assertRaises(ValueError):
+            cache.get("script1")
+        self.assertEqual(len(cache), 0)
+        (self.root / "script1").chmod(0o755)
+        cache.get("script1")
+        os.remove(self.root / "script1")
+        with self.assertRaises(ValueError):
+            cache.get("script1")
+
+    def test_index(self):
+        index = scriptqueue.ScriptIndex(
+            root=self.root,
+            log=logging.getLogger(),
+            use_inotify=False,
+            mtime_check_interval=0,
+        )
+        try:
+            cache = scriptqueue.ScriptPathCache(root=self.root, ttl=1000, index=index)
+            cache.get("script1")
+            cache.get("subdir/script2")
+            self.assertEqual(len(cache), 2)
+
+            # Removing a script changes the index, which clears the cache.
+            os.remove(self.root / "script1")
+            self.assertTrue(index.refresh())
+            with self.assertRaises(ValueError):
+                cache.get("script1")
+            self.assertEqual(len(cache), 0)
+        finally:
+            index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
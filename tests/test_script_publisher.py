@@ -0,0 +1,222 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import os
+import time
+import types
+import unittest
+
+import asynctest
+
+from lsst.ts import scriptqueue
+from lsst.ts.idl.enums.Script import ScriptState
+from lsst.ts.idl.enums.ScriptQueue import Location
+from lsst.ts.scriptqueue import benchmarks
+
+STD_TIMEOUT = 10
+
+
+def make_script_info(index):
+    """Make a minimal stand-in for a ScriptInfo."""
+    return types.SimpleNamespace(
+        index=index,
+        process_done=False,
+        terminated=False,
+        script_state=ScriptState.UNKNOWN,
+    )
+
+
+class CoalescingScriptPublisherTestCase(asynctest.TestCase):
+    def setUp(self):
+        # list of (SAL index, script state) for each publication
+        self.published = []
+
+    def callback(self, script_info):
+        self.published.append((script_info.index, script_info.script_state))
+
+    def test_constructor_error(self):
+        with self.assertRaises(ValueError):
+            scriptqueue.CoalescingScriptPublisher(
+                callback=self.callback, min_interval=-0.001
+            )
+
+    def test_no_interval(self):
+        publisher = scriptqueue.CoalescingScriptPublisher(callback=self.callback)
+        script_info = make_script_info(1)
+        for state in (ScriptState.UNCONFIGURED, ScriptState.CONFIGURED):
+            script_info.script_state = state
+            publisher.put(script_info)
+        self.assertEqual(
+            self.published,
+            [(1, ScriptState.UNCONFIGURED), (1, ScriptState.CONFIGURED)],
+        )
+        self.assertEqual(publisher.num_put, 2)
+        self.assertEqual(publisher.num_published, 2)
+        self.assertEqual(publisher.num_pending, 0)
+
+    async def test_coalesce(self):
+        interval = 0.2
+        publisher = scriptqueue.CoalescingScriptPublisher(
+            callback=self.callback, min_interval=interval
+        )
+        script_info1 = make_script_info(1)
+        script_info2 = make_script_info(2)
+
+        # The first change to each script is published at once;
+        # later changes in the window are coalesced.
+        for state in (
+            ScriptState.UNCONFIGURED,
+            ScriptState.CONFIGURED,
+            ScriptState.RUNNING,
+        ):
+            for script_info in (script_info1, script_info2):
+                script_info.script_state = state
+                publisher.put(script_info)
+        self.assertEqual(
+            self.published,
+            [(1, ScriptState.UNCONFIGURED), (2, ScriptState.UNCONFIGURED)],
+        )
+        self.assertEqual(publisher.num_put, 6)
+        self.assertEqual(publisher.num_pending, 2)
+
+        # The latest change is published when the window ends.
+        await asyncio.sleep(interval * 1.5)
+        self.assertEqual(
+            self.published[2:], [(1, ScriptState.RUNNING), (2, ScriptState.RUNNING)],
+        )
+        self.assertEqual(publisher.num_pending, 0)
+
+        # A final state is published at once, even within a window.
+        script_info1.script_state = ScriptState.ENDING
+        publisher.put(script_info1)
+        script_info1.script_state = ScriptState.DONE
+        publisher.put(script_info1)
+        self.assertEqual(self.published[4:], [(1, ScriptState.DONE)])
+        script_info1.process_done = True
+        publisher.put(script_info1)
+        self.assertEqual(len(self.published), 6)
+
+        # Flush publishes pending changes at once.
+        script_info2.script_state = ScriptState.ENDING
+        publisher.put(script_info2)
+        self.assertEqual(publisher.num_pending, 1)
+        publisher.flush()
+        self.assertEqual(self.published[6:], [(2, ScriptState.ENDING)])
+        self.assertEqual(publisher.num_pending, 0)
+        await asyncio.sleep(interval * 1.5)
+        self.assertEqual(len(self.published), 7)
+
+    async def test_terminate_unstarted_script(self):
+        """Terminating a script whose process was never started
+        is published at once."""
+        interval = 10
+        publisher = scriptqueue.CoalescingScriptPublisher(
+            callback=self.callback, min_interval=interval
+        )
+        script_info = scriptqueue.ScriptInfo(
+            log=logging.getLogger(),
+            transport=None,
+            index=3,
+            seq_num=3,
+            is_standard=True,
+            path="script1",
+            config="",
+            descr="test",
+        )
+        script_info.callback = publisher.put
+        # Open a window for the script.
+        publisher.put(script_info)
+        self.assertEqual(len(self.published), 1)
+
+        self.assertTrue(script_info.terminate())
+        self.assertFalse(script_info.process_done)
+        self.assertEqual(len(self.published), 2)
+        self.assertEqual(publisher.num_pending, 0)
+
+    async def test_queue_model(self):
+        """Check that QueueModel reports the final state of every script."""
+        datadir = os.path.join(os.path.dirname(__file__), "data")
+        fake_scripts = benchmarks.FakeScripts(run_time=0.01)
+        log = logging.getLogger()
+        # dict of SAL index: script state, from script_callback
+        reported_states = dict()
+
+        def script_callback(script_info):
+            reported_states[script_info.index] = script_info.script_state
+
+        model = scriptqueue.QueueModel(
+            domain=None,
+            log=log,
+            standardpath=os.path.join(datadir, "standard"),
+            externalpath=os.path.join(datadir, "external"),
+            script_callback=script_callback,
+            script_callback_interval=10,
+            transport=fake_scripts.transport,
+            launcher=benchmarks.FakeScriptLauncher(fake_scripts),
+        )
+        try:
+            model.enabled = True
+            script_infos = [
+                scriptqueue.ScriptInfo(
+                    log=log,
+                    transport=model.transport,
+                    index=model.next_sal_index,
+                    seq_num=i,
+                    is_standard=True,
+                    path="script1",
+                    config="",
+                    descr="test",
+                )
+                for i in range(3)
+            ]
+            await model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            )
+            t0 = time.monotonic()
+            while len(model.history) < len(script_infos):
+                self.assertLess(time.monotonic() - t0, STD_TIMEOUT)
+                await asyncio.sleep(0.01)
+            for script_info in script_infos:
+                self.assertEqual(reported_states[script_info.index], ScriptState.DONE)
+            publisher = model.script_publisher
+            self.assertLess(publisher.num_published, publisher.num_put)
+            self.assertEqual(publisher.num_pending, 0)
+        finally:
+            await model.close()
+            fake_scripts.close()
+
+    def test_queue_model_constructor_error(self):
+        datadir = os.path.join(os.path.dirname(__file__), "data")
+        with self.assertRaises(ValueError):
+            scriptqueue.QueueModel(
+                domain=None,
+                log=logging.getLogger(),
+                standardpath=os.path.join(datadir, "standard"),
+                externalpath=os.path.join(datadir, "external"),
+                script_callback_interval=-1,
+                transport=scriptqueue.LocalScriptTransport(),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+import astropy.time
+
+from lsst.ts import scriptqueue
+
+
+def astropy_tai_isot(utc):
+    """Compute tai_isot using astropy, as `astropy.time.Time.now` does."""
+    dt = datetime.datetime.utcfromtimestamp(utc)
+    return astropy.time.Time(dt, scale="utc").tai.isot
+
+
+class TaiTestCase(unittest.TestCase):
+    def tearDown(self):
+        scriptqueue.set_leap_seconds(scriptqueue.DEFAULT_LEAP_SECONDS)
+
+    def test_leap_seconds(self):
+        for utc, offset in scriptqueue.DEFAULT_LEAP_SECONDS:
+            with self.subTest(utc=utc):
+                # There is no TAI-UTC before the first entry.
+                deltas = (0.2, 1000.5678) if offset == 10 else (-0.2, 0.2, 1000.5678)
+                for delta in deltas:
+                    self.assertEqual(
+                        scriptqueue.tai_isot(utc + delta),
+                        astropy_tai_isot(utc + delta),
+                    )
+                self.assertEqual(scriptqueue.tai_minus_utc(utc), offset)
+                self.assertEqual(scriptqueue.tai_minus_utc(utc + 0.1), offset)
+        with self.assertRaises(ValueError):
+            scriptqueue.tai_minus_utc(0)
+
+    def test_tai_isot(self):
+        utc = time.time()
+        for i in range(100):
+            with self.subTest(utc=utc):
+                self.assertEqual(scriptqueue.tai_isot(utc), astropy_tai_isot(utc))
+            utc += 12345.6789
+
+        # Check rounding to the nearest millisecond
+        # (including carry into the next day).
+        utc = 1600041562.0  # 2020-09-13T23:59:22 UTC
+        for frac, expected_end in (
+            (0.0002, "23:59:59.000"),
+            (0.1237, "23:59:59.124"),
+            (0.9996, "00:00:00.000"),
+        ):
+            with self.subTest(frac=frac):
+                isot = scriptqueue.tai_isot(utc + frac)
+                self.assertTrue(isot.endswith(expected_end))
+                self.assertEqual(isot, astropy_tai_isot(utc + frac))
+
+    def test_current_tai_isot(self):
+        t0 = time.time()
+        isot = scriptqueue.current_tai_isot()
+        t1 = time.time()
+        self.assertIn(isot, {astropy_tai_isot(t0), astropy_tai_isot(t1)})
+        self.assertEqual(
+            scriptqueue.QueueModel.next_group_id()[0:16], isot[0:16],
+        )
+
+    def test_set_leap_seconds(self):
+        self.assertEqual(
+            scriptqueue.get_leap_seconds(), scriptqueue.DEFAULT_LEAP_SECONDS
+        )
+        # Add a hypothetical leap second, out of order.
+        future = 1893456000  # 2030-01-01
+        table = ((future, 38),) + scriptqueue.DEFAULT_LEAP_SECONDS
+        scriptqueue.set_leap_seconds(table)
+        self.assertEqual(scriptqueue.get_leap_seconds()[-1], (future, 38))
+        self.assertEqual(scriptqueue.tai_minus_utc(future - 1), 37)
+        self.assertEqual(scriptqueue.tai_minus_utc(future), 38)
+        self.assertEqual(scriptqueue.tai_isot(future), "2030-01-01T00:00:38.000")
+
+        for bad_table in ((), ((future, 38), (future, 39))):
+            with self.subTest(bad_table=bad_table):
+                with self.assertRaises(ValueError):
+                    scriptqueue.set_leap_seconds(bad_table)
+
+    def test_read_leap_seconds_file(self):
+        ntp_offset = 2208988800
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "leap-seconds.list")
+            with open(path, "w") as f:
+                f.write("#\tA comment\n#@\t3881174400\n\n")
+                for utc, offset in scriptqueue.DEFAULT_LEAP_SECONDS:
+                    f.write(f"{utc + ntp_offset}\t{offset}\t# a date\n")
+            scriptqueue.set_leap_seconds([(0, 0)])
+            scriptqueue.read_leap_seconds_file(path)
+            self.assertEqual(
+                scriptqueue.get_leap_seconds(), scriptqueue.DEFAULT_LEAP_SECONDS
+            )
+
+            with open(path, "w") as f:
+                f.write("3881174400\n")
+            with self.assertRaises(ValueError):
+                scriptqueue.read_leap_seconds_file(path)
+            self.assertEqual(
+                scriptqueue.get_leap_seconds(), scriptqueue.DEFAULT_LEAP_SECONDS
+            )
+
+    def test_speed(self):
+        num_iter = 10000
+        t0 = time.perf_counter()
+        for i in range(num_iter):
+            scriptqueue.current_tai_isot()
+        dt = (time.perf_counter() - t0) / num_iter
+        print(f"current_tai_isot takes {dt*1e6:0.1f} usec")
+        self.assertLess(dt, 1e-3)
+
+
+if __name__ == "__main__":
+    unittest.main()
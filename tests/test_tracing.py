@@ -0,0 +1,157 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import asynctest
+
+from lsst.ts import scriptqueue
+
+
+class CallTracerTestCase(asynctest.TestCase):
+    def test_constructor_error(self):
+        with self.assertRaises(ValueError):
+            scriptqueue.CallTracer(maxlen=0)
+        with self.assertRaises(ValueError):
+            scriptqueue.CallTracer(lag_maxlen=0)
+
+    def test_wrap(self):
+        tracer = scriptqueue.CallTracer(maxlen=3)
+
+        def add(a, b):
+            """Add two numbers."""
+            return a + b
+
+        def fail():
+            time.sleep(0.01)
+            raise RuntimeError("Intentional failure")
+
+        traced_add = tracer.wrap("add", add)
+        traced_fail = tracer.wrap("fail", fail)
+        self.assertEqual(traced_add.__doc__, add.__doc__)
+        self.assertEqual(traced_add(1, b=2), 3)
+        with self.assertRaises(RuntimeError):
+            traced_fail()
+
+        events = tracer.dump()
+        self.assertEqual([event.name for event in events], ["add", "fail"])
+        self.assertGreaterEqual(events[1].duration, 0.01)
+        self.assertGreaterEqual(events[1].timestamp, events[0].timestamp)
+        stats = tracer.stats()
+        self.assertEqual(stats["add"]["count"], 1)
+        self.assertEqual(stats["fail"]["count"], 1)
+        self.assertGreaterEqual(stats["fail"]["max"], 0.01)
+        self.assertAlmostEqual(stats["fail"]["mean"], stats["fail"]["total"])
+
+        # The buffer only holds the most recent events,
+        # but statistics cover all calls.
+        for i in range(5):
+            traced_add(i, i)
+        self.assertEqual(len(tracer.dump()), 3)
+        self.assertEqual(tracer.stats()["add"]["count"], 6)
+
+        tracer.clear()
+        self.assertEqual(tracer.dump(), [])
+        self.assertEqual(tracer.stats()["add"]["count"], 0)
+        self.assertEqual(tracer.stats()["add"]["mean"], 0)
+
+    async def test_loop_lag_and_chrome_trace(self):
+        tracer = scriptqueue.CallTracer()
+        with self.assertRaises(ValueError):
+            tracer.start_loop_lag_monitor(interval=0)
+        tracer.start_loop_lag_monitor(interval=0.01)
+        try:
+            await asyncio.sleep(0.05)
+            # Block the event loop.
+            tracer.wrap("block", time.sleep)(0.2)
+            await asyncio.sleep(0.05)
+        finally:
+            tracer.stop_loop_lag_monitor()
+        self.assertIsNone(tracer.loop_lag_task)
+        stats = tracer.stats()
+        self.assertGreater(stats[scriptqueue.LOOP_LAG_NAME]["count"], 2)
+        self.assertGreater(stats[scriptqueue.LOOP_LAG_NAME]["max"], 0.1)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "trace.json")
+            tracer.write_chrome_trace(path)
+            with open(path, "r") as f:
+                trace = json.load(f)
+        trace_events = trace["traceEvents"]
+        self.assertEqual(len(trace_events), len(tracer.dump()))
+        block_events = [event for event in trace_events if event["name"] == "block"]
+        self.assertEqual(len(block_events), 1)
+        self.assertEqual(block_events[0]["ph"], "X")
+        self.assertGreaterEqual(block_events[0]["dur"], 0.2e6)
+        lag_events = [
+            event
+            for event in trace_events
+            if event["name"] == scriptqueue.LOOP_LAG_NAME
+        ]
+        self.assertTrue(all(event["ph"] == "C" for event in lag_events))
+        self.assertGreater(max(event["args"]["lag_msec"] for event in lag_events), 100)
+
+    async def test_separate_lag_buffer(self):
+        """Lag events must not push out call events."""
+        tracer = scriptqueue.CallTracer(maxlen=2, lag_maxlen=3)
+        traced_abs = tracer.wrap("abs", abs)
+        traced_abs(-1)
+        traced_abs(-2)
+        tracer.start_loop_lag_monitor(interval=0.001)
+        try:
+            for i in range(100):
+                if tracer.stats()[scriptqueue.LOOP_LAG_NAME]["count"] > 5:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            tracer.stop_loop_lag_monitor()
+        self.assertEqual(len(tracer.events), 2)
+        self.assertEqual(len(tracer.lag_events), 3)
+        events = tracer.dump()
+        self.assertEqual(len(events), 5)
+        self.assertEqual([event.name for event in events[0:2]], ["abs", "abs"])
+        timestamps = [event.timestamp for event in events]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(len(tracer.snapshot()), 5)
+
+        # write_chrome_trace can be called in a thread with a snapshot.
+        snapshot = tracer.snapshot()
+        traced_abs(-3)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "trace.json")
+            await asyncio.get_running_loop().run_in_executor(
+                None, tracer.write_chrome_trace, path, snapshot
+            )
+            with open(path, "r") as f:
+                trace = json.load(f)
+        self.assertEqual(len(trace["traceEvents"]), 5)
+
+        tracer.clear()
+        self.assertEqual(tracer.dump(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
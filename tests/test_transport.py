@@ -0,0 +1,180 @@
+# This file is part of ts_scriptqueue.
+#
+# Developed for the LSST Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import os
+import time
+import types
+import unittest
+
+import asynctest
+
+from lsst.ts import salobj
+from lsst.ts import scriptqueue
+from lsst.ts.idl.enums.Script import ScriptState
+from lsst.ts.idl.enums.ScriptQueue import Location
+from lsst.ts.scriptqueue import benchmarks
+
+STD_TIMEOUT = 10
+
+
+class LocalScriptTransportTestCase(asynctest.TestCase):
+    async def test_commands(self):
+        transport = scriptqueue.LocalScriptTransport()
+        self.assertTrue(transport.start_task.done())
+        received = []
+
+        async def do_configure(sal_index, **kwargs):
+            received.append((sal_index, kwargs))
+            return "configured"
+
+        async def do_slow(sal_index):
+            await asyncio.sleep(STD_TIMEOUT)
+
+        async def do_fail(sal_index):
+            raise RuntimeError("Intentional failure")
+
+        transport.set_command_handler("configure", do_configure)
+        transport.set_command_handler("slow", do_slow)
+        transport.set_command_handler("fail", do_fail)
+
+        ack = await transport.send_command("configure", 5, config="a: 1", timeout=1)
+        self.assertEqual(ack.ack, salobj.SalRetCode.CMD_COMPLETE)
+        self.assertEqual(ack.result, "configured")
+        self.assertEqual(received, [(5, dict(config="a: 1"))])
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await transport.send_command("slow", 5, timeout=0.01)
+        with self.assertRaises(RuntimeError):
+            await transport.send_command("fail", 5)
+        with self.assertRaises(RuntimeError):
+            await transport.send_command("no_such_command", 5)
+        transport.set_command_handler("configure", None)
+        with self.assertRaises(RuntimeError):
+            await transport.send_command("configure", 5)
+        self.assertEqual(transport.num_commands, 5)
+
+    def test_events(self):
+        transport = scriptqueue.LocalScriptTransport()
+        received = []
+        # No callback, so the event is dropped.
+        transport.put_event("state", 5, state=ScriptState.RUNNING)
+        transport.set_event_callback("state", received.append)
+        t0 = time.time()
+        transport.put_event("state", 6, state=ScriptState.DONE)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0].ScriptID, 6)
+        self.assertEqual(received[0].state, ScriptState.DONE)
+        self.assertGreaterEqual(received[0].private_sndStamp, t0)
+        transport.set_event_callback("state", None)
+        transport.put_event("state", 7, state=ScriptState.DONE)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(transport.num_events, 3)
+
+    async def test_queue_model(self):
+        """Run scripts through a QueueModel without DDS."""
+        datadir = os.path.join(os.path.dirname(__file__), "data")
+        fake_scripts = benchmarks.FakeScripts(run_time=0.01)
+        log = logging.getLogger()
+        model = scriptqueue.QueueModel(
+            domain=None,
+            log=log,
+            standardpath=os.path.join(datadir, "standard"),
+            externalpath=os.path.join(datadir, "external"),
+            transport=fake_scripts.transport,
+            launcher=benchmarks.FakeScriptLauncher(fake_scripts),
+        )
+        try:
+            model.enabled = True
+            script_infos = [
+                scriptqueue.ScriptInfo(
+                    log=log,
+                    transport=model.transport,
+                    index=index,
+                    seq_num=index,
+                    is_standard=True,
+                    path="script1",
+                    config="",
+                    descr="test",
+                )
+                for index in (model.next_sal_index, model.next_sal_index)
+            ]
+            await model.add_many(
+                script_infos=script_infos, location=Location.LAST, location_sal_index=0
+            )
+            t0 = time.monotonic()
+            while len(model.history) < 2:
+                self.assertLess(time.monotonic() - t0, STD_TIMEOUT)
+                await asyncio.sleep(0.01)
+            for script_info in script_infos:
+                self.assertEqual(script_info.script_state, ScriptState.DONE)
+                self.assertEqual(script_info.process.returncode, 0)
+                self.assertFalse(script_info.failed)
+                self.assertNotEqual(script_info.group_id, "")
+        finally:
+            await model.close()
+            fake_scripts.close()
+
+
+class SalScriptTransportTestCase(asynctest.TestCase):
+    async def test_sal_script_transport(self):
+        sent = []
+
+        class MockCommand:
+            def __init__(self, name):
+                self.name = name
+
+            async def set_start(self, **kwargs):
+                sent.append((self.name, kwargs))
+                return "ack"
+
+        start_task = asyncio.Future()
+        remote = types.SimpleNamespace(
+            start_task=start_task,
+            cmd_run=MockCommand("run"),
+            cmd_configure=MockCommand("configure"),
+            evt_state=types.SimpleNamespace(callback=None),
+        )
+        transport = scriptqueue.SalScriptTransport(remote)
+        self.assertIs(transport.start_task, start_task)
+
+        self.assertEqual(await transport.send_command("run", 5), "ack")
+        await transport.send_command("configure", 6, config="a: 1", timeout=3)
+        self.assertEqual(
+            sent,
+            [
+                ("run", dict(ScriptID=5)),
+                ("configure", dict(ScriptID=6, config="a: 1", timeout=3)),
+            ],
+        )
+
+        def callback(data):
+            pass
+
+        transport.set_event_callback("state", callback)
+        self.assertIs(remote.evt_state.callback, callback)
+        transport.set_event_callback("state", None)
+        self.assertIsNone(remote.evt_state.callback)
+
+
+if __name__ == "__main__":
+    unittest.main()
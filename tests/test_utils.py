@@ -21,7 +21,10 @@
 
 import os
 import pathlib
+import stat
+import types
 import unittest
+from unittest import mock
 
 try:
     from lsst.ts import standardscripts
@@ -50,6 +53,80 @@ class UtilsTestCase(unittest.TestCase):
         )
         self.assertEqual(set(scripts), expectedscripts)
 
+    def test_scan_public_scripts(self):
+        root = os.path.join(os.path.dirname(__file__), "data/standard")
+        entries = scriptqueue.scan_public_scripts(root)
+        self.assertEqual(
+            [entry.relpath for entry in entries],
+            sorted(scriptqueue.find_public_scripts(root)),
+        )
+        for entry in entries:
+            self.assertIsInstance(entry, scriptqueue.ScriptEntry)
+            stat_result = os.stat(os.path.join(root, entry.relpath))
+            self.assertEqual(entry.size, stat_result.st_size)
+            self.assertEqual(entry.mtime, stat_result.st_mtime)
+            self.assertEqual(entry.mode, stat_result.st_mode)
+            self.assertTrue(scriptqueue.is_executable_mode(stat_result))
+            self.assertTrue(
+                scriptqueue.is_executable_mode(
+                    stat_result, scriptqueue.get_process_credentials()
+                )
+            )
+
+        # Scanning subdirectories in parallel gives the same result.
+        for max_workers in (1, 4):
+            with self.subTest(max_workers=max_workers):
+                self.assertEqual(
+                    scriptqueue.scan_public_scripts(root, max_workers=max_workers),
+                    entries,
+                )
+
+        with self.assertRaises(ValueError):
+            scriptqueue.scan_public_scripts(root, max_workers=0)
+
+        # The credentials of this process are obtained once per scan.
+        with mock.patch.object(os, "getgroups", wraps=os.getgroups) as getgroups:
+            self.assertEqual(scriptqueue.scan_public_scripts(root), entries)
+        getgroups.assert_called_once()
+
+    def test_is_executable_mode(self):
+        credentials = scriptqueue.ProcessCredentials(
+            euid=10, egid=20, groups=frozenset([30])
+        )
+
+        def make_stat(mode, uid=11, gid=21):
+            return types.SimpleNamespace(
+                st_mode=stat.S_IFREG | mode, st_uid=uid, st_gid=gid
+            )
+
+        for mode, uid, gid, expected in (
+            (stat.S_IXUSR, 10, 21, True),
+            (stat.S_IXGRP | stat.S_IXOTH, 10, 21, False),
+            (stat.S_IXGRP, 11, 20, True),
+            (stat.S_IXGRP, 11, 30, True),
+            (stat.S_IXUSR | stat.S_IXOTH, 11, 30, False),
+            (stat.S_IXOTH, 11, 21, True),
+            (stat.S_IXUSR | stat.S_IXGRP, 11, 21, False),
+        ):
+            with self.subTest(mode=oct(mode), uid=uid, gid=gid):
+                self.assertEqual(
+                    scriptqueue.is_executable_mode(
+                        make_stat(mode, uid=uid, gid=gid), credentials
+                    ),
+                    expected,
+                )
+        root_credentials = scriptqueue.ProcessCredentials(
+            euid=0, egid=0, groups=frozenset()
+        )
+        self.assertTrue(
+            scriptqueue.is_executable_mode(make_stat(stat.S_IXOTH), root_credentials)
+        )
+        self.assertFalse(scriptqueue.is_executable_mode(make_stat(0), root_credentials))
+        not_regular = types.SimpleNamespace(
+            st_mode=stat.S_IFDIR | stat.S_IXOTH, st_uid=11, st_gid=21
+        )
+        self.assertFalse(scriptqueue.is_executable_mode(not_regular, credentials))
+
     @unittest.skipIf(standardscripts is None, "Could not import ts_standardscripts")
     def test_get_default_standard_scripts_dir(self):
         standard_dir = scriptqueue.get_default_scripts_dir(is_standard=True)